@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""
+Memory used by cached Address objects
+
+Compares the current Address against the previous representation, which
+kept the whole geocodejson payload and a list of Point objects for the
+polygon. Run with:
+
+    python benchmarks/address_memory.py [count] [vertices]
+"""
+
+import gc
+import json
+import sys
+import tracemalloc
+
+from trackimo.adddress.geocode import Address, Point
+
+
+class LegacyAddress(object):
+    """The Address representation before compact mode"""
+
+    def __init__(self, payload={}):
+        super().__init__()
+        self.__payload = payload
+        if "geocoding" in payload:
+            if "attribution" in payload["geocoding"]:
+                self.__attribution = payload["geocoding"]["attribution"]
+            if "query" in payload["geocoding"]:
+                self.__query = payload["geocoding"]["query"]
+        if "features" in payload and payload["features"][0]:
+            feature = payload["features"][0]
+            if "properties" in feature and "geocoding" in feature["properties"]:
+                geocoding = feature["properties"]["geocoding"]
+                for field in (
+                    "place_id",
+                    "osm_type",
+                    "osm_id",
+                    "type",
+                    "accuracy",
+                    "label",
+                    "name",
+                    "country",
+                    "postcode",
+                    "state",
+                    "city",
+                    "district",
+                    "street",
+                ):
+                    if field in geocoding:
+                        setattr(self, "_LegacyAddress__" + field, geocoding[field])
+            if (
+                "geometry" in feature
+                and feature["geometry"]["type"].lower() == "polygon"
+                and feature["geometry"]["coordinates"][0]
+            ):
+                self.__polygon = []
+                for point_data in feature["geometry"]["coordinates"][0]:
+                    self.__polygon.append(Point(point_data[0], point_data[1]))
+
+
+def payload(index, vertices):
+    """A geocodejson response shaped like Nominatim's"""
+    latitude = -33.8 + index / 10000
+    longitude = 151.2 + index / 10000
+    ring = [
+        [longitude + (vertex % 7) / 1000, latitude + (vertex % 5) / 1000]
+        for vertex in range(vertices)
+    ]
+    ring.append(ring[0])
+    text = json.dumps(
+        {
+            "type": "FeatureCollection",
+            "geocoding": {
+                "version": "0.1.0",
+                "attribution": "Data (c) OpenStreetMap contributors, ODbL 1.0.",
+                "licence": "ODbL",
+                "query": f"{latitude},{longitude}",
+            },
+            "features": [
+                {
+                    "type": "Feature",
+                    "properties": {
+                        "geocoding": {
+                            "place_id": 100000 + index,
+                            "osm_type": "way",
+                            "osm_id": 200000 + index,
+                            "type": "house",
+                            "accuracy": 0,
+                            "label": f"{index}, Example Street, Sydney, NSW, 2000, Australia",
+                            "name": f"Building {index}",
+                            "housenumber": str(index),
+                            "street": "Example Street",
+                            "district": "Sydney",
+                            "city": "Sydney",
+                            "state": "New South Wales",
+                            "postcode": "2000",
+                            "country": "Australia",
+                            "admin": {"level4": "New South Wales"},
+                            "extra": {"building": "yes"},
+                        }
+                    },
+                    "geometry": {"type": "Polygon", "coordinates": [ring]},
+                }
+            ],
+        }
+    )
+    # A fresh decode, as a real response would be
+    return json.loads(text)
+
+
+def measure(factory, count, vertices):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    cached = [factory(payload(index, vertices)) for index in range(count)]
+    gc.collect()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    used = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    del cached
+    return used
+
+
+def main(count=10000, vertices=40):
+    legacy = measure(LegacyAddress, count, vertices)
+    compact = measure(Address, count, vertices)
+    print(f"{count} addresses, {vertices} polygon vertices each")
+    print(f"legacy:  {legacy / 1048576:8.1f} MiB ({legacy / count:8.0f} B each)")
+    print(f"compact: {compact / 1048576:8.1f} MiB ({compact / count:8.0f} B each)")
+    print(f"saving:  {100 * (1 - compact / legacy):7.1f}%")
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:3]))
@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+"""
+Requests and latency of one location poll
+
+Runs a local mock of the Trackimo API, then polls a fleet with the
+previous serial pagination and with chunked, concurrent fetches. The mock
+answers locations/filter after a fixed round trip plus a small cost per
+device returned. The serial baseline only fetches, the chunked polls also
+apply every location to its device. Run with:
+
+    python benchmarks/locations_poll.py [devices] [polls]
+"""
+
+import asyncio
+import json
+import re
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from trackimo.adddress.geocode import Geocoder, configure_geocoder
+from trackimo.protocol.device import DeviceHandler
+from trackimo.protocol.protocol import Protocol
+
+ROUND_TRIP = 0.04
+"""Seconds the mock takes to answer any locations request"""
+
+PER_DEVICE = 0.00005
+"""Extra seconds the mock takes for each location returned"""
+
+ACCOUNT_ID = 99
+FIRST_DEVICE = 1000
+
+
+class MockTrackimo(BaseHTTPRequestHandler):
+    """Just enough of the Trackimo API to log in, build and poll"""
+
+    protocol_version = "HTTP/1.1"
+    devices = 0
+    counts = {}
+    lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass
+
+    def send(self, status, data):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def handle_any(self, method):
+        url = urlsplit(self.path)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        length = int(self.headers.get("Content-Length") or 0)
+        payload = json.loads(self.rfile.read(length)) if length else None
+        path = url.path
+        key = method + " " + re.sub(r"/\d+", "/{id}", path)
+        with self.lock:
+            self.counts[key] = self.counts.get(key, 0) + 1
+
+        if path.endswith("/user/login"):
+            return self.send(200, {})
+        if path.endswith("/oauth2/auth"):
+            return self.send(200, {"code": "code"})
+        if path.endswith("/oauth2/token"):
+            return self.send(200, {"access_token": "token", "expires_in": 3600000})
+        if path.endswith("/user"):
+            return self.send(200, {"user_id": 1, "account_id": ACCOUNT_ID})
+        if path.endswith(f"/accounts/{ACCOUNT_ID}/devices"):
+            limit, page = int(query.get("limit", 20)), int(query.get("page", 1))
+            ids = range(FIRST_DEVICE, FIRST_DEVICE + self.devices)
+            ids = ids[(page - 1) * limit : page * limit]
+            return self.send(200, [{"deviceId": id} for id in ids])
+        if re.search(r"/devices/\d+$", path):
+            return self.send(200, {"name": "device", "account_id": ACCOUNT_ID})
+        if path.endswith("/devices/features/deviceIds"):
+            return self.send(200, [])
+        if path.endswith("/locations/filter"):
+            limit, page = int(query.get("limit", 20)), int(query.get("page", 1))
+            ids = payload["device_ids"][(page - 1) * limit : page * limit]
+            time.sleep(ROUND_TRIP + PER_DEVICE * len(ids))
+            now = int(time.time())
+            return self.send(
+                200,
+                [
+                    {
+                        "device_id": id,
+                        "lat": -33.8,
+                        "lng": 151.2,
+                        "time": now,
+                        "speed": 0,
+                        "battery": 90,
+                    }
+                    for id in ids
+                ],
+            )
+        return self.send(404, {})
+
+    def do_GET(self):
+        self.handle_any("GET")
+
+    def do_POST(self):
+        self.handle_any("POST")
+
+
+class NoGeocoder(Geocoder):
+    """Keep the benchmark off the network"""
+
+    remote = False
+
+    def reverse(self, latitude, longitude):
+        return None
+
+
+async def serial_poll(protocol, device_ids):
+    """The previous fetch: one page of every device, then page until empty"""
+    pagination = {"limit": len(device_ids), "page": 1}
+    url = f"accounts/{protocol.accountid}/locations/filter"
+    location_data = await protocol.api_post(
+        url, data={"device_ids": device_ids}, query_string=pagination
+    )
+    while location_data:
+        pagination["page"] += 1
+        location_data = await protocol.api_post(
+            url, data={"device_ids": device_ids}, query_string=pagination
+        )
+
+
+async def measure(label, poll, polls):
+    before = sum(MockTrackimo.counts.get(k, 0) for k in MockTrackimo.counts)
+    timings = []
+    for idx in range(polls):
+        started = time.perf_counter()
+        await poll()
+        timings.append(time.perf_counter() - started)
+    after = sum(MockTrackimo.counts.get(k, 0) for k in MockTrackimo.counts)
+    print(
+        f"{label:<28} {(after - before) / polls:>8.1f} "
+        f"{statistics.mean(timings) * 1000:>10.0f} {max(timings) * 1000:>10.0f}"
+    )
+
+
+async def main(devices, polls):
+    MockTrackimo.devices = devices
+    server = ThreadingHTTPServer(("127.0.0.1", 0), MockTrackimo)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    configure_geocoder(NoGeocoder())
+
+    protocol = Protocol(
+        "client",
+        "secret",
+        host="127.0.0.1",
+        port=server.server_address[1],
+        protocol="http",
+        username="user",
+        password="password",
+        executor_workers=16,
+        rate_limits={"default": (1000, 1000), "locations": (1000, 1000)},
+    )
+    await protocol.login()
+    handler = DeviceHandler(protocol, geocode_workers=0)
+    await handler.build(limit=500, concurrency=32)
+    device_ids = list(handler.devices)
+
+    print(f"{devices} devices, {polls} polls")
+    print(f"{'':<28} {'req/poll':>8} {'mean ms':>10} {'max ms':>10}")
+    await measure("serial pagination", lambda: serial_poll(protocol, device_ids), polls)
+    for chunk_size, concurrency in ((2000, 1), (500, 4), (250, 8), (100, 8)):
+        chunked = DeviceHandler(
+            protocol,
+            geocode_workers=0,
+            locations_chunk_size=chunk_size,
+            locations_concurrency=concurrency,
+        )
+        await chunked.build(limit=500, concurrency=32)
+        await measure(
+            f"chunks of {chunk_size} x{concurrency}", chunked.refresh_locations, polls
+        )
+
+    await protocol.close()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    devices = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    polls = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    asyncio.run(main(devices, polls))
@@ -4,20 +4,33 @@ import asyncio
 
 from ..protocol import device, account, protocol
 from ..exceptions import UnableToAuthenticate
+from .. import tracing
 
 _logger = logging.getLogger(__name__)
 
 
 class Trackimo(object):
-    def __init__(self, loop=None, client_id=None, client_secret=None):
+    def __init__(
+        self, loop=None, client_id=None, client_secret=None, transport="requests"
+    ):
         super().__init__()
+        self.__transport = transport
         self.__client_id = client_id if client_id else None
         self.__client_secret = client_secret if client_secret else None
         self.__loop = loop if loop else asyncio.get_event_loop()
         self.__devices = None
         self.__account = None
+        self.__protocol = None
+        self.__device_handler = None
 
-    async def restore_session(self, refresh_token):
+    @tracing.traced("trackimo.restore_session")
+    async def restore_session(self, refresh_token, concurrency=10):
+        """Restore a session from a refresh token
+
+        Attributes:
+            refresh_token (str): A refresh token from a previous session
+            concurrency (int): Maximum device requests in flight during build
+        """
         _logger.debug("Restoring Session")
         self.__protocol = protocol.Protocol(
             client_id=self.__client_id,
@@ -25,6 +38,7 @@ class Trackimo(object):
             username=None,
             password=None,
             loop=self.__loop,
+            transport=self.__transport,
         )
 
         authData = await self.__protocol.restore_session(refresh_token)
@@ -35,13 +49,15 @@ class Trackimo(object):
         deviceHandler = device.DeviceHandler(self.__protocol)
 
         self.__account = await accountHandler.build()
-        self.__devices = await deviceHandler.build()
+        self.__devices = await deviceHandler.build(concurrency=concurrency)
+        self.__device_handler = deviceHandler
 
         self.__track = deviceHandler.track
 
         return self
 
-    async def login(self, username, password):
+    @tracing.traced("trackimo.login")
+    async def login(self, username, password, concurrency=10):
         """Login to the Trackimo API
 
         Attributes:
@@ -49,6 +65,7 @@ class Trackimo(object):
             clientsecret (str): The API Client or APP Secret
             username (str): The Trackimo Username
             password (str): The Trackimo Password
+            concurrency (int): Maximum device requests in flight during build
         """
         self.__protocol = protocol.Protocol(
             client_id=self.__client_id,
@@ -56,6 +73,7 @@ class Trackimo(object):
             username=username,
             password=password,
             loop=self.__loop,
+            transport=self.__transport,
         )
         authData = await self.__protocol.login()
         if not authData:
@@ -65,12 +83,21 @@ class Trackimo(object):
         deviceHandler = device.DeviceHandler(self.__protocol)
 
         self.__account = await accountHandler.build()
-        self.__devices = await deviceHandler.build()
+        self.__devices = await deviceHandler.build(concurrency=concurrency)
+        self.__device_handler = deviceHandler
 
         self.__track = deviceHandler.track
 
         return self
 
+    async def close(self):
+        """Close the connection to the Trackimo API"""
+        if self.__device_handler:
+            await self.__device_handler.close()
+        if not self.__protocol:
+            return
+        await self.__protocol.close()
+
     @property
     def auth(self):
         if not self.__protocol:
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+"""
+Reverse geocode cache for Trackimo
+"""
+
+import logging
+import time
+from collections import OrderedDict
+from datetime import timedelta
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class GeoCache(object):
+    """A least recently used cache whose entries expire"""
+
+    def __init__(self, max_entries=4096, ttl=timedelta(days=7)):
+        """Create a GeoCache Object
+
+        Attributes:
+            max_entries (int): The most entries to hold before evicting
+            ttl (timedelta|int): How long an entry lives, None to never expire
+        """
+        super().__init__()
+        self.__entries = OrderedDict()
+        self.__max_entries = None
+        self.__ttl = None
+        self.__hits = 0
+        self.__misses = 0
+        self.__evictions = 0
+        self.__expirations = 0
+        self.ttl = ttl
+        self.resize(max_entries)
+
+    def __len__(self):
+        return len(self.__entries)
+
+    def __contains__(self, key):
+        return self.get(key, count=False) is not None
+
+    def get(self, key, count=True):
+        """Fetch an entry, or None if it is missing or has expired
+
+        Attributes:
+            key (str): The cache key
+            count (bool): Record the lookup in the hit and miss counters
+        """
+        entry = self.__entries.get(key)
+        if entry is None:
+            if count:
+                self.__misses += 1
+            return None
+
+        expires, value = entry
+        if expires is not None and expires <= time.monotonic():
+            del self.__entries[key]
+            self.__expirations += 1
+            if count:
+                self.__misses += 1
+            return None
+
+        self.__entries.move_to_end(key)
+        if count:
+            self.__hits += 1
+        return value
+
+    def set(self, key, value):
+        """Store an entry, evicting the least recently used when full
+
+        Attributes:
+            key (str): The cache key
+            value (object): The value to store
+        """
+        expires = time.monotonic() + self.__ttl if self.__ttl is not None else None
+        self.__entries[key] = (expires, value)
+        self.__entries.move_to_end(key)
+        self.__evict()
+
+    def delete(self, key):
+        """Remove an entry if it exists"""
+        self.__entries.pop(key, None)
+
+    def clear(self):
+        """Remove every entry"""
+        self.__entries.clear()
+
+    def resize(self, max_entries):
+        """Change the maximum number of entries, evicting if needed
+
+        Attributes:
+            max_entries (int): The most entries to hold, None for no limit
+        """
+        self.__max_entries = (
+            max(0, int(max_entries)) if max_entries is not None else None
+        )
+        self.__evict()
+
+    def purge(self):
+        """Remove every expired entry"""
+        now = time.monotonic()
+        expired = [
+            key
+            for key, (expires, value) in self.__entries.items()
+            if expires is not None and expires <= now
+        ]
+        for key in expired:
+            del self.__entries[key]
+        self.__expirations += len(expired)
+        return len(expired)
+
+    def __evict(self):
+        if self.__max_entries is None:
+            return
+        while len(self.__entries) > self.__max_entries:
+            self.__entries.popitem(last=False)
+            self.__evictions += 1
+
+    @property
+    def max_entries(self):
+        return self.__max_entries
+
+    @property
+    def ttl(self):
+        if self.__ttl is None:
+            return None
+        return timedelta(seconds=self.__ttl)
+
+    @ttl.setter
+    def ttl(self, ttl):
+        if ttl is None:
+            self.__ttl = None
+        elif isinstance(ttl, timedelta):
+            self.__ttl = ttl.total_seconds()
+        else:
+            self.__ttl = float(ttl)
+
+    @property
+    def stats(self):
+        return {
+            "size": len(self.__entries),
+            "max_entries": self.__max_entries,
+            "hits": self.__hits,
+            "misses": self.__misses,
+            "evictions": self.__evictions,
+            "expirations": self.__expirations,
+        }
@@ -3,11 +3,29 @@
 Geocoder for Trackimo
 """
 
-from datetime import datetime
+from array import array
 import json
 import logging
+import struct
+import sys
 import requests
 
+try:
+    import numpy
+except ImportError:  # pragma: no cover - optional dependency
+    numpy = None
+
+from .cache import GeoCache
+from .spatial import geohash, grid_key
+from .governor import (
+    GeocodeDropped,
+    GeocodeGovernor,
+    PRIORITY_MISSING,
+    PRIORITY_REFRESH,
+)
+from .store import GeoStore
+from ..executor import ThreadPool
+
 _LOGGER = logging.getLogger(__name__)
 
 _REFRENCE = "https://github.com/troykelly/python-trackimo"
@@ -28,13 +46,35 @@ _CONTACT_EMAIL = None
 _SESSION = None
 """Store the Requests session"""
 
+_CACHE = None
+"""Store the reverse geocode cache"""
 
-class __GEO_CACHE(object):
-    def __init__(self):
-        super().__init__()
+_GOVERNOR = None
+"""Store the Nominatim request governor"""
+
+_STORE = None
+"""Store the optional persistent geocode store"""
+
+_EXECUTOR = None
+"""Store the thread pool geocode lookups block in"""
+
+_EXECUTOR_WORKERS = 2
+"""Threads for geocode lookups and store access"""
 
-    def __cleanup(self):
-        pass
+_RATE = 1.0
+"""Nominatim lookups per second, their usage policy allows one"""
+
+_NUMPY_MIN_VERTICES = 64
+"""Polygons smaller than this are faster to test without NumPy"""
+
+_CACHE_KEY = {"type": "geohash", "precision": 8, "metres": 25, "polygon": False}
+"""How positions are grouped into cache entries"""
+
+_DETAIL_LEVELS = ("country", "state", "city", "street")
+"""Address detail levels, coarsest first"""
+
+_GEOCODER = {"primary": None, "fallback": None, "detail": "street"}
+"""The geocoder backends in use"""
 
 
 def get_session():
@@ -46,32 +86,180 @@ def get_session():
     return _SESSION
 
 
-async def reverse_geocode(device):
-    global __GEO_CACHE
+def get_cache():
+    global _CACHE
+    if _CACHE is not None:
+        return _CACHE
+    _CACHE = GeoCache()
+    return _CACHE
+
+
+def get_governor(loop=None):
+    global _GOVERNOR
+    if (
+        _GOVERNOR is not None
+        and not _GOVERNOR.loop.is_closed()
+        and (loop is None or _GOVERNOR.loop is loop)
+    ):
+        return _GOVERNOR
+    _GOVERNOR = GeocodeGovernor(loop=loop, rate=_RATE)
+    return _GOVERNOR
+
+
+def governor_stats():
+    """Stats of the geocode governor, zeros when there is none yet"""
+    if _GOVERNOR is None:
+        return {
+            "queue_depth": 0,
+            "queued": 0,
+            "coalesced": 0,
+            "dropped": 0,
+            "completed": 0,
+            "failed": 0,
+            "cancelled": 0,
+        }
+    return _GOVERNOR.stats
 
-    if not (device.latitude and device.longitude):
-        return None
 
-    try:
-        device_point = Point(device.latitude, device.longitude)
-    except:
-        device_point = None
+def get_store():
+    return _STORE
 
-    if not device_point:
+
+def get_executor():
+    global _EXECUTOR
+    if _EXECUTOR is not None and not _EXECUTOR.closed:
+        return _EXECUTOR
+    _EXECUTOR = ThreadPool(workers=_EXECUTOR_WORKERS, name="trackimo-geocode")
+    return _EXECUTOR
+
+
+def executor_stats():
+    """Stats of the geocode thread pool, zeros when it is not running"""
+    if _EXECUTOR is None or _EXECUTOR.closed:
+        return {
+            "workers": _EXECUTOR_WORKERS,
+            "active": 0,
+            "queued": 0,
+            "completed": 0,
+        }
+    return _EXECUTOR.stats
+
+
+def configure_executor(workers=2):
+    """Size the thread pool geocode lookups block in
+
+    Attributes:
+        workers (int): Threads for lookups and store access
+    """
+    global _EXECUTOR_WORKERS
+    _EXECUTOR_WORKERS = max(1, int(workers))
+    close_executor()
+
+
+def close_executor():
+    """Shut down the geocode thread pool, it is recreated on next use
+
+    The pool is shared by every DeviceHandler, so only call this once none
+    of them are geocoding.
+    """
+    global _EXECUTOR
+    if _EXECUTOR is None:
+        return
+    executor = _EXECUTOR
+    _EXECUTOR = None
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+def configure_store(path=None, ttl=None):
+    """Keep reverse geocode results on disk, shared between processes
+
+    Attributes:
+        path (str): The SQLite database file, None to stop using a store
+        ttl (timedelta|int): How long an entry lives, defaults to 30 days
+    """
+    global _STORE
+    if _STORE is not None:
+        _STORE.close()
+        _STORE = None
+    if not path:
         return None
+    _STORE = GeoStore(path, ttl=ttl) if ttl is not None else GeoStore(path)
+    return _STORE
 
-    point_id = " ".join(map(str, device_point.coords[:]))
 
-    from_cache = getattr(__GEO_CACHE, point_id, None)
+def configure_cache_key(key_type="geohash", precision=8, metres=25, polygon=False):
+    """Choose how nearby positions share a cached address
 
-    if from_cache:
-        return from_cache["address"]
+    Attributes:
+        key_type (str): "geohash", "grid" or "exact"
+        precision (int): Geohash characters, 8 is roughly 38m x 19m
+        metres (float): Grid cell width in metres
+        polygon (bool): Only reuse an address while inside its polygon
+    """
+    if key_type not in ("geohash", "grid", "exact"):
+        raise ValueError(f"Unknown cache key type: {key_type}")
+    _CACHE_KEY["type"] = key_type
+    _CACHE_KEY["precision"] = int(precision)
+    _CACHE_KEY["metres"] = float(metres)
+    _CACHE_KEY["polygon"] = bool(polygon)
+
+
+def cache_key(latitude, longitude):
+    """The cache key for a position"""
+    if _CACHE_KEY["type"] == "geohash":
+        return geohash(latitude, longitude, _CACHE_KEY["precision"])
+    if _CACHE_KEY["type"] == "grid":
+        return grid_key(latitude, longitude, _CACHE_KEY["metres"])
+    return f"{latitude} {longitude}"
+
+
+class Geocoder(object):
+    """Interface for reverse geocoder backends"""
+
+    remote = True
+    """Remote backends are cached, stored and rate limited"""
+
+    detail = "street"
+    """The finest detail level this backend can answer"""
+
+    def supports(self, detail):
+        """Check whether this backend can answer a detail level
+
+        Attributes:
+            detail (str): "country", "state", "city" or "street"
+        """
+        return _DETAIL_LEVELS.index(detail) <= _DETAIL_LEVELS.index(self.detail)
+
+    def reverse(self, latitude, longitude):
+        """Find the Address for a position, blocking until it is known
+
+        Attributes:
+            latitude (float): The latitude in degrees
+            longitude (float): The longitude in degrees
+        """
+        raise NotImplementedError()
+
+
+class NominatimGeocoder(Geocoder):
+    """Reverse geocode against Open Street Map's Nominatim"""
+
+    def __init__(self, keep_raw=False, connect_timeout=5, read_timeout=15):
+        """Create a NominatimGeocoder Object
 
-    def get_nominatim_reverse():
+        Attributes:
+            keep_raw (bool): Keep each whole response available as Address.raw
+            connect_timeout (float): Seconds allowed to connect to Nominatim
+            read_timeout (float): Seconds allowed between bytes of a response
+        """
+        super().__init__()
+        self.__keep_raw = keep_raw
+        self.__timeout = (connect_timeout, read_timeout)
+
+    def reverse(self, latitude, longitude):
         session = get_session()
         params = {
-            "lat": device_point.x,
-            "lon": device_point.y,
+            "lat": latitude,
+            "lon": longitude,
             "polygon_geojson": 1,
             "format": "geocodejson",
             "addressdetails": 1,
@@ -82,7 +270,12 @@ async def reverse_geocode(device):
         if _CONTACT_EMAIL:
             params["email"] = _CONTACT_EMAIL
 
-        response = session.get(f"{_PROTOCOL}://{_HOST}/reverse", params=params)
+        try:
+            response = session.get(
+                f"{_PROTOCOL}://{_HOST}/reverse", params=params, timeout=self.__timeout
+            )
+        except requests.exceptions.Timeout:
+            raise OSMReverseFailed("Open Street Map timed out")
 
         status_code = getattr(response, "status_code", None)
 
@@ -97,10 +290,112 @@ async def reverse_geocode(device):
         except:
             data = None
 
-        return Address(data)
+        if not data:
+            return None
+
+        return Address(data, keep_raw=self.__keep_raw)
+
+
+def get_geocoder(detail=None):
+    """The backend that should answer a detail level
+
+    Attributes:
+        detail (str): "country", "state", "city" or "street"
+    """
+    if _GEOCODER["primary"] is None:
+        _GEOCODER["primary"] = NominatimGeocoder()
+    detail = detail if detail else _GEOCODER["detail"]
+    primary = _GEOCODER["primary"]
+    fallback = _GEOCODER["fallback"]
+    if fallback is not None and not primary.supports(detail):
+        return fallback
+    return primary
+
+
+def configure_geocoder(geocoder=None, fallback=None, detail="street"):
+    """Choose the reverse geocoder backends
+
+    Attributes:
+        geocoder (Geocoder): The primary backend, defaults to Nominatim
+        fallback (Geocoder): Used for detail the primary can not answer
+        detail (str): The detail level lookups ask for by default
+    """
+    if detail not in _DETAIL_LEVELS:
+        raise ValueError(f"Unknown detail level: {detail}")
+    _GEOCODER["primary"] = geocoder
+    _GEOCODER["fallback"] = fallback
+    _GEOCODER["detail"] = detail
+
+
+async def reverse_geocode(device, priority=None, detail=None):
+    """Find the address of a device's current location
+
+    Attributes:
+        device (Device): The device to geocode
+        priority (int): Governor priority, defaults to whether an address is known
+        detail (str): The detail level needed, defaults to the configured level
+    """
+    if not (device.latitude and device.longitude):
+        return None
+
+    try:
+        device_point = Point(device.latitude, device.longitude)
+    except:
+        device_point = None
+
+    if not device_point:
+        return None
+
+    geocoder = get_geocoder(detail)
+    if not geocoder.remote:
+        return geocoder.reverse(device_point.x, device_point.y)
+
+    point_id = cache_key(device_point.x, device_point.y)
+
+    cache = get_cache()
+    from_cache = _still_inside(cache.get(point_id), device_point)
+
+    if from_cache:
+        return from_cache
+
+    store = get_store()
+    if store is not None:
+        try:
+            fields = await device.loop.run_in_executor(
+                get_executor(), store.get, point_id
+            )
+        except Exception as err:
+            _LOGGER.error("Unable to read the geocode store")
+            _LOGGER.exception(err)
+            fields = None
+        from_store = _still_inside(Address.from_dict(fields), device_point)
+        if from_store:
+            cache.set(point_id, from_store)
+            return from_store
+
+    def fetch_and_store():
+        address = geocoder.reverse(device_point.x, device_point.y)
+        if address and store is not None:
+            try:
+                store.set(point_id, address.as_dict())
+            except Exception as err:
+                _LOGGER.error("Unable to write the geocode store")
+                _LOGGER.exception(err)
+        return address
+
+    async def fetch():
+        address = await device.loop.run_in_executor(get_executor(), fetch_and_store)
+        if address:
+            cache.set(point_id, address)
+        return address
+
+    if priority is None:
+        priority = PRIORITY_MISSING if device.address is None else PRIORITY_REFRESH
 
     try:
-        address = await device.loop.run_in_executor(None, get_nominatim_reverse)
+        address = await get_governor(device.loop).lookup(point_id, fetch, priority)
+    except GeocodeDropped:
+        raise
     except Exception as err:
         _LOGGER.exception(err)
         raise err
@@ -108,14 +403,51 @@ async def reverse_geocode(device):
     if not address:
         return None
 
-    setattr(__GEO_CACHE, point_id, {"ts": datetime.now(), "address": address})
+    return address
+
+
+def _still_inside(address, device_point):
+    if not address or not _CACHE_KEY["polygon"]:
+        return address
+    polygon = address.polygon
+    if polygon and not polygon.contains(Point(device_point.y, device_point.x)):
+        _LOGGER.debug("Cached address no longer contains %s", device_point)
+        return None
     return address
 
 
 class Address(object):
-    def __init__(self, payload={}):
+    __slots__ = (
+        "__payload",
+        "__attribution",
+        "__query",
+        "__place_id",
+        "__osm_type",
+        "__osm_id",
+        "__type",
+        "__accuracy",
+        "__label",
+        "__name",
+        "__country",
+        "__postcode",
+        "__state",
+        "__city",
+        "__district",
+        "__street",
+        "__polygon",
+        "__shape",
+    )
+
+    def __init__(self, payload={}, keep_raw=False):
+        """Create an Address from a Nominatim geocodejson response
+
+        Attributes:
+            payload (dict): The geocodejson response
+            keep_raw (bool): Keep the whole response available as raw
+        """
         super().__init__()
-        self.__payload = payload
+        if keep_raw:
+            self.__payload = payload
         if "geocoding" in payload:
             if "attribution" in payload["geocoding"]:
                 self.__attribution = payload["geocoding"]["attribution"]
@@ -158,11 +490,91 @@ class Address(object):
                 and feature["geometry"]["type"].lower() == "polygon"
                 and feature["geometry"]["coordinates"][0]
             ):
-                self.__polygon = []
+                self.__polygon = array("d")
                 for point_data in feature["geometry"]["coordinates"][0]:
                     if not point_data:
                         continue
-                    self.__polygon.append(Point(point_data[0], point_data[1]))
+                    self.__polygon.append(float(point_data[0]))
+                    self.__polygon.append(float(point_data[1]))
+
+    @classmethod
+    def from_dict(cls, fields):
+        """Rebuild an Address from the fields saved by as_dict()
+
+        Attributes:
+            fields (dict): The address fields
+        """
+        if not fields:
+            return None
+        address = cls({})
+        if fields.get("attribution") is not None:
+            address.__attribution = fields["attribution"]
+        if fields.get("query") is not None:
+            address.__query = fields["query"]
+        if fields.get("place_id") is not None:
+            address.__place_id = fields["place_id"]
+        if fields.get("osm_type") is not None:
+            address.__osm_type = fields["osm_type"]
+        if fields.get("osm_id") is not None:
+            address.__osm_id = fields["osm_id"]
+        if fields.get("type") is not None:
+            address.__type = fields["type"]
+        if fields.get("accuracy") is not None:
+            address.__accuracy = fields["accuracy"]
+        if fields.get("label") is not None:
+            address.__label = fields["label"]
+        if fields.get("name") is not None:
+            address.__name = fields["name"]
+        if fields.get("country") is not None:
+            address.__country = fields["country"]
+        if fields.get("postcode") is not None:
+            address.__postcode = fields["postcode"]
+        if fields.get("state") is not None:
+            address.__state = fields["state"]
+        if fields.get("city") is not None:
+            address.__city = fields["city"]
+        if fields.get("district") is not None:
+            address.__district = fields["district"]
+        if fields.get("street") is not None:
+            address.__street = fields["street"]
+        if fields.get("polygon"):
+            address.__polygon = array("d")
+            for x, y in fields["polygon"]:
+                address.__polygon.append(float(x))
+                address.__polygon.append(float(y))
+        return address
+
+    def as_dict(self):
+        """The fields this Address exposes, without the raw payload"""
+        try:
+            polygon = self.__polygon
+            polygon = [
+                [polygon[i], polygon[i + 1]] for i in range(0, len(polygon), 2)
+            ]
+        except AttributeError:
+            polygon = None
+        try:
+            query = self.__query
+        except AttributeError:
+            query = None
+        return {
+            "attribution": self.attribution,
+            "query": query,
+            "place_id": self.place_id,
+            "osm_type": self.osm_type,
+            "osm_id": self.osm_id,
+            "type": self.location_type,
+            "accuracy": self.accuracy,
+            "label": self.label,
+            "name": self.name,
+            "country": self.country,
+            "postcode": self.postcode,
+            "state": self.state,
+            "city": self.city,
+            "district": self.district,
+            "street": self.street,
+            "polygon": polygon,
+        }
 
     @property
     def raw(self):
@@ -186,9 +598,17 @@ class Address(object):
 
     @property
     def polygon(self):
-        if not self.__polygon:
+        try:
+            polygon = self.__polygon
+        except AttributeError:
+            return None
+        if not polygon:
             return None
-        return Polygon([[p.x, p.y] for p in self.__polygon])
+        try:
+            return self.__shape
+        except AttributeError:
+            self.__shape = Polygon(polygon)
+        return self.__shape
 
     @property
     def latitude(self):
@@ -313,6 +733,8 @@ class OSMReverseFailed(Exception):
 class Point(object):
     """Standin because shapely can't be installed in Home Assistant"""
 
+    __slots__ = ("__x", "__y")
+
     def __init__(self, x, y):
         """Create a Point Object
 
@@ -341,30 +763,155 @@ class Point(object):
 
     @property
     def wkt(self):
-        return "POINT (" + str(self.__x) + " " + str(self.__y) + ")"
+        return f"POINT ({self.__x} {self.__y})"
+
+    @property
+    def wkb(self):
+        return struct.pack("<BIdd", 1, 1, self.__x, self.__y)
 
 
 class Polygon(object):
     """Standin because shapely can't be installed in Home Assistant"""
 
+    __slots__ = ("__coordinates", "__bounds", "__vectors")
+
     def __init__(self, coordinates):
         """Create a Polygon Object
 
         Attributes:
-            coordinates (list):  A list of X,Y coordinates to generate the polygon
+            coordinates (list|array):  X,Y pairs, or a flat array("d") of X then Y
         """
         super().__init__()
-        self.__coordinates = coordinates
+        if isinstance(coordinates, array) and coordinates.typecode == "d":
+            self.__coordinates = coordinates
+        else:
+            self.__coordinates = array("d")
+            for coordinate in coordinates:
+                self.__coordinates.append(float(coordinate[0]))
+                self.__coordinates.append(float(coordinate[1]))
+        self.__bounds = None
+        self.__vectors = None
 
     def __repr__(self):
         return self.wkt
 
+    def __len__(self):
+        return len(self.__coordinates) // 2
+
+    @property
+    def coords(self):
+        coordinates = self.__coordinates
+        return list(zip(coordinates[0::2], coordinates[1::2]))
+
+    @property
+    def bounds(self):
+        """The bounding box as (min x, min y, max x, max y)"""
+        if self.__bounds is None:
+            coordinates = self.__coordinates
+            if not coordinates:
+                return None
+            xs = coordinates[0::2]
+            ys = coordinates[1::2]
+            self.__bounds = (min(xs), min(ys), max(xs), max(ys))
+        return self.__bounds
+
+    @property
+    def area(self):
+        """The planar area, in squared units of the co-ordinates"""
+        coordinates = self.__coordinates
+        count = len(coordinates) // 2
+        if count < 3:
+            return 0.0
+        if numpy is not None and count >= _NUMPY_MIN_VERTICES:
+            xs, ys = self.__arrays()
+            total = numpy.dot(xs, numpy.roll(ys, -1))
+            total -= numpy.dot(ys, numpy.roll(xs, -1))
+            return float(abs(total) / 2)
+        total = 0.0
+        xj, yj = coordinates[-2], coordinates[-1]
+        for i in range(0, len(coordinates), 2):
+            xi, yi = coordinates[i], coordinates[i + 1]
+            total += xj * yi - xi * yj
+            xj, yj = xi, yi
+        return abs(total) / 2
+
+    def __arrays(self):
+        if self.__vectors is None:
+            vertices = numpy.frombuffer(self.__coordinates, dtype=numpy.float64)
+            self.__vectors = (vertices[0::2], vertices[1::2])
+        return self.__vectors
+
+    def contains(self, point):
+        """Check whether a point falls inside the polygon
+
+        Attributes:
+            point (Point): The point, in the same axis order as the polygon
+        """
+        return self.contains_xy(point.x, point.y)
+
+    def contains_xy(self, x, y):
+        """Check whether a co-ordinate falls inside the polygon
+
+        Attributes:
+            x (float): The X co-ordinate
+            y (float): The Y co-ordinate
+        """
+        bounds = self.bounds
+        if not bounds or not (
+            bounds[0] <= x <= bounds[2] and bounds[1] <= y <= bounds[3]
+        ):
+            return False
+        if numpy is not None and len(self) >= _NUMPY_MIN_VERTICES:
+            return bool(self.contains_many([x], [y])[0])
+        inside = False
+        coordinates = self.__coordinates
+        xj, yj = coordinates[-2], coordinates[-1]
+        for i in range(0, len(coordinates), 2):
+            xi, yi = coordinates[i], coordinates[i + 1]
+            if (yi > y) != (yj > y) and x < (xj - xi) * (y - yi) / (yj - yi) + xi:
+                inside = not inside
+            xj, yj = xi, yi
+        return inside
+
+    def contains_many(self, xs, ys):
+        """Check many co-ordinates at once, vectorized when NumPy is available
+
+        Attributes:
+            xs (list): The X co-ordinates
+            ys (list): The Y co-ordinates
+        """
+        if numpy is None:
+            return [self.contains_xy(x, y) for x, y in zip(xs, ys)]
+        if not self.__coordinates:
+            return numpy.zeros(len(xs), dtype=bool)
+        px = numpy.asarray(xs, dtype=numpy.float64)[:, None]
+        py = numpy.asarray(ys, dtype=numpy.float64)[:, None]
+        xi, yi = self.__arrays()
+        xj = numpy.roll(xi, 1)
+        yj = numpy.roll(yi, 1)
+        crosses = (yi > py) != (yj > py)
+        with numpy.errstate(divide="ignore", invalid="ignore"):
+            edge_x = (xj - xi) * (py - yi) / (yj - yi) + xi
+        return numpy.logical_xor.reduce(crosses & (px < edge_x), axis=1)
+
     @property
     def wkt(self):
-        response = "POLYGON (("
-        for idx, coordinate in enumerate(self.__coordinates, start=1):
-            if idx > 1:
-                response += ", "
-            response += str(coordinate[0]) + " " + str(coordinate[1])
-        response += "))"
-        return response
+        coordinates = self.__coordinates
+        return (
+            "POLYGON (("
+            + ", ".join(
+                f"{x} {y}" for x, y in zip(coordinates[0::2], coordinates[1::2])
+            )
+            + "))"
+        )
+
+    @property
+    def wkb(self):
+        coordinates = self.__coordinates
+        if sys.byteorder != "little":
+            coordinates = array("d", coordinates)
+            coordinates.byteswap()
+        return (
+            struct.pack("<BIII", 1, 3, 1, len(self.__coordinates) // 2)
+            + coordinates.tobytes()
+        )
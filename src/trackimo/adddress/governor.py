@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+"""
+Nominatim request governor for Trackimo
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+
+_LOGGER = logging.getLogger(__name__)
+
+PRIORITY_MISSING = 0
+"""Lookup for a device that has no address yet"""
+
+PRIORITY_REFRESH = 1
+"""Lookup for a device that already has an address"""
+
+
+class GeocodeDropped(Exception):
+    """Exception raised when a lookup is dropped from a full queue
+
+    Attributes:
+        message (str): explanation of the error
+        key (str): The lookup dropped
+    """
+
+    def __init__(self, message, key=None):
+        super().__init__()
+        self.message = message
+        self.key = key
+
+
+class GeocodeGovernor(object):
+    """Rate limit, coalesce and prioritise reverse geocode lookups"""
+
+    def __init__(self, loop=None, rate=1.0, max_queue=256):
+        """Create a GeocodeGovernor Object
+
+        Attributes:
+            loop (object): The asyncio event loop
+            rate (float): Lookups allowed per second
+            max_queue (int): Lookups that may wait before some are dropped, a
+                dropped lookup raises GeocodeDropped
+        """
+        super().__init__()
+        self.__loop = loop if loop else asyncio.get_event_loop()
+        self.__rate = float(rate)
+        self.__max_queue = max(1, int(max_queue))
+        self.__queue = []
+        self.__inflight = {}
+        self.__waiters = {}
+        self.__sequence = itertools.count()
+        self.__dispatcher = None
+        self.__next_allowed = 0
+        self.__queued = 0
+        self.__coalesced = 0
+        self.__dropped = 0
+        self.__completed = 0
+        self.__failed = 0
+        self.__cancelled = 0
+
+    async def lookup(self, key, fetch, priority=PRIORITY_REFRESH):
+        """Run a lookup once a slot is free, sharing it with identical lookups
+
+        Attributes:
+            key (str): Identifies the lookup, usually the geocode cache key
+            fetch (callable): Returns an awaitable performing the lookup
+            priority (int): Lower values are served first
+        """
+        future = self.__inflight.get(key)
+        if future is not None:
+            self.__coalesced += 1
+            return await self.__wait(key, future)
+
+        if len(self.__queue) >= self.__max_queue:
+            victim = max(self.__queue)
+            if priority >= victim[0]:
+                self.__dropped += 1
+                _LOGGER.debug("Geocode queue is full, dropping lookup %s", key)
+                raise GeocodeDropped("Geocode queue is full", key=key)
+            self.__queue.remove(victim)
+            heapq.heapify(self.__queue)
+            self.__drop(victim[2])
+
+        future = self.__loop.create_future()
+        self.__inflight[key] = future
+        heapq.heappush(self.__queue, (priority, next(self.__sequence), key, fetch))
+        self.__queued += 1
+
+        if not self.__dispatcher or self.__dispatcher.done():
+            self.__dispatcher = self.__loop.create_task(self.__dispatch())
+
+        return await self.__wait(key, future)
+
+    async def __wait(self, key, future):
+        self.__waiters[future] = self.__waiters.get(future, 0) + 1
+        try:
+            return await asyncio.shield(future)
+        finally:
+            waiting = self.__waiters.pop(future) - 1
+            if waiting:
+                self.__waiters[future] = waiting
+            elif not future.done():
+                self.__abandon(key, future)
+
+    def __abandon(self, key, future):
+        # Every waiter was cancelled, so forget the lookup unless it is running
+        if self.__inflight.get(key) is not future:
+            return
+        queue = [queued for queued in self.__queue if queued[2] != key]
+        if len(queue) == len(self.__queue):
+            return
+        heapq.heapify(queue)
+        self.__queue = queue
+        del self.__inflight[key]
+        self.__cancelled += 1
+        _LOGGER.debug("Nobody is waiting for lookup %s, dropping it", key)
+        future.cancel()
+
+    def __drop(self, key, reason="Geocode queue is full"):
+        self.__dropped += 1
+        _LOGGER.debug("%s, dropping lookup %s", reason, key)
+        future = self.__inflight.pop(key, None)
+        if future is not None and not future.done():
+            future.set_exception(GeocodeDropped(reason, key=key))
+            future.exception()
+
+    async def __dispatch(self):
+        while self.__queue:
+            delay = self.__next_allowed - self.__loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if not self.__queue:
+                break
+            priority, sequence, key, fetch = heapq.heappop(self.__queue)
+            if self.__rate > 0:
+                self.__next_allowed = self.__loop.time() + 1 / self.__rate
+            future = self.__inflight.get(key)
+            running = None
+            try:
+                running = asyncio.ensure_future(fetch())
+                result = await asyncio.shield(running)
+            except asyncio.CancelledError:
+                # Waiters must hear about it, or they would wait forever
+                self.__failed += 1
+                if future is not None and not future.done():
+                    future.set_exception(
+                        GeocodeDropped("Geocode lookup was cancelled", key=key)
+                    )
+                    future.exception()
+                if running is not None and running.cancelled():
+                    # Only the lookup was cancelled, such as by its executor
+                    # shutting down, so carry on with the rest of the queue
+                    continue
+                if running is not None:
+                    running.cancel()
+                for queued in self.__queue:
+                    self.__drop(queued[2], "Geocode governor stopped")
+                self.__queue = []
+                raise
+            except Exception as err:
+                self.__failed += 1
+                if future is not None and not future.done():
+                    future.set_exception(err)
+                    future.exception()
+            else:
+                self.__completed += 1
+                if future is not None and not future.done():
+                    future.set_result(result)
+            finally:
+                if self.__inflight.get(key) is future:
+                    self.__inflight.pop(key, None)
+
+    @property
+    def loop(self):
+        return self.__loop
+
+    @property
+    def rate(self):
+        return self.__rate
+
+    @rate.setter
+    def rate(self, rate):
+        self.__rate = float(rate)
+
+    @property
+    def queue_depth(self):
+        return len(self.__queue)
+
+    @property
+    def stats(self):
+        return {
+            "queue_depth": len(self.__queue),
+            "queued": self.__queued,
+            "coalesced": self.__coalesced,
+            "dropped": self.__dropped,
+            "completed": self.__completed,
+            "failed": self.__failed,
+            "cancelled": self.__cancelled,
+        }
@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+"""
+Offline reverse geocoder for Trackimo
+"""
+
+import logging
+import math
+from array import array
+
+from .geocode import Address, Geocoder
+from .spatial import haversine
+
+_LOGGER = logging.getLogger(__name__)
+
+_ATTRIBUTION = "Data (c) GeoNames, CC BY 4.0"
+"""Attribution for GeoNames derived addresses"""
+
+
+class OfflineGeocoder(Geocoder):
+    """Nearest place lookup against a local GeoNames gazetteer"""
+
+    remote = False
+    detail = "city"
+
+    def __init__(
+        self,
+        path,
+        admin1_path=None,
+        country_path=None,
+        feature_classes=("P",),
+        min_population=0,
+        max_distance=50,
+        cell_size=1.0,
+    ):
+        """Create an OfflineGeocoder Object
+
+        Attributes:
+            path (str): A GeoNames places file, ie cities500.txt
+            admin1_path (str): GeoNames admin1CodesASCII.txt for state names
+            country_path (str): GeoNames countryInfo.txt for country names
+            feature_classes (tuple): GeoNames feature classes to load
+            min_population (int): Skip places smaller than this
+            max_distance (float): Kilometres beyond which no place is returned
+            cell_size (float): Degrees covered by each cell of the index
+        """
+        super().__init__()
+        self.__cell_size = float(cell_size)
+        self.__max_distance = max_distance
+        self.__latitudes = array("d")
+        self.__longitudes = array("d")
+        self.__names = []
+        self.__countries = []
+        self.__admin1 = []
+        self.__cells = {}
+        self.__admin1_names = (
+            self.__load_names(admin1_path, 0, 1) if admin1_path else {}
+        )
+        self.__country_names = (
+            self.__load_names(country_path, 0, 4) if country_path else {}
+        )
+        self.__load(path, set(feature_classes or ()), min_population)
+
+    @staticmethod
+    def __load_names(path, key_column, name_column):
+        names = {}
+        with open(path, encoding="utf-8") as lines:
+            for line in lines:
+                if not line.strip() or line.startswith("#"):
+                    continue
+                columns = line.rstrip("\n").split("\t")
+                if len(columns) > max(key_column, name_column):
+                    names[columns[key_column]] = columns[name_column]
+        return names
+
+    def __load(self, path, feature_classes, min_population):
+        with open(path, encoding="utf-8") as lines:
+            for line in lines:
+                columns = line.rstrip("\n").split("\t")
+                if len(columns) < 15:
+                    continue
+                if feature_classes and columns[6] not in feature_classes:
+                    continue
+                try:
+                    latitude = float(columns[4])
+                    longitude = float(columns[5])
+                    population = int(columns[14] or 0)
+                except ValueError:
+                    continue
+                if population < min_population:
+                    continue
+                index = len(self.__names)
+                self.__latitudes.append(latitude)
+                self.__longitudes.append(longitude)
+                self.__names.append(columns[1])
+                self.__countries.append(columns[8])
+                self.__admin1.append(columns[10])
+                self.__cells.setdefault(self.__cell(latitude, longitude), []).append(
+                    index
+                )
+        _LOGGER.debug("Loaded %d places from %s", len(self.__names), path)
+
+    def __cell(self, latitude, longitude):
+        return (
+            math.floor(latitude / self.__cell_size),
+            math.floor(longitude / self.__cell_size),
+        )
+
+    def __len__(self):
+        return len(self.__names)
+
+    @staticmethod
+    def __ring(row, column, ring, rows):
+        """The cells on the edge of a square ring, at most rows above or below"""
+        if not ring:
+            yield row, column
+            return
+        if ring <= rows:
+            for cell_column in range(column - ring, column + ring + 1):
+                yield row - ring, cell_column
+                yield row + ring, cell_column
+        reach = min(ring - 1, rows)
+        for cell_row in range(row - reach, row + reach + 1):
+            yield cell_row, column - ring
+            yield cell_row, column + ring
+
+    def nearest(self, latitude, longitude, max_distance=None):
+        """Find the index and distance in km of the closest place
+
+        Returns (None, None) when no place is within max_distance.
+
+        Attributes:
+            latitude (float): The latitude in degrees
+            longitude (float): The longitude in degrees
+            max_distance (float): Kilometres to search, default the geocoder's
+                max_distance, searching the whole gazetteer when that is None
+        """
+        if not self.__names:
+            return None, None
+        if max_distance is None:
+            max_distance = self.__max_distance
+        # Roughly 111 km per degree of latitude
+        limit = max_distance / 111.32 if max_distance is not None else 180
+        row, column = self.__cell(latitude, longitude)
+        rows = math.ceil(limit / self.__cell_size)
+        columns = int(360 / self.__cell_size)
+        cos_latitude = math.cos(math.radians(latitude))
+        best = None
+        best_distance = None
+        ring = 0
+        while True:
+            for cell_row, cell_column in self.__ring(row, column, ring, rows):
+                wrapped = ((cell_column + columns // 2) % columns) - columns // 2
+                for index in self.__cells.get((cell_row, wrapped), ()):
+                    d_lat = self.__latitudes[index] - latitude
+                    d_lon = ((self.__longitudes[index] - longitude + 180) % 360) - 180
+                    distance = d_lat * d_lat + (d_lon * cos_latitude) ** 2
+                    if best_distance is None or distance < best_distance:
+                        best = index
+                        best_distance = distance
+            # Anything in the next ring is at least a full ring of cells away
+            reach = ring * self.__cell_size * max(cos_latitude, 0.01)
+            if best is not None and reach * reach >= best_distance:
+                break
+            if reach > limit or ring * self.__cell_size > 180:
+                break
+            ring += 1
+        if best is None:
+            return None, None
+        distance = haversine(
+            latitude, longitude, self.__latitudes[best], self.__longitudes[best]
+        ) / 1000
+        if max_distance is not None and distance > max_distance:
+            return None, None
+        return best, distance
+
+    def reverse(self, latitude, longitude):
+        index, distance = self.nearest(latitude, longitude)
+        if index is None:
+            return None
+        if self.__max_distance is not None and distance > self.__max_distance:
+            return None
+        country_code = self.__countries[index]
+        country = self.__country_names.get(country_code, country_code)
+        state = self.__admin1_names.get(
+            f"{country_code}.{self.__admin1[index]}", self.__admin1[index]
+        )
+        city = self.__names[index]
+        return Address.from_dict(
+            {
+                "attribution": _ATTRIBUTION,
+                "query": f"{latitude},{longitude}",
+                "type": "city",
+                "label": ", ".join(part for part in (city, state, country) if part),
+                "name": city,
+                "city": city,
+                "state": state or None,
+                "country": country or None,
+            }
+        )
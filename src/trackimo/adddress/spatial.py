@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""
+Spatial helpers for Trackimo geocoding
+"""
+
+import math
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+"""The geohash alphabet"""
+
+_METRES_PER_DEGREE = 111320.0
+"""Approximate metres per degree of latitude"""
+
+_EARTH_RADIUS = 6371008.8
+"""Mean radius of the earth in metres"""
+
+
+def haversine(latitude1, longitude1, latitude2, longitude2):
+    """Great circle distance between two positions in metres
+
+    Attributes:
+        latitude1 (float): The first latitude in degrees
+        longitude1 (float): The first longitude in degrees
+        latitude2 (float): The second latitude in degrees
+        longitude2 (float): The second longitude in degrees
+    """
+    d_lat = math.radians(latitude2 - latitude1)
+    d_lon = math.radians(longitude2 - longitude1)
+    a = (
+        math.sin(d_lat / 2) ** 2
+        + math.cos(math.radians(latitude1))
+        * math.cos(math.radians(latitude2))
+        * math.sin(d_lon / 2) ** 2
+    )
+    return 2 * _EARTH_RADIUS * math.asin(min(1.0, math.sqrt(a)))
+
+
+def geohash(latitude, longitude, precision=8):
+    """Encode a position as a geohash
+
+    Attributes:
+        latitude (float): The latitude in degrees
+        longitude (float): The longitude in degrees
+        precision (int): Characters in the hash, 8 is roughly 38m x 19m
+    """
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True
+    while len(chars) < precision:
+        if even:
+            mid = (lon_range[0] + lon_range[1]) / 2
+            if longitude >= mid:
+                bits = (bits << 1) | 1
+                lon_range[0] = mid
+            else:
+                bits = bits << 1
+                lon_range[1] = mid
+        else:
+            mid = (lat_range[0] + lat_range[1]) / 2
+            if latitude >= mid:
+                bits = (bits << 1) | 1
+                lat_range[0] = mid
+            else:
+                bits = bits << 1
+                lat_range[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(_BASE32[bits])
+            bits = 0
+            bit_count = 0
+    return "".join(chars)
+
+
+def grid_cell(latitude, longitude, metres=25):
+    """Find the square grid cell a position falls in
+
+    Attributes:
+        latitude (float): The latitude in degrees
+        longitude (float): The longitude in degrees
+        metres (float): The width of a grid cell in metres
+    """
+    lat_step = metres / _METRES_PER_DEGREE
+    row = math.floor(latitude / lat_step)
+    centre = math.radians((row + 0.5) * lat_step)
+    lon_step = metres / (_METRES_PER_DEGREE * max(math.cos(centre), 1e-6))
+    column = math.floor(longitude / lon_step)
+    return (row, column)
+
+
+def grid_key(latitude, longitude, metres=25):
+    """Encode a position as a metre grid cell key
+
+    Attributes:
+        latitude (float): The latitude in degrees
+        longitude (float): The longitude in degrees
+        metres (float): The width of a grid cell in metres
+    """
+    row, column = grid_cell(latitude, longitude, metres)
+    return f"grid:{metres:g}:{row}:{column}"
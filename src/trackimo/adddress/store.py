@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+"""
+Persistent reverse geocode store for Trackimo
+"""
+
+import json
+import logging
+import sqlite3
+import threading
+import time
+from datetime import timedelta
+
+_LOGGER = logging.getLogger(__name__)
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS addresses ("
+    "key TEXT PRIMARY KEY, expires REAL NOT NULL, fields TEXT NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS addresses_expires ON addresses (expires)",
+)
+"""Tables used by the store"""
+
+
+class GeoStore(object):
+    """Address fields kept in SQLite so several processes can share them"""
+
+    def __init__(self, path, ttl=timedelta(days=30), timeout=5):
+        """Create a GeoStore Object
+
+        Attributes:
+            path (str): The SQLite database file
+            ttl (timedelta|int): How long an entry lives
+            timeout (int): Seconds to wait on a database locked by another process
+        """
+        super().__init__()
+        self.__path = path
+        self.__timeout = timeout
+        self.__ttl = ttl.total_seconds() if isinstance(ttl, timedelta) else float(ttl)
+        self.__connection = None
+        self.__lock = threading.Lock()
+        with self.__lock:
+            connection = self.__connect()
+            with connection:
+                for statement in _SCHEMA:
+                    connection.execute(statement)
+
+    def __connect(self):
+        # One connection shared by every thread, only used under the lock
+        if self.__connection is not None:
+            return self.__connection
+        connection = sqlite3.connect(
+            self.__path, timeout=self.__timeout, check_same_thread=False
+        )
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        self.__connection = connection
+        return connection
+
+    def get(self, key):
+        """Fetch the stored fields for a key, or None if missing or expired
+
+        Attributes:
+            key (str): The spatial cache key
+        """
+        with self.__lock:
+            row = (
+                self.__connect()
+                .execute(
+                    "SELECT fields FROM addresses WHERE key = ? AND expires > ?",
+                    (key, time.time()),
+                )
+                .fetchone()
+            )
+        if not row:
+            return None
+        try:
+            return json.loads(row[0])
+        except ValueError:
+            _LOGGER.warning("Discarding unreadable geocode entry %s", key)
+            return None
+
+    def set(self, key, fields):
+        """Store the fields for a key
+
+        Attributes:
+            key (str): The spatial cache key
+            fields (dict): The address fields
+        """
+        with self.__lock:
+            connection = self.__connect()
+            with connection:
+                connection.execute(
+                    "INSERT OR REPLACE INTO addresses (key, expires, fields) "
+                    "VALUES (?, ?, ?)",
+                    (key, time.time() + self.__ttl, json.dumps(fields)),
+                )
+
+    def compact(self):
+        """Remove expired entries and reclaim their space"""
+        with self.__lock:
+            connection = self.__connect()
+            with connection:
+                removed = connection.execute(
+                    "DELETE FROM addresses WHERE expires <= ?", (time.time(),)
+                ).rowcount
+            connection.execute("VACUUM")
+        _LOGGER.debug("Removed %d expired geocode entries", removed)
+        return removed
+
+    def __len__(self):
+        with self.__lock:
+            cursor = self.__connect().execute("SELECT COUNT(*) FROM addresses")
+            return cursor.fetchone()[0]
+
+    def close(self):
+        """Close the database connection, it is reopened on next use"""
+        with self.__lock:
+            if self.__connection is not None:
+                self.__connection.close()
+                self.__connection = None
+
+    @property
+    def path(self):
+        return self.__path
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""
+Background reverse geocoding for Trackimo
+"""
+
+import asyncio
+import logging
+
+from .geocode import reverse_geocode
+from .governor import GeocodeDropped
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class GeocodeWorker(object):
+    """Resolve device addresses off the polling path"""
+
+    def __init__(self, loop=None, workers=2, callback=None):
+        """Create a GeocodeWorker Object
+
+        Attributes:
+            loop (object): The asyncio event loop
+            workers (int): How many lookups run at once
+            callback (callable): Called with (device, address, latitude,
+                longitude) once resolved, the position being the one geocoded
+        """
+        super().__init__()
+        self.__loop = loop if loop else asyncio.get_event_loop()
+        self.__workers = max(1, int(workers))
+        self.__callback = callback
+        self.__queue = None
+        self.__pending = {}
+        self.__active = set()
+        self.__tasks = []
+
+    def __start(self):
+        if self.__tasks:
+            return
+        self.__queue = asyncio.Queue()
+        for idx in range(self.__workers):
+            self.__tasks.append(self.__loop.create_task(self.__work()))
+        for device_id in self.__pending:
+            self.__queue.put_nowait(device_id)
+
+    def submit(self, device):
+        """Queue a device for geocoding, replacing any lookup still waiting
+
+        Attributes:
+            device (Device): The device to geocode
+        """
+        if device.id in self.__active:
+            return
+        if device.id in self.__pending:
+            self.__pending[device.id] = device
+            return
+        self.__pending[device.id] = device
+        if not self.__tasks:
+            self.__start()
+        else:
+            self.__queue.put_nowait(device.id)
+
+    async def __work(self):
+        while True:
+            device_id = await self.__queue.get()
+            try:
+                device = self.__pending.pop(device_id, None)
+                if not device:
+                    continue
+                self.__active.add(device_id)
+                latitude, longitude = device.latitude, device.longitude
+                try:
+                    address = await reverse_geocode(device)
+                finally:
+                    self.__active.discard(device_id)
+                if self.__callback:
+                    self.__callback(device, address, latitude, longitude)
+            except GeocodeDropped:
+                _LOGGER.debug("Geocode of %s dropped, keeping its address", device_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as err:
+                _LOGGER.error("Unable to geocode device %s", device_id)
+                _LOGGER.exception(err)
+            finally:
+                self.__active.discard(device_id)
+                self.__queue.task_done()
+
+    async def join(self):
+        """Wait until every queued lookup has been resolved"""
+        if self.__queue:
+            await self.__queue.join()
+
+    async def close(self):
+        """Stop the workers, dropping any queued lookups"""
+        tasks = self.__tasks
+        self.__tasks = []
+        self.__pending = {}
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    @property
+    def queue_depth(self):
+        return len(self.__pending)
@@ -164,3 +164,29 @@ class TrackimoLoginFailed(Error):
         self.json = json
         self.headers = headers
         self.response = response
+
+
+class TrackimoCircuitOpen(TrackimoAPIError):
+    """Exception raised without calling the API while it is known to be failing
+
+    Attributes:
+        message (str): explanation of the error
+        retry_in (float): Seconds until the API will be tried again
+    """
+
+    def __init__(self, message, retry_in=None):
+        super().__init__(message)
+        self.retry_in = retry_in
+
+
+class TrackimoTimeout(TrackimoAPIError):
+    """Exception raised when the Trackimo API does not answer in time
+
+    Attributes:
+        message (str): explanation of the error
+        timeout (float): The seconds that were allowed
+    """
+
+    def __init__(self, message, timeout=None):
+        super().__init__(message)
+        self.timeout = timeout
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+Thread pools for Trackimo's blocking work
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class ThreadPool(ThreadPoolExecutor):
+    """A sized thread pool that reports how busy it is"""
+
+    def __init__(self, workers=4, name="trackimo"):
+        """Create a ThreadPool
+
+        Attributes:
+            workers (int): Threads in the pool
+            name (str): Prefix for the thread names
+        """
+        self.__workers = max(1, int(workers))
+        super().__init__(max_workers=self.__workers, thread_name_prefix=name)
+        self.__lock = threading.Lock()
+        self.__queued = 0
+        self.__active = 0
+        self.__completed = 0
+        self.__closed = False
+        self.__futures = set()
+
+    def submit(self, fn, *args, **kwargs):
+        """Schedule a call, counting it while it waits and runs"""
+
+        def run():
+            with self.__lock:
+                self.__queued -= 1
+                self.__active += 1
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with self.__lock:
+                    self.__active -= 1
+                    self.__completed += 1
+
+        def done(future):
+            with self.__lock:
+                self.__futures.discard(future)
+                if future.cancelled():
+                    self.__queued -= 1
+
+        with self.__lock:
+            self.__queued += 1
+        try:
+            future = super().submit(run)
+        except Exception:
+            with self.__lock:
+                self.__queued -= 1
+            raise
+        with self.__lock:
+            self.__futures.add(future)
+        future.add_done_callback(done)
+        return future
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        """Stop accepting calls, optionally cancelling those not yet started
+
+        Cancels pending calls itself, as the cancel_futures argument of
+        ThreadPoolExecutor.shutdown needs Python 3.9.
+
+        Attributes:
+            wait (bool): Wait for running calls to finish
+            cancel_futures (bool): Cancel calls still waiting for a thread
+        """
+        self.__closed = True
+        if cancel_futures:
+            with self.__lock:
+                futures = list(self.__futures)
+            for future in futures:
+                future.cancel()
+        super().shutdown(wait=wait)
+
+    @property
+    def closed(self):
+        return self.__closed
+
+    @property
+    def stats(self):
+        return {
+            "workers": self.__workers,
+            "active": self.__active,
+            "queued": self.__queued,
+            "completed": self.__completed,
+        }
@@ -0,0 +1,308 @@
+# -*- coding: utf-8 -*-
+"""
+Prometheus metrics exporter for Trackimo trackers
+"""
+
+import asyncio
+import logging
+
+from .adddress.geocode import executor_stats, get_cache, governor_stats
+
+_logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+"""The Prometheus text exposition format"""
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _number(value):
+    if value is None:
+        return "NaN"
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, int):
+        return str(value)
+    return repr(float(value))
+
+
+class _Family(object):
+    """Collects the samples of one metric for rendering"""
+
+    def __init__(self, name, kind, help):
+        super().__init__()
+        self.name = name
+        self.kind = kind
+        self.help = help
+        self.samples = []
+
+    def add(self, value, suffix="", **labels):
+        self.samples.append((suffix, labels, value))
+
+    def histogram(self, snapshot, **labels):
+        for bound, count in snapshot["buckets"]:
+            self.add(count, "_bucket", le=_number(bound), **labels)
+        self.add(snapshot["sum"], "_sum", **labels)
+        self.add(snapshot["count"], "_count", **labels)
+
+    def render(self, lines):
+        lines.append(f"# HELP {self.name} {self.help}")
+        lines.append(f"# TYPE {self.name} {self.kind}")
+        for suffix, labels, value in self.samples:
+            label_text = ",".join(
+                f'{key}="{_escape(label)}"' for key, label in labels.items()
+            )
+            label_text = "{" + label_text + "}" if label_text else ""
+            lines.append(f"{self.name}{suffix}{label_text} {_number(value)}")
+
+
+class PrometheusExporter(object):
+    """Serve a tracker's metrics at /metrics in the Prometheus text format"""
+
+    def __init__(self, handler, host="127.0.0.1", port=9464, path="/metrics"):
+        """Create a PrometheusExporter
+
+        Attributes:
+            handler (DeviceHandler): The device handler being tracked
+            host (str): Address to listen on
+            port (int): Port to listen on, 0 to pick a free one
+            path (str): The path metrics are served at
+        """
+        super().__init__()
+        self.__handler = handler
+        self.__host = host
+        self.__port = port
+        self.__path = path
+        self.__server = None
+
+    @property
+    def port(self):
+        """The port being listened on"""
+        if not self.__server or not self.__server.sockets:
+            return self.__port
+        return self.__server.sockets[0].getsockname()[1]
+
+    async def start(self):
+        """Start listening for scrapes"""
+        if self.__server:
+            return self
+        self.__server = await asyncio.start_server(
+            self.__serve, host=self.__host, port=self.__port
+        )
+        _logger.debug("Serving metrics on %s:%d%s", self.__host, self.port, self.__path)
+        return self
+
+    async def close(self):
+        """Stop listening for scrapes"""
+        if not self.__server:
+            return
+        server = self.__server
+        self.__server = None
+        server.close()
+        await server.wait_closed()
+
+    async def __serve(self, reader, writer):
+        try:
+            request = await asyncio.wait_for(reader.readline(), 10)
+            while True:
+                line = await asyncio.wait_for(reader.readline(), 10)
+                if not line or line in (b"\r\n", b"\n"):
+                    break
+            parts = request.decode("latin-1").split()
+            if len(parts) < 2 or parts[0] not in ("GET", "HEAD"):
+                status, body = "405 Method Not Allowed", b""
+            elif parts[1].split("?")[0] != self.__path:
+                status, body = "404 Not Found", b""
+            else:
+                try:
+                    status, body = "200 OK", self.render().encode("utf-8")
+                except Exception as err:
+                    _logger.error("Unable to render metrics")
+                    _logger.exception(err)
+                    status, body = "500 Internal Server Error", b""
+            head = (
+                f"HTTP/1.1 {status}\r\n"
+                f"Content-Type: {CONTENT_TYPE}\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                "Connection: close\r\n\r\n"
+            )
+            writer.write(head.encode("latin-1"))
+            if parts and parts[0] != "HEAD":
+                writer.write(body)
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    def render(self):
+        """The current metrics in the Prometheus text format"""
+        families = []
+
+        def family(name, kind, help):
+            metric = _Family(name, kind, help)
+            families.append(metric)
+            return metric
+
+        handler = self.__handler
+        protocol = handler.protocol
+        api = protocol.metrics
+        endpoints = api["endpoints"]
+
+        duration = family(
+            "trackimo_api_request_duration_seconds",
+            "histogram",
+            "Trackimo API request latency by endpoint.",
+        )
+        requests = family(
+            "trackimo_api_requests_total",
+            "counter",
+            "Trackimo API responses by endpoint and status code.",
+        )
+        errors = family(
+            "trackimo_api_errors_total",
+            "counter",
+            "Trackimo API requests that got no response.",
+        )
+        retries = family(
+            "trackimo_api_retries_total", "counter", "Trackimo API requests retried."
+        )
+        received = family(
+            "trackimo_api_received_bytes_total",
+            "counter",
+            "Bytes received from the Trackimo API.",
+        )
+        sent = family(
+            "trackimo_api_sent_bytes_total",
+            "counter",
+            "Bytes sent to the Trackimo API.",
+        )
+        for key, endpoint in sorted(endpoints.items()):
+            method, path = key.split(" ", 1)
+            duration.histogram(endpoint["latency"], method=method, path=path)
+            for status, count in sorted(endpoint["status"].items()):
+                requests.add(count, method=method, path=path, status=status)
+            errors.add(endpoint["errors"], method=method, path=path)
+            retries.add(endpoint["retries"], method=method, path=path)
+            received.add(endpoint["bytes_in"], method=method, path=path)
+            sent.add(endpoint["bytes_out"], method=method, path=path)
+
+        family(
+            "trackimo_token_refreshes_total", "counter", "Access token refreshes."
+        ).add(api["token_refreshes"])
+
+        limits = protocol.limits
+        family(
+            "trackimo_api_in_flight", "gauge", "Trackimo API requests in flight."
+        ).add(limits["in_flight"])
+        family(
+            "trackimo_api_waiting",
+            "gauge",
+            "Trackimo API requests waiting for the rate limiter.",
+        ).add(limits["waiting"])
+        family(
+            "trackimo_circuit_open",
+            "gauge",
+            "1 while the circuit breaker is failing requests fast.",
+        ).add(1 if protocol.circuit["state"] == "open" else 0)
+
+        queued = family(
+            "trackimo_executor_queued", "gauge", "Blocking calls waiting for a thread."
+        )
+        active = family(
+            "trackimo_executor_active", "gauge", "Threads running a blocking call."
+        )
+        for pool, stats in (
+            ("api", protocol.threads),
+            ("geocode", executor_stats()),
+        ):
+            queued.add(stats["queued"], pool=pool)
+            active.add(stats["active"], pool=pool)
+
+        track = handler.track_metrics
+        family(
+            "trackimo_track_cycle_duration_seconds",
+            "histogram",
+            "Time taken by each track cycle.",
+        ).histogram(track["duration"])
+        family(
+            "trackimo_track_devices_changed",
+            "histogram",
+            "Devices changed per track cycle.",
+        ).histogram(track["changed"])
+        family(
+            "trackimo_track_cycles_failed_total",
+            "counter",
+            "Track cycles that failed with an API error.",
+        ).add(track["failed"])
+        family(
+            "trackimo_track_cycles_timed_out_total",
+            "counter",
+            "Track cycles that ran past their deadline.",
+        ).add(track["timed_out"])
+        schedule = track["schedule"]
+        if schedule:
+            family(
+                "trackimo_track_cycle_lag_seconds",
+                "histogram",
+                "How late each track cycle started against its cadence.",
+            ).histogram(schedule["lag"])
+            family(
+                "trackimo_track_cycles_skipped_total",
+                "counter",
+                "Track cycles skipped or coalesced because a cycle overran.",
+            ).add(schedule["skipped"] + schedule["coalesced"])
+
+        cache = get_cache().stats
+        lookups = cache["hits"] + cache["misses"]
+        family(
+            "trackimo_geocode_cache_hits_total", "counter", "Geocode cache hits."
+        ).add(cache["hits"])
+        family(
+            "trackimo_geocode_cache_misses_total", "counter", "Geocode cache misses."
+        ).add(cache["misses"])
+        family(
+            "trackimo_geocode_cache_hit_ratio",
+            "gauge",
+            "Share of geocode lookups answered from the cache.",
+        ).add(cache["hits"] / lookups if lookups else None)
+        family(
+            "trackimo_geocode_cache_entries", "gauge", "Addresses in the geocode cache."
+        ).add(cache["size"])
+
+        depth = family(
+            "trackimo_geocode_queue_depth", "gauge", "Geocode lookups waiting."
+        )
+        depth.add(handler.geocode_queue_depth, queue="worker")
+        depth.add(governor_stats()["queue_depth"], queue="governor")
+
+        devices = handler.devices
+        family("trackimo_devices", "gauge", "Devices being tracked.").add(len(devices))
+        age = family(
+            "trackimo_device_location_age_seconds",
+            "gauge",
+            "Seconds since each device's location was last updated.",
+        )
+        for device_id, device in sorted(devices.items()):
+            device_age = device.age
+            if device_age is not None:
+                age.add(device_age, device_id=device_id, name=device.name or "")
+
+        intervals = handler.poll_intervals
+        if intervals:
+            poll = family(
+                "trackimo_device_poll_interval_seconds",
+                "gauge",
+                "Seconds between polls of each device while tracking adaptively.",
+            )
+            for device_id, interval in sorted(intervals.items()):
+                device = devices.get(device_id)
+                name = device.name if device and device.name else ""
+                poll.add(interval, device_id=device_id, name=name)
+
+        lines = []
+        for metric in families:
+            metric.render(lines)
+        return "\n".join(lines) + "\n"
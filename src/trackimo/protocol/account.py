@@ -5,6 +5,8 @@ Account class for Trackimo
 import logging
 from distutils.util import strtobool
 
+from .. import tracing
+
 _logger = logging.getLogger(__name__)
 
 
@@ -13,6 +15,7 @@ class AccountHandler(object):
         super().__init__()
         self.__protocol = protocol
 
+    @tracing.traced("trackimo.account.build")
     async def build(self):
         data = await self.__protocol.api_get(f"accounts/{self.__protocol.accountid}")
 
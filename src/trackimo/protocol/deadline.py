@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""
+Overall deadlines for Trackimo calls
+"""
+
+import asyncio
+import contextvars
+
+from ..exceptions import TrackimoTimeout
+
+_DEADLINE = contextvars.ContextVar("trackimo_deadline", default=None)
+"""Loop time by which the current piece of work must finish"""
+
+
+def remaining(loop=None):
+    """Seconds left before the current deadline, None if there is none
+
+    Attributes:
+        loop (object): The asyncio event loop
+    """
+    deadline = _DEADLINE.get()
+    if deadline is None:
+        return None
+    loop = loop if loop else asyncio.get_event_loop()
+    return max(0.0, deadline - loop.time())
+
+
+def clear():
+    """Stop the current context inheriting a deadline"""
+    _DEADLINE.set(None)
+
+
+async def within(awaitable, timeout=None, loop=None):
+    """Await something, cancelling it if the deadline passes
+
+    A deadline set by an outer call is never extended, so nested calls
+    only ever shorten it.
+
+    Attributes:
+        awaitable (object): The coroutine to run
+        timeout (float|timedelta): Seconds allowed, None to only honour outer deadlines
+        loop (object): The asyncio event loop
+    """
+    if timeout is None:
+        return await awaitable
+    if hasattr(timeout, "total_seconds"):
+        timeout = timeout.total_seconds()
+
+    loop = loop if loop else asyncio.get_event_loop()
+    deadline = loop.time() + timeout
+    outer = _DEADLINE.get()
+    if outer is not None:
+        deadline = min(deadline, outer)
+
+    token = _DEADLINE.set(deadline)
+    try:
+        return await asyncio.wait_for(awaitable, max(0.0, deadline - loop.time()))
+    except asyncio.TimeoutError:
+        raise TrackimoTimeout(
+            "Trackimo API deadline exceeded.",
+            timeout=timeout,
+        )
+    finally:
+        _DEADLINE.reset(token)
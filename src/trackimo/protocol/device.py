@@ -8,16 +8,93 @@ import sys
 import os
 from datetime import datetime, timedelta
 import asyncio
-from ..adddress.geocode import reverse_geocode
+import time
+from ..adddress.geocode import reverse_geocode, executor_stats
+from ..adddress.governor import GeocodeDropped
+from ..adddress.spatial import haversine
+from ..adddress.worker import GeocodeWorker
+from ..exceptions import TrackimoAPIError, TrackimoTimeout
+from . import deadline
+from .. import tracing
+from .metrics import Histogram, CYCLE_BUCKETS, CHANGE_BUCKETS
+from .scheduler import FixedRateScheduler, SKIP
+from .polling import AdaptivePolicy, PollQueue
+from .events import (
+    DeviceEvent,
+    Dispatcher,
+    EventSubscription,
+    Subscription,
+    BLOCK,
+    DROP_OLDEST,
+    POSITION,
+    ACCURACY,
+    BATTERY,
+    LOCATION_TYPE,
+    ADDRESS,
+)
 
 _logger = logging.getLogger(__name__)
 
+_ADDRESS_FIELDS = frozenset((ADDRESS,))
+
 
 class DeviceHandler(object):
-    def __init__(self, protocol):
+    def __init__(
+        self,
+        protocol,
+        geocode_workers=2,
+        geocode_distance=50,
+        geocode_ttl=timedelta(hours=24),
+        geocode_max_hdop=None,
+        geocode_triangulated=True,
+        locations_chunk_size=250,
+        locations_concurrency=4,
+    ):
+        """Create a DeviceHandler
+
+        Attributes:
+            protocol (Protocol): The Trackimo protocol handler
+            geocode_workers (int): Background geocode lookups, 0 to geocode inline
+            geocode_distance (float): Metres a device moves before re-geocoding
+            geocode_ttl (timedelta): Age at which an address is re-geocoded
+            geocode_max_hdop (float): Skip geocoding fixes with a worse hdop
+            geocode_triangulated (bool): Geocode triangulated (non GPS) fixes
+            locations_chunk_size (int): Devices per locations/filter request, no
+                more than the API returns in one page
+            locations_concurrency (int): Location requests in flight at once
+        """
         super().__init__()
         self.__protocol = protocol
         self.__devices = {}
+        self.__geocode_distance = geocode_distance
+        self.__geocode_ttl = (
+            geocode_ttl.total_seconds()
+            if isinstance(geocode_ttl, timedelta)
+            else geocode_ttl
+        )
+        self.__geocode_max_hdop = geocode_max_hdop
+        self.__geocode_triangulated = geocode_triangulated
+        self.__locations_chunk_size = max(1, int(locations_chunk_size))
+        self.__locations_concurrency = max(1, int(locations_concurrency))
+        self.__event_receiver = None
+        self.__subscriptions = []
+        self.__dispatcher = Dispatcher()
+        self.__cycle_duration = Histogram(CYCLE_BUCKETS)
+        self.__cycle_changes = Histogram(CHANGE_BUCKETS)
+        self.__cycles_failed = 0
+        self.__cycles_timed_out = 0
+        self.__last_cycle = None
+        self.__scheduler = None
+        self.__poll_queue = None
+        self.__geocoder = (
+            GeocodeWorker(
+                loop=protocol.loop,
+                workers=geocode_workers,
+                callback=self.__address_resolved,
+            )
+            if geocode_workers
+            else None
+        )
 
     @property
     def loop(self):
@@ -25,30 +102,116 @@ class DeviceHandler(object):
             return None
         return self.__protocol.loop
 
+    @property
+    def protocol(self):
+        return self.__protocol
+
+    @property
+    def devices(self):
+        return dict(self.__devices)
+
+    @property
+    def track_metrics(self):
+        """Cycle durations, devices changed per cycle and failed cycles"""
+        return {
+            "duration": self.__cycle_duration.snapshot(),
+            "changed": self.__cycle_changes.snapshot(),
+            "failed": self.__cycles_failed,
+            "timed_out": self.__cycles_timed_out,
+            "last": self.__last_cycle,
+            "schedule": self.__scheduler.stats if self.__scheduler else None,
+            "adaptive": self.__poll_queue.stats if self.__poll_queue else None,
+        }
+
+    @property
+    def poll_intervals(self):
+        """Seconds between polls of each device while tracking adaptively"""
+        if not self.__poll_queue:
+            return {}
+        return self.__poll_queue.intervals
+
     @property
     def __list(self):
         if not self.__devices:
             return []
         return [*self.__devices]
 
-    async def build(self, limit=20, page=1):
-        allDevices = await self.__listall(limit=limit, page=page)
-        while allDevices:
+    @tracing.traced("trackimo.devices.build")
+    async def build(self, limit=20, page=1, concurrency=10):
+        """Build all devices on the account
+
+        Pages of the device list are fetched until one comes back empty, or
+        shorter than the longest page seen, which also copes with a server
+        that caps pages below limit.
+
+        Attributes:
+            limit (int): Devices per page of the device list
+            page (int): First page of the device list
+            concurrency (int): Maximum devices (or list pages) fetched at once
+        """
+        concurrency = max(1, int(concurrency))
+        semaphore = asyncio.Semaphore(concurrency)
+        builds = []
+
+        async def build_device(device):
+            async with semaphore:
+                with tracing.span(
+                    "trackimo.device.build", {"trackimo.device_id": device.id}
+                ):
+                    await device.build(features=False)
+
+        def add_devices(allDevices):
             for deviceReference in allDevices:
                 if "deviceId" in deviceReference:
                     id = int(deviceReference["deviceId"])
+                    if id in self.__devices:
+                        continue
                     self.__devices[id] = Device(self, id)
-                    await self.__devices[id].build()
-            page += 1
-            allDevices = await self.__listall(limit=limit, page=page)
-        await self.__locations()
+                    builds.append(
+                        self.loop.create_task(build_device(self.__devices[id]))
+                    )
+
+        try:
+            allDevices = await self.__listall(limit=limit, page=page) or []
+            add_devices(allDevices)
+            page_size = len(allDevices)
+            more = page_size > 0
+            window = 1
+            while more:
+                pages = range(page + 1, page + 1 + window)
+                results = await asyncio.gather(
+                    *[self.__listall(limit=limit, page=p) for p in pages]
+                )
+                for allDevices in results:
+                    allDevices = allDevices or []
+                    add_devices(allDevices)
+                    if len(allDevices) < max(page_size, 1):
+                        more = False
+                    page_size = max(page_size, len(allDevices))
+                page += window
+                window = min(window * 2, concurrency)
+            builds.append(
+                self.loop.create_task(self.load_features(concurrency=concurrency))
+            )
+            await asyncio.gather(*builds)
+        except:
+            for build in builds:
+                build.cancel()
+            raise
+
+        await self.refresh_locations()
         return self.__devices
 
     async def __listall(self, limit=20, page=1):
         pagination = {"limit": limit, "page": page}
-        return await self.__protocol.api_get(
-            f"accounts/{self.__protocol.accountid}/devices", pagination
-        )
+        with tracing.span(
+            "trackimo.devices.page", {"trackimo.page": page, "trackimo.limit": limit}
+        ) as span:
+            allDevices = await self.__protocol.api_get(
+                f"accounts/{self.__protocol.accountid}/devices", pagination
+            )
+            span.set_attribute("trackimo.devices", len(allDevices or []))
+        return allDevices
 
     async def details(self, id):
         """Get device details
@@ -70,7 +233,9 @@ class DeviceHandler(object):
             f"accounts/{self.__protocol.accountid}/devices/{id}/location"
         )
 
-    async def history(self, id, start_date=None, end_date=None, limit=20, page=1):
+    async def history(
+        self, id, start_date=None, end_date=None, limit=20, page=1, timeout=None
+    ):
         """Get device history
 
         Attributes:
@@ -79,6 +244,7 @@ class DeviceHandler(object):
             end_date (datetime): End date for the history
             limit (int): Results per page
             page (int): Page number
+            timeout (float|timedelta): Overall deadline for the request
         """
         if not start_date:
             start_date = datetime.now() - timedelta(hours=24)
@@ -91,7 +257,9 @@ class DeviceHandler(object):
             "page": page,
         }
         return await self.__protocol.api_get(
-            f"accounts/{self.__protocol.accountid}/devices/{id}/history", data
+            f"accounts/{self.__protocol.accountid}/devices/{id}/history",
+            data,
+            timeout=timeout,
         )
 
     async def ops(self, id, operation="beep", options={}):
@@ -101,22 +269,292 @@ class DeviceHandler(object):
         )
 
     async def get_features(self, id):
+        """Get device features
+
+        Attributes:
+            id (int|list): The device id, or a list of device ids
+        """
         options = {}
-        options["deviceIds"] = id
+        options["deviceIds"] = (
+            ",".join(map(str, id)) if isinstance(id, (list, tuple, set)) else id
+        )
         return await self.__protocol.api(
             path="devices/features/deviceIds", data=options, use_internal_api=True
         )
 
-    async def __locations(self):
-        device_ids = self.__list
-        changed_devices = list()
-        pagination = {"limit": len(device_ids), "page": 1}
+    async def load_features(self, device_ids=None, chunk_size=50, concurrency=4):
+        """Fetch features for many devices at once and hand them to each device
+
+        Attributes:
+            device_ids (list): The device ids, defaults to every known device
+            chunk_size (int): Device ids sent per request
+            concurrency (int): Maximum requests in flight
+        """
+        if device_ids is None:
+            device_ids = self.__list
+        device_ids = [id for id in device_ids if id in self.__devices]
+        if not device_ids:
+            return
+
+        chunk_size = max(1, int(chunk_size))
+        semaphore = asyncio.Semaphore(max(1, int(concurrency)))
+
+        async def load_chunk(chunk):
+            async with semaphore:
+                with tracing.span(
+                    "trackimo.devices.features", {"trackimo.device_ids": chunk}
+                ):
+                    features_data = await self.get_features(chunk)
+            if not features_data:
+                return
+            by_device = {}
+            for device_features in features_data:
+                if "id" in device_features:
+                    id = int(device_features["id"])
+                elif len(chunk) == 1:
+                    id = chunk[0]
+                else:
+                    continue
+                by_device.setdefault(id, []).append(device_features)
+            for id, device_features in by_device.items():
+                if id in self.__devices:
+                    self.__devices[id].features_event(device_features)
+
+        await asyncio.gather(
+            *[
+                load_chunk(device_ids[idx : idx + chunk_size])
+                for idx in range(0, len(device_ids), chunk_size)
+            ]
+        )
+
+    async def geocode(self, device):
+        """Resolve the address of a device
+
+        Attributes:
+            device (Device): The device to geocode
+        """
+        if not self.__geocode_due(device):
+            return
+        if self.__geocoder:
+            self.__geocoder.submit(device)
+            return
+        latitude, longitude = device.latitude, device.longitude
+        try:
+            address = await reverse_geocode(device)
+        except GeocodeDropped:
+            _logger.debug("Geocode of %s dropped, keeping its address", device.id)
+            return
+        self.__address_resolved(device, address, latitude, longitude)
+
+    def __geocode_due(self, device):
+        return device.geocode_due(
+            distance=self.__geocode_distance,
+            ttl=self.__geocode_ttl,
+            max_hdop=self.__geocode_max_hdop,
+            triangulated=self.__geocode_triangulated,
+        )
+
+    def __address_resolved(self, device, address, latitude=None, longitude=None):
+        if device.address_event(address, latitude, longitude):
+            self.__emit("address", device, fields=_ADDRESS_FIELDS)
+        # The device may have moved on while its lookup waited
+        moved = (device.latitude, device.longitude) != (latitude, longitude)
+        if moved and self.__geocoder and self.__geocode_due(device):
+            self.__geocoder.submit(device)
+
+    def __emit(self, event_type, device, ts=None, fields=frozenset()):
+        event_receiver = self.__event_receiver
+        if not event_receiver and not self.__dispatcher.wants(device.id):
+            return
+        event = DeviceEvent(event_type, device, ts=ts, fields=fields)
+        self.__dispatcher.dispatch(event)
+        if not event_receiver:
+            return
+        try:
+            event_receiver(
+                event_type=event.event_type,
+                device_id=event.device_id,
+                device=event.device,
+                ts=event.ts,
+            )
+            _logger.debug(
+                "Change sent to event handler for %s (%d)",
+                device.name,
+                device.id,
+            )
+        except Exception as err:
+            _logger.exception(err)
+
+    def subscribe(
+        self, callback, device_ids=None, fields=None, event_types=None, predicate=None
+    ):
+        """Call back with the device events that match every filter given
+
+        The callback is passed one DeviceEvent, and is only looked at for
+        changes to the devices it asked for. Cancel the returned subscription
+        to stop.
+
+        Attributes:
+            callback (callable): Called with each matching DeviceEvent
+            device_ids (iterable): Only these devices, None for every device
+            fields (iterable): Only changes to these fields, any of "position",
+                "accuracy", "battery", "locationType" and "address"
+            event_types (iterable): Only "location" or "address" events
+            predicate (callable): Only events it returns True for
+        """
+        return self.__dispatcher.subscribe(
+            Subscription(
+                callback,
+                device_ids=device_ids,
+                fields=fields,
+                event_types=event_types,
+                predicate=predicate,
+            )
+        )
+
+    def events(
+        self,
+        maxsize=100,
+        overflow=DROP_OLDEST,
+        device_ids=None,
+        fields=None,
+        event_types=None,
+        predicate=None,
+    ):
+        """Subscribe to device events, read with async for
+
+        Every subscription gets its own queue, so a slow reader only holds up
+        itself. Close the subscription, or use it with async with, to stop.
+        The filters are the same as subscribe()'s.
+
+        Attributes:
+            maxsize (int): Events held before the overflow policy applies
+            overflow (str): "block" to hold polling until there is room,
+                "drop_oldest" or "coalesce" to keep the latest per device
+            device_ids (iterable): Only these devices, None for every device
+            fields (iterable): Only changes to these fields
+            event_types (iterable): Only "location" or "address" events
+            predicate (callable): Only events it returns True for
+        """
+        stream = EventSubscription(
+            maxsize=maxsize, overflow=overflow, on_close=self.__unsubscribe
+        )
+        self.__subscriptions.append(
+            (
+                stream,
+                self.subscribe(
+                    stream.publish,
+                    device_ids=device_ids,
+                    fields=fields,
+                    event_types=event_types,
+                    predicate=predicate,
+                ),
+            )
+        )
+        return stream
+
+    def __unsubscribe(self, stream):
+        for entry in list(self.__subscriptions):
+            if entry[0] is stream:
+                entry[1].cancel()
+                self.__subscriptions.remove(entry)
+
+    async def __backpressure(self):
+        for stream, _ in list(self.__subscriptions):
+            if stream.overflow == BLOCK:
+                await stream.writable()
+
+    async def stop(self, timeout=None):
+        """Stop tracking once any poll in progress has finished
+
+        Attributes:
+            timeout (float): Seconds to let a poll drain before cancelling it
+        """
+        if self.__scheduler:
+            await self.__scheduler.stop(timeout=timeout)
+
+    async def close(self, timeout=10):
+        """Stop background work
+
+        Lookups only this handler was waiting for are dropped from the
+        geocode governor. The geocode thread pool is shared with every other
+        handler, so it is left running.
+
+        Attributes:
+            timeout (float): Seconds to let a poll drain before cancelling it
+        """
+        await self.stop(timeout=timeout)
+        for stream, _ in list(self.__subscriptions):
+            stream.close()
+        if self.__geocoder:
+            await self.__geocoder.close()
+
+    @property
+    def geocode_queue_depth(self):
+        if not self.__geocoder:
+            return 0
+        return self.__geocoder.queue_depth
+
+    @property
+    def geocode_threads(self):
+        """Worker count, busy threads and queued calls of the geocode executor"""
+        return executor_stats()
+
+    async def refresh_locations(self, device_ids=None):
+        """Fetch the latest locations, returning the ids of devices that changed
+
+        Devices are fetched in chunks, several at once, and each chunk stops
+        paging as soon as a page comes back short.
+
+        Attributes:
+            device_ids (list): The devices to fetch, defaults to every device
+        """
+        if device_ids is None:
+            device_ids = self.__list
+        else:
+            device_ids = [id for id in device_ids if id in self.__devices]
+        if not device_ids:
+            return []
+
         url = f"accounts/{self.__protocol.accountid}/locations/filter"
-        location_data = await self.__protocol.api_post(
-            url, data={"device_ids": device_ids}, query_string=pagination
+        semaphore = asyncio.Semaphore(self.__locations_concurrency)
+
+        async def fetch_chunk(chunk):
+            locations = []
+            outstanding = set(chunk)
+            pagination = {"limit": len(chunk), "page": 1}
+            async with semaphore:
+                while outstanding:
+                    attributes = {
+                        "trackimo.page": pagination["page"],
+                        "trackimo.device_ids": chunk,
+                    }
+                    with tracing.span("trackimo.locations.page", attributes):
+                        location_data = await self.__protocol.api_post(
+                            url,
+                            data={"device_ids": chunk},
+                            query_string=dict(pagination),
+                        )
+                    if not location_data:
+                        break
+                    locations.extend(location_data)
+                    for device_location_data in location_data:
+                        outstanding.discard(device_location_data.get("device_id"))
+                    if len(location_data) < pagination["limit"]:
+                        break
+                    pagination["page"] += 1
+            return locations
+
+        chunk_size = self.__locations_chunk_size
+        results = await asyncio.gather(
+            *[
+                fetch_chunk(device_ids[idx : idx + chunk_size])
+                for idx in range(0, len(device_ids), chunk_size)
+            ]
         )
-        while location_data:
-            pagination["page"] += 1
+
+        changed_devices = list()
+        for location_data in results:
             _logger.debug(location_data)
             for device_location_data in location_data:
                 if (
@@ -128,55 +566,115 @@ class DeviceHandler(object):
                     ].location_event(device_location_data)
                     if self.__devices[device_location_data["device_id"]].changed:
                         changed_devices.append(device_location_data["device_id"])
-            location_data = await self.__protocol.api_post(
-                url, data={"device_ids": device_ids}, query_string=pagination
-            )
         return changed_devices
 
-    async def __track(self, interval, event_receiver=None):
-        while True:
+    async def __cycle(self, timeout=None, device_ids=None):
+        await self.__backpressure()
+        with tracing.span("trackimo.track.cycle") as span:
             _logger.debug("track is checking for changes...")
-            changed_devices = await self.__locations()
+            started = time.monotonic()
+            try:
+                changed_devices = await deadline.within(
+                    self.refresh_locations(device_ids),
+                    timeout,
+                    loop=self.__protocol.loop,
+                )
+            except TrackimoTimeout:
+                _logger.warning("Location update took too long, skipping this cycle.")
+                self.__cycles_timed_out += 1
+                changed_devices = None
+            except TrackimoAPIError as err:
+                _logger.error("Unable to fetch locations: %s", err.message)
+                self.__cycles_failed += 1
+                changed_devices = None
+            else:
+                self.__cycle_changes.observe(len(changed_devices))
+            self.__cycle_duration.observe(time.monotonic() - started)
+            self.__last_cycle = datetime.now()
             if changed_devices:
                 _logger.debug(
                     "Devices changed: %s", ", ".join(map(str, changed_devices))
                 )
-                if event_receiver:
-                    for device_id in changed_devices:
-                        device = self.__devices[device_id]
-                        try:
-                            event_receiver(
-                                event_type="location",
-                                device_id=device_id,
-                                device=device,
-                                ts=datetime.now(),
-                            )
-                            _logger.debug(
-                                "Change sent to event handler for %s (%d)",
-                                device.name,
-                                device.id,
-                            )
-                        except Exception as err:
-                            _logger.exception(err)
-            await asyncio.sleep(interval.total_seconds())
-
-    def track(self, interval=None, event_receiver=None):
+                now = datetime.now()
+                for device_id in changed_devices:
+                    device = self.__devices[device_id]
+                    self.__emit(
+                        "location", device, ts=now, fields=device.changed_fields
+                    )
+            span.set_attribute("trackimo.changed", len(changed_devices or []))
+            return changed_devices
+
+    async def __adaptive_cycle(self, timeout=None):
+        queue = self.__poll_queue
+        loop = self.__protocol.loop
+        due = queue.pop_due(loop.time(), self.__devices)
+        if not due:
+            return
+        changed_devices = None
+        try:
+            changed_devices = await self.__cycle(timeout, due)
+        finally:
+            queue.reschedule(loop.time(), self.__devices, due, changed_devices)
+
+    def track(
+        self,
+        interval=None,
+        event_receiver=None,
+        timeout=None,
+        jitter=0,
+        overlap=SKIP,
+        adaptive=None,
+    ):
+        """Poll for location changes in the background
+
+        Polls start on a fixed cadence, so the period does not drift with the
+        time each poll takes. Use stop() to end tracking gracefully.
+
+        With adaptive tracking each device has its own interval, short while it
+        moves and growing while it stays parked. Every tick, the devices that
+        are due are polled together.
+
+        Attributes:
+            interval (int|timedelta): Time between polls, default 60 seconds, or
+                between ticks when adaptive, default the policy's tick
+            event_receiver (callable): Called for every event
+            timeout (float|timedelta): Deadline for each poll, default the interval
+            jitter (float|timedelta): Random delay of up to this much per poll
+            overlap (str): "skip" or "coalesce" polls missed by a long poll
+            adaptive (bool|AdaptivePolicy): Poll each device on its own interval
+        """
         if not self.__protocol.loop:
             return None
 
+        if adaptive:
+            policy = adaptive if isinstance(adaptive, AdaptivePolicy) else None
+            self.__poll_queue = PollQueue(policy)
+            if not interval:
+                interval = self.__poll_queue.policy.tick
+        else:
+            self.__poll_queue = None
+
         if not interval:
             interval = timedelta(seconds=60)
 
         if not isinstance(interval, timedelta):
             interval = timedelta(seconds=interval)
 
+        if timeout is None:
+            timeout = interval
+
         _logger.debug("Tracking devices every %d seconds...", interval.total_seconds())
 
-        task = self.__protocol.loop.create_task(
-            self.__track(interval=interval, event_receiver=event_receiver)
-        )
+        if self.__scheduler and self.__scheduler.task:
+            self.__scheduler.task.cancel()
 
-        return task
+        self.__event_receiver = event_receiver
+        self.__scheduler = FixedRateScheduler(
+            interval, loop=self.__protocol.loop, jitter=jitter, overlap=overlap
+        )
+        if self.__poll_queue:
+            return self.__scheduler.start(lambda: self.__adaptive_cycle(timeout))
+        return self.__scheduler.start(lambda: self.__cycle(timeout))
 
 
 class Device(object):
@@ -306,28 +804,88 @@ class Device(object):
             self.__locationTriangulated = None
             self.__locationType = None
 
-        self.__address = await reverse_geocode(self)
         self.__changed = self.__check_changed()
+        await self.__handler.geocode(self)
         return self.location
 
+    def geocode_due(self, distance=None, ttl=None, max_hdop=None, triangulated=True):
+        """Check whether the current location needs a fresh address
+
+        Attributes:
+            distance (float): Metres moved since the last address to re-geocode
+            ttl (float): Seconds after which the address is re-geocoded anyway
+            max_hdop (float): Skip fixes with a worse horizontal dilution
+            triangulated (bool): Whether triangulated fixes may be geocoded
+        """
+        latitude = self.latitude
+        longitude = self.longitude
+        if latitude is None or longitude is None:
+            return False
+        if not triangulated and self.triangulated:
+            return False
+        try:
+            hdop = self.__hdop
+        except AttributeError:
+            hdop = None
+        if max_hdop is not None and hdop is not None and hdop > max_hdop:
+            return False
+        try:
+            geocoded = self.__geocoded
+        except AttributeError:
+            return True
+        if not geocoded:
+            return True
+        geocoded_latitude, geocoded_longitude, geocoded_at = geocoded
+        if ttl is not None and time.monotonic() - geocoded_at >= ttl:
+            return True
+        if distance is None:
+            return True
+        moved = haversine(geocoded_latitude, geocoded_longitude, latitude, longitude)
+        return moved > distance
+
+    def address_event(self, address, latitude=None, longitude=None):
+        """Update the resolved address, returning True if it changed
+
+        Attributes:
+            address (Address): The address resolved
+            latitude (float): Latitude that was geocoded, default the current one
+            longitude (float): Longitude that was geocoded, default the current one
+        """
+        try:
+            previous = self.__address
+        except AttributeError:
+            previous = None
+        if latitude is None or longitude is None:
+            latitude, longitude = self.latitude, self.longitude
+        self.__address = address
+        self.__geocoded = (
+            (latitude, longitude, time.monotonic())
+            if address and latitude is not None and longitude is not None
+            else None
+        )
+        previous_label = previous.label if previous else None
+        label = address.label if address else None
+        return previous_label != label
+
     def __check_changed(self):
-        changed = False
+        fields = set()
         if not self.__previous_latitude == self.__latitude:
-            changed = True
+            fields.add(POSITION)
         if not self.__previous_longitude == self.__longitude:
-            changed = True
+            fields.add(POSITION)
         if not self.__previous_altitude == self.__altitude:
-            changed = True
+            fields.add(POSITION)
         if not self.__previous_battery == self.__battery:
-            changed = True
+            fields.add(BATTERY)
         if not self.__previous_hdop == self.__hdop:
-            changed = True
+            fields.add(ACCURACY)
         if not self.__previous_gps == self.__gps:
-            changed = True
+            fields.add(ACCURACY)
         if not self.__previous_locationTriangulated == self.__locationTriangulated:
-            changed = True
+            fields.add(ACCURACY)
         if not self.__previous_locationType == self.__locationType:
-            changed = True
+            fields.add(LOCATION_TYPE)
+        self.__changed_fields = frozenset(fields)
 
         self.__previous_latitude = self.__latitude
         self.__previous_longitude = self.__longitude
@@ -338,7 +896,7 @@ class Device(object):
         self.__previous_locationTriangulated = self.__locationTriangulated
         self.__previous_locationType = self.__locationType
 
-        return changed
+        return bool(fields)
 
     async def refresh(self):
         if not self.__id:
@@ -346,9 +904,18 @@ class Device(object):
         location_data = await self.__handler.location(self.__id)
         return await self.location_event(location_data)
 
-    async def build(self):
-        details_data = await self.__handler.details(self.__id)
-        features_data = await self.__get_features()
+    async def build(self, features=True):
+        """Fetch the device details
+
+        Attributes:
+            features (bool): Also fetch the features for this device alone
+        """
+        if features:
+            details_data, features_data = await asyncio.gather(
+                self.__handler.details(self.__id), self.__get_features()
+            )
+        else:
+            details_data = await self.__handler.details(self.__id)
 
         if details_data:
             self.__imsi = (
@@ -422,6 +989,9 @@ class Device(object):
 
     async def __get_features(self):
         features_data = await self.__handler.get_features(self.__id)
+        return self.features_event(features_data)
+
+    def features_event(self, features_data):
         if not features_data:
             return None
         _logger.debug("Updating device %d features data: %s", self.__id, features_data)
@@ -442,6 +1012,14 @@ class Device(object):
         except AttributeError:
             return None
 
+    @property
+    def changed_fields(self):
+        """The fields that changed in the latest location, such as position"""
+        try:
+            return self.__changed_fields
+        except AttributeError:
+            return frozenset()
+
     @property
     def location(self):
         data = {}
@@ -622,6 +1200,13 @@ class Device(object):
         except AttributeError:
             return None
 
+    @property
+    def moving(self):
+        try:
+            return self.__moving
+        except AttributeError:
+            return None
+
     @property
     def locationType(self):
         try:
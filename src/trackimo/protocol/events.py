@@ -0,0 +1,335 @@
+# -*- coding: utf-8 -*-
+"""
+Device event streams for Trackimo tracking
+"""
+
+import asyncio
+import collections
+import logging
+from datetime import datetime
+
+_logger = logging.getLogger(__name__)
+
+BLOCK = "block"
+"""Hold the next poll until the subscriber has room again"""
+
+DROP_OLDEST = "drop_oldest"
+"""Discard the oldest waiting event to make room"""
+
+COALESCE = "coalesce"
+"""Keep only the latest waiting event of each type for each device"""
+
+POSITION = "position"
+"""Latitude, longitude or altitude changed"""
+
+ACCURACY = "accuracy"
+"""Hdop, GPS or triangulation changed"""
+
+BATTERY = "battery"
+"""Battery level changed"""
+
+LOCATION_TYPE = "locationType"
+"""The kind of fix changed"""
+
+ADDRESS = "address"
+"""The resolved address changed"""
+
+
+class DeviceEvent(object):
+    """A change to a device
+
+    Attributes:
+        event_type (str): "location" or "address"
+        device_id (int): The device's id
+        device (Device): The device that changed
+        ts (datetime): When the change was seen
+        fields (frozenset): What changed, such as POSITION and BATTERY
+    """
+
+    __slots__ = ("event_type", "device_id", "device", "ts", "fields")
+
+    def __init__(self, event_type, device, ts=None, fields=frozenset()):
+        super().__init__()
+        self.event_type = event_type
+        self.device_id = device.id
+        self.device = device
+        self.ts = ts if ts else datetime.now()
+        self.fields = fields
+
+    def __repr__(self):
+        return f"<DeviceEvent {self.event_type} {self.device_id}>"
+
+
+class EventSubscription(object):
+    """A bounded queue of device events, read with async for
+
+    Publishing never waits. A BLOCK subscription lets its queue run past
+    maxsize for the rest of a poll, and the next poll waits for room instead.
+    """
+
+    def __init__(self, maxsize=100, overflow=DROP_OLDEST, on_close=None):
+        """Create an EventSubscription
+
+        Attributes:
+            maxsize (int): Events held before the overflow policy applies
+            overflow (str): BLOCK, DROP_OLDEST or COALESCE
+            on_close (callable): Called with the subscription once closed
+        """
+        super().__init__()
+        if overflow not in (BLOCK, DROP_OLDEST, COALESCE):
+            raise ValueError(f"Unknown overflow policy: {overflow}")
+        if maxsize < 1:
+            raise ValueError("maxsize must be at least 1")
+        self.__maxsize = int(maxsize)
+        self.__overflow = overflow
+        self.__on_close = on_close
+        self.__queue = collections.OrderedDict()
+        self.__sequence = 0
+        self.__ready = asyncio.Event()
+        self.__room = asyncio.Event()
+        self.__room.set()
+        self.__closed = False
+        self.__delivered = 0
+        self.__dropped = 0
+        self.__coalesced = 0
+
+    @property
+    def overflow(self):
+        return self.__overflow
+
+    @property
+    def closed(self):
+        return self.__closed
+
+    def __len__(self):
+        return len(self.__queue)
+
+    def publish(self, event):
+        """Queue an event without waiting, applying the overflow policy
+
+        Attributes:
+            event (DeviceEvent): The change to deliver
+        """
+        if self.__closed:
+            return
+        queue = self.__queue
+        if self.__overflow == COALESCE:
+            key = (event.event_type, event.device_id)
+            if key in queue:
+                queue[key] = event
+                self.__coalesced += 1
+                return
+        else:
+            self.__sequence += 1
+            key = self.__sequence
+
+        if len(queue) >= self.__maxsize:
+            if self.__overflow == BLOCK:
+                self.__room.clear()
+            else:
+                queue.popitem(last=False)
+                self.__dropped += 1
+        queue[key] = event
+        self.__ready.set()
+
+    async def writable(self):
+        """Wait until there is room for more events"""
+        await self.__room.wait()
+
+    async def get(self):
+        """The next event, waiting for one if need be
+
+        Raises StopAsyncIteration once the subscription is closed and empty.
+        """
+        while not self.__queue:
+            if self.__closed:
+                raise StopAsyncIteration
+            self.__ready.clear()
+            await self.__ready.wait()
+        _, event = self.__queue.popitem(last=False)
+        self.__delivered += 1
+        if len(self.__queue) < self.__maxsize:
+            self.__room.set()
+        return event
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return await self.get()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        self.close()
+
+    def close(self):
+        """Stop receiving events, ending iteration once the queue is empty"""
+        if self.__closed:
+            return
+        self.__closed = True
+        self.__ready.set()
+        self.__room.set()
+        if self.__on_close:
+            self.__on_close(self)
+
+    @property
+    def stats(self):
+        return {
+            "pending": len(self.__queue),
+            "maxsize": self.__maxsize,
+            "overflow": self.__overflow,
+            "delivered": self.__delivered,
+            "dropped": self.__dropped,
+            "coalesced": self.__coalesced,
+            "closed": self.__closed,
+        }
+
+
+class Subscription(object):
+    """A callback and the events it is interested in"""
+
+    __slots__ = (
+        "callback",
+        "device_ids",
+        "fields",
+        "event_types",
+        "predicate",
+        "_owner",
+    )
+
+    def __init__(
+        self, callback, device_ids=None, fields=None, event_types=None, predicate=None
+    ):
+        """Create a Subscription
+
+        Attributes:
+            callback (callable): Called with each matching DeviceEvent
+            device_ids (iterable): Only these devices, None for every device
+            fields (iterable): Only changes to these fields, None for any
+            event_types (iterable): Only these event types, None for any
+            predicate (callable): Only events it returns True for
+        """
+        super().__init__()
+        self.callback = callback
+        self.device_ids = frozenset(device_ids) if device_ids is not None else None
+        self.fields = frozenset(fields) if fields is not None else None
+        self.event_types = frozenset(event_types) if event_types is not None else None
+        self.predicate = predicate
+        self._owner = None
+
+    def matches(self, event):
+        """True if the event passes every filter but the device ids
+
+        Attributes:
+            event (DeviceEvent): The change being routed
+        """
+        if self.event_types is not None and event.event_type not in self.event_types:
+            return False
+        if self.fields is not None and self.fields.isdisjoint(event.fields):
+            return False
+        if self.predicate is not None and not self.predicate(event):
+            return False
+        return True
+
+    def cancel(self):
+        """Stop receiving events"""
+        if self._owner is not None:
+            self._owner.unsubscribe(self)
+
+
+class Dispatcher(object):
+    """Route events to subscriptions, indexed by device id
+
+    Only subscriptions for the event's device, or for every device, are
+    looked at for each event.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.__by_device = {}
+        self.__every_device = ()
+        self.__count = 0
+
+    def __len__(self):
+        return self.__count
+
+    def subscribe(self, subscription):
+        """Start routing events to a subscription
+
+        Attributes:
+            subscription (Subscription): The subscription to add
+        """
+        if subscription._owner is not None:
+            return subscription
+        subscription._owner = self
+        # Tuples are replaced rather than changed, so a callback may cancel
+        # or subscribe while an event is being dispatched.
+        if subscription.device_ids is None:
+            self.__every_device = self.__every_device + (subscription,)
+        else:
+            for device_id in subscription.device_ids:
+                subscriptions = self.__by_device.get(device_id, ())
+                self.__by_device[device_id] = subscriptions + (subscription,)
+        self.__count += 1
+        return subscription
+
+    def unsubscribe(self, subscription):
+        """Stop routing events to a subscription
+
+        Attributes:
+            subscription (Subscription): A subscription passed to subscribe
+        """
+        if subscription._owner is not self:
+            return
+        subscription._owner = None
+        if subscription.device_ids is None:
+            self.__every_device = tuple(
+                sub for sub in self.__every_device if sub is not subscription
+            )
+        else:
+            for device_id in subscription.device_ids:
+                remaining = tuple(
+                    sub
+                    for sub in self.__by_device.get(device_id, ())
+                    if sub is not subscription
+                )
+                if remaining:
+                    self.__by_device[device_id] = remaining
+                else:
+                    self.__by_device.pop(device_id, None)
+        self.__count -= 1
+
+    def wants(self, device_id):
+        """True if any subscription could match an event for a device
+
+        Attributes:
+            device_id (int): The device's id
+        """
+        return bool(self.__every_device) or device_id in self.__by_device
+
+    def dispatch(self, event):
+        """Hand an event to every matching subscription, returning how many
+
+        Attributes:
+            event (DeviceEvent): The change being routed
+        """
+        delivered = 0
+        for subscriptions in (
+            self.__by_device.get(event.device_id, ()),
+            self.__every_device,
+        ):
+            for subscription in subscriptions:
+                # Cancelled by an earlier callback for this same event
+                if subscription._owner is not self:
+                    continue
+                try:
+                    if not subscription.matches(event):
+                        continue
+                    subscription.callback(event)
+                    delivered += 1
+                except Exception as err:
+                    _logger.error("Event subscriber failed")
+                    _logger.exception(err)
+        return delivered
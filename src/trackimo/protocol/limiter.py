@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+"""
+Client side rate limiting for Trackimo
+"""
+
+import asyncio
+import logging
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+_logger = logging.getLogger(__name__)
+
+DEFAULT_LIMITS = {
+    "auth": (2, 5),
+    "locations": (10, 20),
+    "history": (5, 10),
+    "ops": (2, 5),
+    "default": (25, 50),
+}
+"""Requests per second and burst size for each endpoint class"""
+
+
+def endpoint_class(url):
+    """Work out which endpoint class a request url belongs to
+
+    Attributes:
+        url (str): The request url
+    """
+    if "/oauth2/" in url or url.endswith("/user/login"):
+        return "auth"
+    if "/ops/" in url:
+        return "ops"
+    if "/history" in url:
+        return "history"
+    if "/locations" in url or url.endswith("/location"):
+        return "locations"
+    return "default"
+
+
+def retry_after(value):
+    """Seconds to wait from a Retry-After header, or None
+
+    Attributes:
+        value (str): The header value, in seconds or as an HTTP date
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+class AdaptiveRateLimiter(object):
+    """Token bucket that slows down when the API pushes back"""
+
+    def __init__(
+        self, rate, burst, loop=None, min_rate=0.1, backoff=0.5, recovery=0.05
+    ):
+        """Create an AdaptiveRateLimiter
+
+        Attributes:
+            rate (float): Requests per second when the API is healthy
+            burst (int): Requests that may be sent back to back
+            loop (object): The asyncio event loop
+            min_rate (float): The slowest the limiter will back off to
+            backoff (float): Rate multiplier applied on each throttle
+            recovery (float): Share of the full rate regained per success
+        """
+        super().__init__()
+        self.__loop = loop if loop else asyncio.get_event_loop()
+        self.__max_rate = float(rate)
+        self.__rate = float(rate)
+        self.__burst = max(1.0, float(burst))
+        self.__min_rate = min(float(min_rate), self.__max_rate)
+        self.__backoff = backoff
+        self.__recovery = recovery
+        self.__tokens = self.__burst
+        self.__updated = self.__loop.time()
+        self.__paused_until = 0
+        self.__lock = asyncio.Lock()
+        self.__waiting = 0
+        self.__throttled = 0
+
+    def __refill(self, now):
+        elapsed = now - self.__updated
+        self.__updated = now
+        self.__tokens = min(self.__burst, self.__tokens + elapsed * self.__rate)
+
+    async def acquire(self):
+        """Wait for permission to send a request"""
+        self.__waiting += 1
+        try:
+            async with self.__lock:
+                while True:
+                    now = self.__loop.time()
+                    if now < self.__paused_until:
+                        await asyncio.sleep(self.__paused_until - now)
+                        continue
+                    self.__refill(now)
+                    if self.__tokens >= 1:
+                        self.__tokens -= 1
+                        return
+                    await asyncio.sleep((1 - self.__tokens) / self.__rate)
+        finally:
+            self.__waiting -= 1
+
+    def success(self):
+        """Let the rate recover after a healthy response"""
+        if self.__rate < self.__max_rate:
+            self.__rate = min(
+                self.__max_rate, self.__rate + self.__max_rate * self.__recovery
+            )
+
+    def throttle(self, delay=None):
+        """Slow down after a 429 or 5xx, pausing for Retry-After if given
+
+        Attributes:
+            delay (float): Seconds the API asked us to wait
+        """
+        self.__throttled += 1
+        self.__rate = max(self.__min_rate, self.__rate * self.__backoff)
+        self.__tokens = min(self.__tokens, 0)
+        if delay:
+            self.__paused_until = max(self.__paused_until, self.__loop.time() + delay)
+        _logger.debug(
+            "Throttled, rate now %.2f/s, paused for %s seconds", self.__rate, delay
+        )
+
+    @property
+    def stats(self):
+        return {
+            "rate": self.__rate,
+            "max_rate": self.__max_rate,
+            "waiting": self.__waiting,
+            "throttled": self.__throttled,
+            "paused": max(0.0, self.__paused_until - self.__loop.time()),
+        }
+
+
+class RequestLimiter(object):
+    """Per endpoint class rate limits plus a global in-flight cap"""
+
+    def __init__(self, loop=None, max_in_flight=16, limits=None):
+        """Create a RequestLimiter
+
+        Attributes:
+            loop (object): The asyncio event loop
+            max_in_flight (int): Requests allowed in flight at once
+            limits (dict): Endpoint class to (rate, burst), merged over DEFAULT_LIMITS
+        """
+        super().__init__()
+        self.__loop = loop if loop else asyncio.get_event_loop()
+        self.__max_in_flight = max(1, int(max_in_flight))
+        self.__semaphore = asyncio.Semaphore(self.__max_in_flight)
+        self.__in_flight = 0
+        self.__waiting = 0
+        merged = dict(DEFAULT_LIMITS)
+        merged.update(limits or {})
+        self.__limiters = {
+            name: AdaptiveRateLimiter(rate, burst, loop=self.__loop)
+            for name, (rate, burst) in merged.items()
+        }
+
+    def __limiter(self, endpoint):
+        return self.__limiters.get(endpoint) or self.__limiters["default"]
+
+    async def acquire(self, endpoint):
+        """Wait until a request to an endpoint class may be sent
+
+        Attributes:
+            endpoint (str): The endpoint class
+        """
+        self.__waiting += 1
+        try:
+            await self.__limiter(endpoint).acquire()
+            await self.__semaphore.acquire()
+        finally:
+            self.__waiting -= 1
+        self.__in_flight += 1
+
+    def release(self, endpoint, status_code=None, headers=None):
+        """Return the in-flight slot and adapt to the response
+
+        Attributes:
+            endpoint (str): The endpoint class
+            status_code (int): The HTTP status, None if there was no response
+            headers (object): The response headers
+        """
+        self.__in_flight -= 1
+        self.__semaphore.release()
+        limiter = self.__limiter(endpoint)
+        if status_code == 429 or (status_code and status_code >= 500):
+            limiter.throttle(retry_after((headers or {}).get("Retry-After")))
+        elif status_code:
+            limiter.success()
+
+    @property
+    def stats(self):
+        return {
+            "in_flight": self.__in_flight,
+            "max_in_flight": self.__max_in_flight,
+            "waiting": self.__waiting,
+            "endpoints": {
+                name: limiter.stats for name, limiter in self.__limiters.items()
+            },
+        }
@@ -0,0 +1,265 @@
+# -*- coding: utf-8 -*-
+"""
+Request instrumentation for Trackimo
+"""
+
+import json
+import re
+import threading
+import time
+from urllib.parse import urlsplit
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+"""Upper bounds of the latency histogram buckets in seconds"""
+
+CYCLE_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+"""Upper bounds of the track cycle duration buckets in seconds"""
+
+CHANGE_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+"""Upper bounds of the devices changed per cycle buckets"""
+
+_ID_SEGMENT = re.compile(r"/\d+(?=/|$)")
+"""Numeric path segments, replaced so requests group by endpoint"""
+
+
+def path_template(url):
+    """The endpoint a url belongs to, with ids replaced by {id}
+
+    Attributes:
+        url (str): The request url
+    """
+    return _ID_SEGMENT.sub("/{id}", urlsplit(url).path)
+
+
+def payload_size(data):
+    """Bytes a JSON payload takes on the wire
+
+    Attributes:
+        data (object): The payload, None for no body
+    """
+    if data is None:
+        return 0
+    try:
+        return len(json.dumps(data).encode("utf-8"))
+    except (TypeError, ValueError):
+        return 0
+
+
+class RequestEvent(object):
+    """One attempt at an API request, passed to every hook
+
+    Attributes:
+        method (str): The request verb
+        url (str): The request url
+        template (str): The url path with ids replaced by {id}
+        attempt (int): 1 for the first attempt, higher for retries
+        started (float): Monotonic time the request was sent
+        elapsed (float): Seconds until the response or error, not counting
+            any wait for a free transport thread
+        status_code (int): HTTP Status Code returned
+        bytes_out (int): Size of the JSON payload sent
+        bytes_in (int): Size of the body received
+        error (Exception): Why no response was received
+    """
+
+    __slots__ = (
+        "method",
+        "url",
+        "template",
+        "attempt",
+        "started",
+        "elapsed",
+        "status_code",
+        "bytes_out",
+        "bytes_in",
+        "error",
+    )
+
+    def __init__(self, method, url, attempt=1, bytes_out=0):
+        super().__init__()
+        self.method = method
+        self.url = url
+        self.template = path_template(url)
+        self.attempt = attempt
+        self.started = time.monotonic()
+        self.elapsed = None
+        self.status_code = None
+        self.bytes_out = bytes_out
+        self.bytes_in = 0
+        self.error = None
+
+
+class Histogram(object):
+    """Bucketed distribution of observed values"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        """Create a Histogram
+
+        Attributes:
+            buckets (tuple): Ascending bucket upper bounds
+        """
+        super().__init__()
+        self.__bounds = tuple(sorted(buckets))
+        self.__counts = [0] * (len(self.__bounds) + 1)
+        self.__count = 0
+        self.__sum = 0.0
+        self.__min = None
+        self.__max = None
+
+    def observe(self, value):
+        """Record a value
+
+        Attributes:
+            value (float): The value observed
+        """
+        idx = 0
+        for bound in self.__bounds:
+            if value <= bound:
+                break
+            idx += 1
+        self.__counts[idx] += 1
+        self.__count += 1
+        self.__sum += value
+        self.__min = value if self.__min is None else min(self.__min, value)
+        self.__max = value if self.__max is None else max(self.__max, value)
+
+    def quantile(self, q):
+        """Estimate a quantile from the bucket bounds
+
+        Attributes:
+            q (float): The quantile, between 0 and 1
+        """
+        if not self.__count:
+            return None
+        rank = q * self.__count
+        seen = 0
+        for bound, count in zip(self.__bounds, self.__counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.__max)
+        return self.__max
+
+    @property
+    def buckets(self):
+        """Cumulative (upper bound, count) pairs, ending with infinity"""
+        pairs = []
+        seen = 0
+        for bound, count in zip(self.__bounds + (float("inf"),), self.__counts):
+            seen += count
+            pairs.append((bound, seen))
+        return pairs
+
+    @property
+    def count(self):
+        return self.__count
+
+    @property
+    def sum(self):
+        return self.__sum
+
+    def snapshot(self):
+        return {
+            "count": self.__count,
+            "sum": self.__sum,
+            "min": self.__min,
+            "max": self.__max,
+            "mean": self.__sum / self.__count if self.__count else None,
+            "p50": self.quantile(0.5),
+            "p90": self.quantile(0.9),
+            "p99": self.quantile(0.99),
+            "buckets": self.buckets,
+        }
+
+
+class EndpointMetrics(object):
+    """Counters for one method and path template"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        super().__init__()
+        self.latency = Histogram(buckets)
+        self.status = {}
+        self.errors = 0
+        self.retries = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def snapshot(self):
+        return {
+            "requests": self.latency.count,
+            "errors": self.errors,
+            "retries": self.retries,
+            "status": dict(self.status),
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "latency": self.latency.snapshot(),
+        }
+
+
+class MetricsCollector(object):
+    """Hook that records latency, status codes, bytes and retries per endpoint"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        """Create a MetricsCollector
+
+        Attributes:
+            buckets (tuple): Latency histogram bucket bounds in seconds
+        """
+        super().__init__()
+        self.__buckets = buckets
+        self.__lock = threading.Lock()
+        self.__endpoints = {}
+        self.__token_refreshes = 0
+        self.__in_flight = 0
+
+    def __endpoint(self, event):
+        key = f"{event.method} {event.template}"
+        endpoint = self.__endpoints.get(key)
+        if endpoint is None:
+            endpoint = self.__endpoints[key] = EndpointMetrics(self.__buckets)
+        return endpoint
+
+    def on_request(self, event):
+        with self.__lock:
+            self.__in_flight += 1
+            endpoint = self.__endpoint(event)
+            endpoint.bytes_out += event.bytes_out
+            if event.attempt > 1:
+                endpoint.retries += 1
+
+    def on_response(self, event):
+        with self.__lock:
+            self.__in_flight -= 1
+            endpoint = self.__endpoint(event)
+            endpoint.latency.observe(event.elapsed)
+            endpoint.bytes_in += event.bytes_in
+            status = str(event.status_code)
+            endpoint.status[status] = endpoint.status.get(status, 0) + 1
+
+    def on_error(self, event):
+        with self.__lock:
+            self.__in_flight -= 1
+            endpoint = self.__endpoint(event)
+            endpoint.latency.observe(event.elapsed)
+            endpoint.errors += 1
+
+    def on_token_refresh(self):
+        with self.__lock:
+            self.__token_refreshes += 1
+
+    def reset(self):
+        """Forget everything recorded so far"""
+        with self.__lock:
+            self.__endpoints = {}
+            self.__token_refreshes = 0
+
+    def snapshot(self):
+        """Everything recorded so far, keyed by "METHOD /path/{id}" """
+        with self.__lock:
+            return {
+                "in_flight": self.__in_flight,
+                "token_refreshes": self.__token_refreshes,
+                "endpoints": {
+                    key: endpoint.snapshot()
+                    for key, endpoint in self.__endpoints.items()
+                },
+            }
@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+"""
+Adaptive per-device polling for Trackimo tracking
+"""
+
+import heapq
+import logging
+
+_logger = logging.getLogger(__name__)
+
+
+class AdaptivePolicy(object):
+    """Choose how long to wait before polling a device again"""
+
+    def __init__(
+        self,
+        tick=5,
+        min_interval=10,
+        max_interval=900,
+        moving=30,
+        moving_speed=3,
+        fast_speed=80,
+        stationary=120,
+        backoff=2,
+        low_battery=20,
+        low_battery_factor=2,
+    ):
+        """Create an AdaptivePolicy
+
+        Attributes:
+            tick (float): Seconds between checks for devices that are due
+            min_interval (float): Shortest wait between polls of a device
+            max_interval (float): Longest wait between polls of a device
+            moving (float): Wait for a device that is moving or just changed
+            moving_speed (float): km/h at which a device counts as moving
+            fast_speed (float): km/h at which a device is polled every
+                min_interval
+            stationary (float): Wait for a parked device, doubled by backoff for
+                every further poll that finds it unchanged
+            backoff (float): Growth of the parked wait per unchanged poll
+            low_battery (int): Battery percentage at which polls slow down
+            low_battery_factor (float): Wait multiplier on low battery
+        """
+        super().__init__()
+        for name, value in (
+            ("tick", tick),
+            ("min_interval", min_interval),
+            ("max_interval", max_interval),
+        ):
+            if value <= 0:
+                raise ValueError(f"{name} must be positive")
+        if max_interval < min_interval:
+            raise ValueError("max_interval must not be below min_interval")
+        self.tick = float(tick)
+        self.min_interval = float(min_interval)
+        self.max_interval = float(max_interval)
+        self.moving = float(moving)
+        self.moving_speed = moving_speed
+        self.fast_speed = fast_speed
+        self.stationary = float(stationary)
+        self.backoff = max(1.0, float(backoff))
+        self.low_battery = low_battery
+        self.low_battery_factor = max(1.0, float(low_battery_factor))
+
+    def interval(self, device, unchanged=1):
+        """Seconds until a device should next be polled
+
+        Attributes:
+            device (Device): The device just polled
+            unchanged (int): Polls in a row that found the device unchanged
+        """
+        speed = device.speedKMH or 0
+        if speed >= self.fast_speed:
+            interval = self.min_interval
+        elif device.moving or speed >= self.moving_speed or not unchanged:
+            interval = self.moving
+        else:
+            steps = min(unchanged - 1, 32)
+            interval = self.stationary * self.backoff**steps
+
+        battery = device.battery
+        if battery is not None and battery <= self.low_battery:
+            interval *= self.low_battery_factor
+
+        # A tracker that has not reported for a while is asleep, polling it
+        # faster than half its silence only reads the same fix again.
+        age = device.age
+        if age is not None and age > interval:
+            interval = max(interval, age / 2)
+
+        return min(max(interval, self.min_interval), self.max_interval)
+
+
+class PollQueue(object):
+    """Devices ordered by when they are next due to be polled"""
+
+    def __init__(self, policy=None):
+        """Create a PollQueue
+
+        Attributes:
+            policy (AdaptivePolicy): Picks each device's interval
+        """
+        super().__init__()
+        self.__policy = policy if policy else AdaptivePolicy()
+        self.__heap = []
+        self.__due = {}
+        self.__intervals = {}
+        self.__unchanged = {}
+        self.__batches = 0
+        self.__polled = 0
+
+    @property
+    def policy(self):
+        return self.__policy
+
+    def __push(self, device_id, due):
+        self.__due[device_id] = due
+        heapq.heappush(self.__heap, (due, device_id))
+
+    def pop_due(self, now, device_ids):
+        """Remove and return the devices due by now
+
+        Devices not seen before are due straight away, and devices no longer
+        tracked are forgotten.
+
+        Attributes:
+            now (float): The loop's monotonic time
+            device_ids (iterable): Every device being tracked
+        """
+        device_ids = set(device_ids)
+        for device_id in device_ids:
+            if device_id not in self.__due:
+                self.__unchanged[device_id] = 0
+                self.__push(device_id, now)
+
+        due = []
+        heap = self.__heap
+        while heap and heap[0][0] <= now:
+            when, device_id = heapq.heappop(heap)
+            if self.__due.get(device_id) != when:
+                continue
+            if device_id not in device_ids:
+                self.__forget(device_id)
+                continue
+            due.append(device_id)
+        if due:
+            self.__batches += 1
+            self.__polled += len(due)
+        return due
+
+    def __forget(self, device_id):
+        self.__due.pop(device_id, None)
+        self.__intervals.pop(device_id, None)
+        self.__unchanged.pop(device_id, None)
+
+    def reschedule(self, now, devices, polled, changed=None):
+        """Work out when polled devices are next due
+
+        Attributes:
+            now (float): The loop's monotonic time
+            devices (dict): Tracked devices by id
+            polled (list): The ids just polled
+            changed (list): The ids that changed, None if the poll failed
+        """
+        changed = set(changed) if changed is not None else None
+        for device_id in polled:
+            device = devices.get(device_id)
+            if device is None:
+                self.__forget(device_id)
+                continue
+            if changed is None:
+                # Keep the previous pace rather than read anything into a failure
+                interval = self.__intervals.get(device_id, self.__policy.moving)
+            else:
+                unchanged = self.__unchanged.get(device_id, 0)
+                unchanged = 0 if device_id in changed else unchanged + 1
+                self.__unchanged[device_id] = unchanged
+                interval = self.__policy.interval(device, unchanged)
+            self.__intervals[device_id] = interval
+            self.__push(device_id, now + interval)
+
+    def next_due(self, now):
+        """Seconds until the next device is due, None when empty
+
+        Attributes:
+            now (float): The loop's monotonic time
+        """
+        heap = self.__heap
+        while heap and self.__due.get(heap[0][1]) != heap[0][0]:
+            heapq.heappop(heap)
+        if not heap:
+            return None
+        return max(0.0, heap[0][0] - now)
+
+    @property
+    def intervals(self):
+        """The current interval of every device by id"""
+        return dict(self.__intervals)
+
+    @property
+    def stats(self):
+        intervals = list(self.__intervals.values())
+        return {
+            "devices": len(self.__due),
+            "batches": self.__batches,
+            "polled": self.__polled,
+            "min_interval": min(intervals) if intervals else None,
+            "mean_interval": sum(intervals) / len(intervals) if intervals else None,
+            "max_interval": max(intervals) if intervals else None,
+        }
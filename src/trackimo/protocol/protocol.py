@@ -5,15 +5,22 @@ Protocol handler for Trackimo
 
 import logging
 import sys
-import requests
 import os
 import asyncio
+import contextvars
 import functools
-import backoff
+import time
 
 from datetime import datetime, timedelta
 from .user import UserHandler
 from .account import AccountHandler
+from .transport import TRANSPORTS, TRANSPORT_ERRORS
+from ..executor import ThreadPool
+from .limiter import RequestLimiter, endpoint_class, retry_after
+from .retry import RetryPolicy, CircuitBreaker
+from .metrics import MetricsCollector, RequestEvent, payload_size
+from . import deadline
+from .. import tracing
 from ..exceptions import (
     MissingInformation,
     UnableToAuthenticate,
@@ -21,20 +28,17 @@ from ..exceptions import (
     CanNotRefresh,
     TrackimoAPIError,
     TrackimoAccessDenied,
+    TrackimoCircuitOpen,
     TrackimoLoginFailed,
+    TrackimoTimeout,
 )
 
 _logger = logging.getLogger(__name__)
-logging.getLogger("backoff").addHandler(logging.StreamHandler())
 
+_REFRESHING = contextvars.ContextVar("trackimo_refreshing", default=False)
+"""Set while a token refresh is running, so it never waits on itself"""
 
-def fatal_code(e):
-    return 400 <= e.response.status_code < 500
 
-
-@backoff.on_exception(
-    backoff.expo, requests.exceptions.RequestException, max_time=300, giveup=fatal_code
-)
 class Protocol(object):
     def __init__(
         self,
@@ -47,9 +51,49 @@ class Protocol(object):
         username=None,
         password=None,
         loop=None,
+        transport="requests",
+        refresh_margin=60,
+        max_in_flight=16,
+        rate_limits=None,
+        retry_policy=None,
+        circuit_breaker=None,
+        connect_timeout=5,
+        read_timeout=30,
+        executor_workers=None,
+        hooks=None,
     ):
+        """Create a Protocol handler
+
+        Attributes:
+            client_id (str): The API Client or App ID
+            client_secret (str): The API Client or APP Secret
+            host (str): The Trackimo API host
+            version (int): The Trackimo API version
+            port (int): The Trackimo API port
+            protocol (str): The protocol to talk to the API with
+            username (str): The Trackimo Username
+            password (str): The Trackimo Password
+            loop (object): The asyncio event loop
+            transport (str|object): "requests", "aiohttp" or a transport factory
+            refresh_margin (int): Seconds before expiry to refresh the token
+            max_in_flight (int): Requests allowed in flight at once
+            rate_limits (dict): Endpoint class ("auth", "locations", "history",
+                "ops", "default") to (requests per second, burst)
+            retry_policy (RetryPolicy): Which failed requests to retry and when
+            circuit_breaker (CircuitBreaker): Fails fast while the API is down
+            connect_timeout (float): Seconds allowed to connect to the API
+            read_timeout (float): Seconds allowed between bytes of a response
+            executor_workers (int): Threads for blocking transports, kept apart
+                from the event loop's default executor, defaults to one for
+                every request allowed in flight
+            hooks (list): Objects with any of on_request, on_response, on_error
+                and on_token_refresh methods, called for every request attempt
+        """
         super().__init__()
         self.__loop = loop if loop else asyncio.get_event_loop()
+        self.__transport = (
+            TRANSPORTS[transport] if isinstance(transport, str) else transport
+        )
 
         self.__client_id = client_id
         self.__client_secret = client_secret
@@ -67,9 +111,26 @@ class Protocol(object):
         self.__api_login_url = f"{self.__protocol}://{self.__host}:{self.__port}/api/internal/v2/user/login"
 
         self.__session = None
+        self.__retired = None
+        self.__connect_timeout = connect_timeout
+        self.__read_timeout = read_timeout
+        self.__executor_workers = max(
+            1, int(executor_workers if executor_workers else max_in_flight)
+        )
+        self.__executor = None
+        self.__metrics = MetricsCollector()
+        self.__hooks = [self.__metrics] + list(hooks or [])
         self.__api_token = None
         self.__api_expires = None
         self.__refresh_token = None
+        self.__refresh_margin = refresh_margin
+        self.__limiter = RequestLimiter(
+            loop=self.__loop, max_in_flight=max_in_flight, limits=rate_limits
+        )
+        self.__retry = retry_policy if retry_policy else RetryPolicy()
+        self.__breaker = circuit_breaker if circuit_breaker else CircuitBreaker()
+        self.__refresh_task = None
+        self.__refresh_timer = None
         self.__trackimo_username = username if username else None
         self.__trackimo_password = password if password else None
         self.__trackimo_accountid = None
@@ -100,6 +161,33 @@ class Protocol(object):
             "expires": self.__api_expires,
         }
 
+    @property
+    def limits(self):
+        """Current rates, queue depths and throttle counts"""
+        return self.__limiter.stats
+
+    @property
+    def circuit(self):
+        """Circuit breaker state, consecutive failures and rejections"""
+        return self.__breaker.stats
+
+    @property
+    def metrics(self):
+        """Latency, status codes, bytes and retries per endpoint"""
+        return self.__metrics.snapshot()
+
+    @property
+    def threads(self):
+        """Worker count, busy threads and queued calls of the executor"""
+        if not self.__executor:
+            return {
+                "workers": self.__executor_workers,
+                "active": 0,
+                "queued": 0,
+                "completed": 0,
+            }
+        return self.__executor.stats
+
     @property
     def loop(self):
         if not self.__loop:
@@ -126,12 +214,84 @@ class Protocol(object):
     def password(self, password):
         self.__trackimo_password = password
 
+    def add_hook(self, hook):
+        """Start calling a hook for every request attempt
+
+        Attributes:
+            hook (object): Has any of on_request, on_response, on_error and
+                on_token_refresh
+        """
+        if hook not in self.__hooks:
+            self.__hooks.append(hook)
+
+    def remove_hook(self, hook):
+        """Stop calling a hook
+
+        Attributes:
+            hook (object): A hook passed to add_hook
+        """
+        if hook in self.__hooks and hook is not self.__metrics:
+            self.__hooks.remove(hook)
+
+    def __fire(self, name, *args):
+        for hook in self.__hooks:
+            callback = getattr(hook, name, None)
+            if not callback:
+                continue
+            try:
+                callback(*args)
+            except Exception as err:
+                _logger.error("Instrumentation hook %s failed", name)
+                _logger.exception(err)
+
+    def __new_session(self):
+        if not self.__executor or self.__executor.closed:
+            self.__executor = ThreadPool(
+                workers=self.__executor_workers, name="trackimo-api"
+            )
+        return self.__transport(
+            loop=self.__loop,
+            executor=self.__executor,
+            connect_timeout=self.__connect_timeout,
+            read_timeout=self.__read_timeout,
+        )
+
+    async def __replace_session(self):
+        """Log in on a fresh session, without its cookies
+
+        The old session is kept open until the next login or close(), so
+        requests still using it can finish.
+        """
+        retired = self.__retired
+        self.__retired = self.__session
+        self.__session = self.__new_session()
+        if retired:
+            await retired.close()
+
+    async def close(self):
+        """Close the underlying transport and its pooled connections"""
+        if self.__refresh_timer:
+            self.__refresh_timer.cancel()
+            self.__refresh_timer = None
+        if self.__refresh_task and not self.__refresh_task.done():
+            self.__refresh_task.cancel()
+        for session in (self.__session, self.__retired):
+            if session:
+                await session.close()
+        self.__session = None
+        self.__retired = None
+        if self.__executor:
+            executor = self.__executor
+            self.__executor = None
+            executor.shutdown(wait=False, cancel_futures=True)
+
     async def restore_session(self, refresh_token):
         self.__refresh_token = refresh_token
         _logger.debug("Restoring session with token: %s", self.__refresh_token)
         await self.__token_refresh()
         return self.auth
 
+    @tracing.traced("trackimo.protocol.login")
     async def login(self, username=None, password=None, scopes=None):
 
         if username:
@@ -144,13 +304,11 @@ class Protocol(object):
         if not (self.__trackimo_username and self.__trackimo_password):
             raise UnableToAuthenticate("Must have a username and password available")
 
-        self.__session = None
+        await self.__replace_session()
         self.__api_token = None
         self.__api_expires = None
         self.__refresh_token = None
 
-        self.__session = requests.Session()
-
         login_payload = {
             "username": self.__trackimo_username,
             "password": self.__trackimo_password,
@@ -171,13 +329,10 @@ class Protocol(object):
             "code": None,
         }
 
-        def send_login_payload():
-            return self.__session.request(
+        try:
+            response = await self.__send(
                 "POST", self.__api_login_url, json=login_payload, allow_redirects=True
             )
-
-        try:
-            response = await self.__loop.run_in_executor(None, send_login_payload)
         except Exception as err:
             raise err
 
@@ -257,24 +412,73 @@ class Protocol(object):
         if not data or not "access_token" in data:
             raise UnableToAuthenticate("Could not retrieve access token code from API")
 
+        self.__set_token(data)
+
+        await self.__post_login()
+
+        return {
+            "token": self.__api_token,
+            "refresh": self.__refresh_token,
+            "expires": self.__api_expires,
+        }
+
+    def __set_token(self, data):
         self.__api_token = data["access_token"]
         if "refresh_token" in data:
+            _logger.debug("Token updated. Updating refresh token.")
             self.__refresh_token = data["refresh_token"]
 
         if "expires_in" in data:
+            _logger.debug("Token updated. Updating expiry time.")
             self.__api_expires = datetime.now() + timedelta(
                 seconds=int(data["expires_in"]) / 1000
             )
+        else:
+            self.__api_expires = None
 
-        await self.__post_login()
+        self.__schedule_refresh()
 
-        return {
-            "token": self.__api_token,
-            "refresh": self.__refresh_token,
-            "expires": self.__api_expires,
-        }
+    def __schedule_refresh(self):
+        if self.__refresh_timer:
+            self.__refresh_timer.cancel()
+            self.__refresh_timer = None
+
+        if not self.__api_expires:
+            return
+
+        lifetime = (self.__api_expires - datetime.now()).total_seconds()
+        delay = max(lifetime - self.__refresh_margin, lifetime / 2)
+        if delay <= 0:
+            return
+
+        _logger.debug("Scheduling token refresh in %d seconds.", delay)
+        self.__refresh_timer = self.__loop.call_later(
+            delay, self.__proactive_refresh, context=contextvars.Context()
+        )
+
+    def __proactive_refresh(self):
+        self.__refresh_timer = None
+
+        async def refresh():
+            try:
+                await self.__token_refresh()
+            except Exception as err:
+                _logger.error("Unable to refresh token ahead of expiry.")
+                _logger.exception(err)
+
+        self.__loop.create_task(refresh())
 
     async def __token_refresh(self):
+        """Refresh the token, sharing a single refresh between all callers"""
+        if not self.__refresh_task or self.__refresh_task.done():
+            self.__refresh_task = self.__loop.create_task(self.__refresh())
+        return await asyncio.shield(self.__refresh_task)
+
+    @tracing.traced("trackimo.protocol.refresh")
+    async def __refresh(self):
+        _REFRESHING.set(True)
+        deadline.clear()
+        self.__fire("on_token_refresh")
 
         if not self.__refresh_token:
             _logger.debug("No refresh token available. Logging in.")
@@ -286,11 +490,6 @@ class Protocol(object):
             "refresh_token": self.__refresh_token,
         }
 
-        self.__session = requests.Session()
-        self.__api_token = None
-        self.__refresh_token = None
-        self.__api_expires = None
-
         try:
             _logger.debug("Sending refresh payload: %s", refresh_payload)
             data = await self.api(
@@ -300,6 +499,8 @@ class Protocol(object):
                 headers=None,
                 no_check=True,
             )
+        except TrackimoCircuitOpen:
+            raise
         except TrackimoAPIError as apierror:
             _logger.debug("API Error. Trying to log in. %s", apierror.body)
             return await self.login()
@@ -313,16 +514,7 @@ class Protocol(object):
             _logger.debug("Could not refresh. Trying to log in.")
             return await self.login()
 
-        self.__api_token = data["access_token"]
-        if "refresh_token" in data:
-            _logger.debug("Token refreshed. Updating token.")
-            self.__refresh_token = data["refresh_token"]
-
-        if "expires_in" in data:
-            _logger.debug("Token refreshed. Updating expiry time.")
-            self.__api_expires = datetime.now() + timedelta(
-                seconds=int(data["expires_in"]) / 1000
-            )
+        self.__set_token(data)
 
         await self.__post_login()
 
@@ -332,6 +524,7 @@ class Protocol(object):
             "expires": self.__api_expires,
         }
 
+    @tracing.traced("trackimo.protocol.post_login")
     async def __post_login(self):
 
         handler = UserHandler(self)
@@ -344,7 +537,57 @@ class Protocol(object):
         self.__trackimo_accountid = user.accountId
         return user
 
-    def __request(self, method="GET", url=None, params=None, json=None, headers=None):
+    async def __send(self, method, url, attempt=1, **kwargs):
+        endpoint = endpoint_class(url)
+        event = RequestEvent(
+            method, url, attempt=attempt, bytes_out=payload_size(kwargs.get("json"))
+        )
+        attributes = {
+            "http.method": method,
+            "http.route": event.template,
+            "trackimo.attempt": attempt,
+        }
+        with tracing.span("trackimo.api", attributes) as span:
+            await self.__limiter.acquire(endpoint)
+            response = None
+            event.started = time.monotonic()
+            self.__fire("on_request", event)
+            try:
+                response = await self.__session.request(method, url, **kwargs)
+            except BaseException as err:
+                event.elapsed = time.monotonic() - event.started
+                event.error = err
+                self.__fire("on_error", event)
+                raise
+            else:
+                event.elapsed = (
+                    response.elapsed
+                    if response.elapsed is not None
+                    else time.monotonic() - event.started
+                )
+                event.status_code = response.status_code
+                event.bytes_in = (
+                    len(response.body.encode("utf-8")) if response.body else 0
+                )
+                self.__fire("on_response", event)
+                span.set_attribute("http.status_code", response.status_code)
+            finally:
+                self.__limiter.release(
+                    endpoint,
+                    status_code=getattr(response, "status_code", None),
+                    headers=getattr(response, "headers", None),
+                )
+        return response
+
+    async def __backoff(self, delay):
+        left = deadline.remaining(self.__loop)
+        if left is not None and delay >= left:
+            raise TrackimoTimeout("Trackimo API deadline exceeded.")
+        await asyncio.sleep(delay)
+
+    async def __request(
+        self, method="GET", url=None, params=None, json=None, headers=None
+    ):
 
         _logger.debug(
             {
@@ -355,48 +598,99 @@ class Protocol(object):
             }
         )
 
-        try:
-            response = self.__session.request(
-                method, url, params=params, json=json, headers=headers
-            )
-        except Exception as err:
-            _logger.error("No response at all")
-            _logger.exception(err)
-
-        status_code = getattr(response, "status_code", None)
-        body = getattr(response, "body", None)
+        retryable = self.__retry.retryable(method, url)
+        attempt = 0
 
-        try:
-            data = response.json()
-        except:
-            data = None
+        while True:
+            if not self.__breaker.allow():
+                raise TrackimoCircuitOpen(
+                    "Trackimo API is failing, not sending request.",
+                    retry_in=self.__breaker.retry_in,
+                )
 
-        if not status_code:
-            raise TrackimoAPIError("Trackimo API failed to repond.", response=response)
+            attempt += 1
+            try:
+                response = await self.__send(
+                    method,
+                    url,
+                    attempt=attempt,
+                    params=params,
+                    json=json,
+                    headers=headers,
+                )
+            except TRANSPORT_ERRORS as err:
+                self.__breaker.failure()
+                delay = self.__retry.delay(attempt) if retryable else None
+                if delay is None:
+                    _logger.error("No response at all")
+                    _logger.exception(err)
+                    if isinstance(err, TrackimoTimeout):
+                        raise err
+                    raise TrackimoAPIError("Trackimo API failed to respond.") from err
+                _logger.debug(
+                    "No response, retrying %s %s in %.2f seconds", method, url, delay
+                )
+                await self.__backoff(delay)
+                continue
+            except BaseException:
+                # Cancelled by a deadline or stop(), or a bug rather than the
+                # API failing, so free the trial slot without counting it
+                self.__breaker.abandon()
+                raise
+
+            status_code = response.status_code
+
+            if not status_code:
+                self.__breaker.failure()
+                raise TrackimoAPIError(
+                    "Trackimo API failed to respond.", response=response.response
+                )
 
-        success = 200 <= response.status_code <= 299
+            if status_code >= 500:
+                self.__breaker.failure()
+            else:
+                self.__breaker.success()
 
-        if response.status_code == 401 or response.status_code == 403:
+            if retryable and status_code in self.__retry.statuses:
+                delay = self.__retry.delay(
+                    attempt, retry_after((response.headers or {}).get("Retry-After"))
+                )
+                if delay is not None:
+                    _logger.debug(
+                        "Status %d, retrying %s %s in %.2f seconds",
+                        status_code,
+                        method,
+                        url,
+                        delay,
+                    )
+                    await self.__backoff(delay)
+                    continue
+
+            break
+
+        success = 200 <= status_code <= 299
+
+        if status_code == 401 or status_code == 403:
             raise TrackimoAccessDenied(
                 "Trackimo API Access Denied",
-                status_code=response.status_code,
-                body=body,
-                json=data,
+                status_code=status_code,
+                body=response.body,
+                json=response.json,
                 headers=response.headers,
-                response=response,
+                response=response.response,
             )
 
         if not success:
             raise TrackimoAPIError(
                 "Trackimo API Error",
-                status_code=response.status_code,
-                body=body,
-                json=data,
+                status_code=status_code,
+                body=response.body,
+                json=response.json,
                 headers=response.headers,
-                response=response,
+                response=response.response,
             )
 
-        return data
+        return response.json
 
     async def api(
         self,
@@ -407,6 +701,7 @@ class Protocol(object):
         no_check=False,
         use_internal_api=False,
         query_string={},
+        timeout=None,
     ):
         """Make a request to the Trackimo API
 
@@ -417,12 +712,42 @@ class Protocol(object):
             headers (object): Any headers to be sent
             no_check (bool): Don't check for an expired token
             use_internal_api (bool): Use the alternate internal API endpoint
+            timeout (float|timedelta): Overall deadline, including retries and
+                any token refresh, after which TrackimoTimeout is raised
         """
+        return await deadline.within(
+            self.__api(
+                method=method,
+                path=path,
+                data=data,
+                headers=headers,
+                no_check=no_check,
+                use_internal_api=use_internal_api,
+                query_string=query_string,
+            ),
+            timeout,
+            loop=self.__loop,
+        )
+
+    async def __api(
+        self,
+        method="GET",
+        path="",
+        data=None,
+        headers={},
+        no_check=False,
+        use_internal_api=False,
+        query_string={},
+    ):
         if not self.__session:
             raise NoSession("There is no current API session. Please login() first.")
 
-        if not no_check and (
-            self.__api_expires and (datetime.now() > self.__api_expires)
+        refreshing = _REFRESHING.get()
+
+        if (
+            not no_check
+            and not refreshing
+            and (self.__api_expires and (datetime.now() > self.__api_expires))
         ):
             _logger.debug("Refreshing token, it has expired.")
             await self.__token_refresh()
@@ -458,22 +783,19 @@ class Protocol(object):
             if query_string:
                 params = query_string
 
-        if self.__api_token and not no_check:
-            headers["Authorization"] = f"Bearer {self.__api_token}"
+        headers = dict(headers) if headers else {}
+        token = self.__api_token
+        if token and not no_check:
+            headers["Authorization"] = f"Bearer {token}"
 
         data = None
 
-        def process_request(method, url, params, json, headers):
-            return self.__request(
-                method=method, url=url, params=params, json=json, headers=headers
-            )
-
         try:
-            data = await self.__loop.run_in_executor(
-                None, process_request, method, url, params, json, headers
+            data = await self.__request(
+                method=method, url=url, params=params, json=json, headers=headers
             )
         except TrackimoAccessDenied as err:
-            if no_check:
+            if no_check or refreshing:
                 raise TrackimoAccessDenied(
                     "Trackimo API Access Denied",
                     status_code=err.status_code,
@@ -482,16 +804,20 @@ class Protocol(object):
                     headers=err.headers,
                     response=err.response,
                 )
-            _logger.debug("Access Denied. Need to refresh token.")
-            try:
-                auth = await self.__token_refresh()
-            except Exception as refreshError:
-                raise refreshError
+            if token == self.__api_token:
+                _logger.debug("Access Denied. Need to refresh token.")
+                try:
+                    auth = await self.__token_refresh()
+                except Exception as refreshError:
+                    raise refreshError
+
+            if self.__api_token:
+                headers["Authorization"] = f"Bearer {self.__api_token}"
 
             _logger.debug("Retrying request after re-auth")
             try:
-                data = await self.__loop.run_in_executor(
-                    None, process_request, method, url, params, json, headers
+                data = await self.__request(
+                    method=method, url=url, params=params, json=json, headers=headers
                 )
             except Exception as err:
                 raise err
@@ -503,38 +829,48 @@ class Protocol(object):
             data = {}
         return data
 
-    async def api_get(self, path=None, data=None):
+    async def api_get(self, path=None, data=None, timeout=None):
         """Make a get request to the Trackimo API
 
         Attributes:
             path (str): The path of the API endpoint
             data (object): Data to be passed as a querystring
+            timeout (float|timedelta): Overall deadline for the request
         """
-        return await self.api("GET", path=path, data=data)
+        return await self.api("GET", path=path, data=data, timeout=timeout)
 
-    async def api_post(self, path=None, data=None, query_string=None):
+    async def api_post(self, path=None, data=None, query_string=None, timeout=None):
         """Make a post request to the Trackimo API
 
         Attributes:
             path (str): The path of the API endpoint
             data (object): Data to be passed as a json payload
+            timeout (float|timedelta): Overall deadline for the request
         """
-        return await self.api("POST", path=path, data=data, query_string=query_string)
+        return await self.api(
+            "POST", path=path, data=data, query_string=query_string, timeout=timeout
+        )
 
-    async def api_delete(self, path=None, data=None, query_string=None):
+    async def api_delete(self, path=None, data=None, query_string=None, timeout=None):
         """Make a delete request to the Trackimo API
 
         Attributes:
             path (str): The path of the API endpoint
             data (object): Data to be passed as a json payload
+            timeout (float|timedelta): Overall deadline for the request
         """
-        return await self.api("DELETE", path=path, data=data, query_string=query_string)
+        return await self.api(
+            "DELETE", path=path, data=data, query_string=query_string, timeout=timeout
+        )
 
-    async def api_put(self, path=None, data=None, query_string=None):
+    async def api_put(self, path=None, data=None, query_string=None, timeout=None):
         """Make a put request to the Trackimo API
 
         Attributes:
             path (str): The path of the API endpoint
             data (object): Data to be passed as a json payload
+            timeout (float|timedelta): Overall deadline for the request
         """
-        return await self.api("PUT", path=path, data=data, query_string=query_string)
+        return await self.api(
+            "PUT", path=path, data=data, query_string=query_string, timeout=timeout
+        )
@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""
+Retry policy and circuit breaker for Trackimo
+"""
+
+import logging
+import random
+import time
+
+_logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+"""Requests flow normally"""
+
+OPEN = "open"
+"""Requests fail fast"""
+
+HALF_OPEN = "half_open"
+"""A single trial request is allowed through"""
+
+
+class RetryPolicy(object):
+    """Decide which failed requests to retry and how long to wait"""
+
+    def __init__(
+        self,
+        attempts=4,
+        base=0.5,
+        cap=30,
+        methods=("GET", "PUT", "DELETE"),
+        idempotent_posts=("locations/filter",),
+        statuses=(429, 500, 502, 503, 504),
+    ):
+        """Create a RetryPolicy
+
+        Attributes:
+            attempts (int): Total attempts, including the first
+            base (float): Seconds of backoff for the first retry
+            cap (float): Longest wait between attempts, a longer Retry-After gives up
+            methods (tuple): Methods that are always safe to retry
+            idempotent_posts (tuple): Path endings of POSTs that are safe to retry
+            statuses (tuple): Status codes worth retrying
+        """
+        super().__init__()
+        self.attempts = max(1, int(attempts))
+        self.base = float(base)
+        self.cap = float(cap)
+        self.methods = tuple(method.upper() for method in methods)
+        self.idempotent_posts = tuple(idempotent_posts)
+        self.statuses = tuple(statuses)
+
+    def retryable(self, method, url):
+        """Check whether a request may safely be sent again
+
+        Attributes:
+            method (str): The request verb
+            url (str): The request url, without the query string
+        """
+        method = method.upper()
+        if method in self.methods:
+            return True
+        return method == "POST" and url.endswith(self.idempotent_posts)
+
+    def delay(self, attempt, retry_after=None):
+        """Seconds to wait before the next attempt, None to give up
+
+        Attributes:
+            attempt (int): Attempts made so far
+            retry_after (float): Seconds the API asked us to wait
+        """
+        if attempt >= self.attempts:
+            return None
+        backoff = random.uniform(0, min(self.cap, self.base * 2 ** (attempt - 1)))
+        if retry_after is None:
+            return backoff
+        if retry_after > self.cap:
+            return None
+        return max(retry_after, backoff)
+
+
+class CircuitBreaker(object):
+    """Fail fast while the API keeps failing"""
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        """Create a CircuitBreaker
+
+        Attributes:
+            failure_threshold (int): Consecutive failures that open the circuit
+            reset_timeout (float): Seconds before a trial request is let through
+        """
+        super().__init__()
+        self.__failure_threshold = max(1, int(failure_threshold))
+        self.__reset_timeout = float(reset_timeout)
+        self.__state = CLOSED
+        self.__failures = 0
+        self.__opened_at = None
+        self.__trial = False
+        self.__rejected = 0
+        self.__opened = 0
+
+    def allow(self):
+        """Check whether a request may be sent now"""
+        if self.__state == CLOSED:
+            return True
+        if self.__state == OPEN:
+            if time.monotonic() - self.__opened_at < self.__reset_timeout:
+                self.__rejected += 1
+                return False
+            self.__state = HALF_OPEN
+            self.__trial = False
+        if self.__trial:
+            self.__rejected += 1
+            return False
+        self.__trial = True
+        return True
+
+    def success(self):
+        """Record a healthy response"""
+        if self.__state != CLOSED:
+            _logger.info("Trackimo API recovered, closing circuit")
+        self.__state = CLOSED
+        self.__failures = 0
+        self.__trial = False
+
+    def abandon(self):
+        """Record a request that was cancelled before it finished
+
+        Lets another trial through when the cancelled request was the trial.
+        """
+        self.__trial = False
+
+    def failure(self):
+        """Record a failed request"""
+        self.__failures += 1
+        if self.__state == HALF_OPEN or self.__failures >= self.__failure_threshold:
+            if self.__state != OPEN:
+                _logger.warning(
+                    "Trackimo API failing, opening circuit for %s seconds",
+                    self.__reset_timeout,
+                )
+                self.__opened += 1
+            self.__state = OPEN
+            self.__opened_at = time.monotonic()
+            self.__trial = False
+
+    @property
+    def state(self):
+        if (
+            self.__state == OPEN
+            and time.monotonic() - self.__opened_at >= self.__reset_timeout
+        ):
+            return HALF_OPEN
+        return self.__state
+
+    @property
+    def retry_in(self):
+        """Seconds until a trial request will be let through"""
+        if self.__state != OPEN:
+            return 0
+        return max(0.0, self.__reset_timeout - (time.monotonic() - self.__opened_at))
+
+    @property
+    def stats(self):
+        return {
+            "state": self.state,
+            "failures": self.__failures,
+            "opened": self.__opened,
+            "rejected": self.__rejected,
+        }
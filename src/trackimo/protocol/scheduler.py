@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+"""
+Fixed rate scheduling for Trackimo tracking
+"""
+
+import asyncio
+import logging
+import math
+import random
+
+from .metrics import Histogram, LATENCY_BUCKETS
+
+_logger = logging.getLogger(__name__)
+
+SKIP = "skip"
+"""Drop ticks missed while a cycle overran and wait for the next one"""
+
+COALESCE = "coalesce"
+"""Run one catch up cycle straight away for all the ticks missed"""
+
+
+class FixedRateScheduler(object):
+    """Run a cycle on a fixed cadence aligned to the loop's monotonic clock"""
+
+    def __init__(self, interval, loop=None, jitter=0, overlap=SKIP):
+        """Create a FixedRateScheduler
+
+        Attributes:
+            interval (float|timedelta): Seconds between the start of each cycle
+            loop (object): The asyncio event loop
+            jitter (float|timedelta): Up to this many seconds are added to each
+                start, to spread trackers sharing a cadence
+            overlap (str): SKIP or COALESCE ticks missed by a long cycle
+        """
+        super().__init__()
+        if hasattr(interval, "total_seconds"):
+            interval = interval.total_seconds()
+        if hasattr(jitter, "total_seconds"):
+            jitter = jitter.total_seconds()
+        if overlap not in (SKIP, COALESCE):
+            raise ValueError(f"Unknown overlap policy: {overlap}")
+        self.__interval = float(interval)
+        if self.__interval <= 0:
+            raise ValueError("The interval must be positive")
+        self.__loop = loop if loop else asyncio.get_event_loop()
+        self.__jitter = max(0.0, float(jitter or 0))
+        self.__overlap = overlap
+        self.__stopping = None
+        self.__task = None
+        self.__lag = Histogram(LATENCY_BUCKETS)
+        self.__last_lag = None
+        self.__runs = 0
+        self.__skipped = 0
+        self.__coalesced = 0
+        self.__running = False
+
+    def start(self, cycle):
+        """Start running a cycle, returning the scheduling task
+
+        Attributes:
+            cycle (callable): Coroutine function called once per tick
+        """
+        if self.__task and not self.__task.done():
+            return self.__task
+        self.__stopping = asyncio.Event()
+        self.__task = self.__loop.create_task(self.__run(cycle))
+        return self.__task
+
+    async def stop(self, timeout=None):
+        """Stop after any cycle in progress, cancelling it after timeout seconds
+
+        Attributes:
+            timeout (float): Seconds to let a running cycle drain, None to wait
+        """
+        task = self.__task
+        if not task or task.done():
+            return
+        self.__stopping.set()
+        done, pending = await asyncio.wait({task}, timeout=timeout)
+        if pending:
+            _logger.warning("Tracking cycle did not drain in time, cancelling it.")
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    async def __wait(self, delay):
+        """Sleep until a tick, returning True if asked to stop meanwhile"""
+        if delay <= 0:
+            return self.__stopping.is_set()
+        try:
+            await asyncio.wait_for(self.__stopping.wait(), delay)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def __run(self, cycle):
+        tick = self.__loop.time()
+        while not self.__stopping.is_set():
+            due = tick + (random.uniform(0, self.__jitter) if self.__jitter else 0)
+            if await self.__wait(due - self.__loop.time()):
+                break
+
+            self.__last_lag = max(0.0, self.__loop.time() - due)
+            self.__lag.observe(self.__last_lag)
+            self.__runs += 1
+            self.__running = True
+            try:
+                await cycle()
+            except asyncio.CancelledError:
+                raise
+            except Exception as err:
+                _logger.error("Tracking cycle failed")
+                _logger.exception(err)
+            finally:
+                self.__running = False
+
+            tick += self.__interval
+            overrun = self.__loop.time() - tick
+            if overrun < 0:
+                continue
+            missed = math.floor(overrun / self.__interval) + 1
+            if self.__overlap == SKIP:
+                self.__skipped += missed
+                tick += missed * self.__interval
+                _logger.debug("Cycle overran, skipped %d ticks", missed)
+            else:
+                self.__coalesced += missed - 1
+                tick += (missed - 1) * self.__interval
+                _logger.debug("Cycle overran, coalescing %d ticks", missed)
+
+    @property
+    def task(self):
+        return self.__task
+
+    @property
+    def stats(self):
+        return {
+            "interval": self.__interval,
+            "runs": self.__runs,
+            "running": self.__running,
+            "skipped": self.__skipped,
+            "coalesced": self.__coalesced,
+            "last_lag": self.__last_lag,
+            "lag": self.__lag.snapshot(),
+        }
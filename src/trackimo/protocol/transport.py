@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+"""
+HTTP transports for the Trackimo protocol handler
+"""
+
+import logging
+import asyncio
+import time
+import requests
+
+from ..exceptions import TrackimoTimeout
+
+try:
+    import aiohttp
+except ImportError:  # pragma: no cover - optional dependency
+    aiohttp = None
+
+_logger = logging.getLogger(__name__)
+
+
+class Response(object):
+    """A transport neutral view of an HTTP response
+
+    Attributes:
+        status_code (int): HTTP Status Code returned
+        headers (object): Response headers
+        body (str): Message body
+        json (object): Decoded JSON body, if there was one
+        response (object): The underlying transport response object
+        elapsed (float): Seconds from sending the request to reading the
+            body, None to time it from when the transport was called
+    """
+
+    def __init__(
+        self,
+        status_code=None,
+        headers=None,
+        body=None,
+        json=None,
+        response=None,
+        elapsed=None,
+    ):
+        super().__init__()
+        self.status_code = status_code
+        self.headers = headers if headers is not None else {}
+        self.body = body
+        self.json = json
+        self.response = response
+        self.elapsed = elapsed
+
+
+class RequestsTransport(object):
+    """Blocking requests session run in the event loop's executor"""
+
+    def __init__(self, loop=None, executor=None, connect_timeout=5, read_timeout=30):
+        """Create a requests backed transport
+
+        Attributes:
+            loop (object): The asyncio event loop
+            executor (object): Executor to run the blocking calls in
+            connect_timeout (float): Seconds allowed to open a connection
+            read_timeout (float): Seconds allowed between bytes of the response
+        """
+        super().__init__()
+        self.__loop = loop if loop else asyncio.get_event_loop()
+        self.__executor = executor
+        self.__timeout = (connect_timeout, read_timeout)
+        self.__session = requests.Session()
+
+    def __send(self, method, url, params, json, headers, allow_redirects):
+        # Timed from here, so waiting for a free thread is not counted
+        started = time.monotonic()
+        try:
+            response = self.__session.request(
+                method,
+                url,
+                params=params,
+                json=json,
+                headers=headers,
+                allow_redirects=allow_redirects,
+                timeout=self.__timeout,
+            )
+        except requests.exceptions.Timeout:
+            raise TrackimoTimeout("Trackimo API timed out.", timeout=self.__timeout[1])
+        body = response.text
+        elapsed = time.monotonic() - started
+        try:
+            data = response.json()
+        except:
+            data = None
+        return Response(
+            status_code=response.status_code,
+            headers=response.headers,
+            body=body,
+            json=data,
+            response=response,
+            elapsed=elapsed,
+        )
+
+    async def request(
+        self,
+        method="GET",
+        url=None,
+        params=None,
+        json=None,
+        headers=None,
+        allow_redirects=True,
+    ):
+        return await self.__loop.run_in_executor(
+            self.__executor,
+            self.__send,
+            method,
+            url,
+            params,
+            json,
+            headers,
+            allow_redirects,
+        )
+
+    async def close(self):
+        self.__session.close()
+
+
+class AiohttpTransport(object):
+    """Native asyncio transport with pooled keep-alive connections"""
+
+    def __init__(
+        self,
+        loop=None,
+        executor=None,
+        limit=100,
+        keepalive_timeout=30,
+        connect_timeout=5,
+        read_timeout=30,
+    ):
+        """Create an aiohttp backed transport
+
+        Attributes:
+            loop (object): The asyncio event loop
+            executor (object): Unused, requests never block the event loop
+            limit (int): Maximum number of pooled connections
+            keepalive_timeout (int): Seconds to keep idle connections open
+            connect_timeout (float): Seconds allowed to open a connection
+            read_timeout (float): Seconds allowed between bytes of the response
+        """
+        super().__init__()
+        if not aiohttp:
+            raise ImportError("The aiohttp transport requires aiohttp to be installed")
+        self.__loop = loop if loop else asyncio.get_event_loop()
+        self.__limit = limit
+        self.__keepalive_timeout = keepalive_timeout
+        self.__read_timeout = read_timeout
+        self.__timeout = aiohttp.ClientTimeout(
+            sock_connect=connect_timeout, sock_read=read_timeout
+        )
+        self.__session = None
+
+    def __get_session(self):
+        if self.__session and not self.__session.closed:
+            return self.__session
+        connector = aiohttp.TCPConnector(
+            limit=self.__limit, keepalive_timeout=self.__keepalive_timeout
+        )
+        self.__session = aiohttp.ClientSession(
+            connector=connector, timeout=self.__timeout
+        )
+        return self.__session
+
+    async def request(
+        self,
+        method="GET",
+        url=None,
+        params=None,
+        json=None,
+        headers=None,
+        allow_redirects=True,
+    ):
+        session = self.__get_session()
+        try:
+            async with session.request(
+                method,
+                url,
+                params=params,
+                json=json,
+                headers=headers,
+                allow_redirects=allow_redirects,
+            ) as response:
+                body = await response.text()
+                try:
+                    data = await response.json(content_type=None)
+                except:
+                    data = None
+                return Response(
+                    status_code=response.status,
+                    headers=response.headers,
+                    body=body,
+                    json=data,
+                    response=response,
+                )
+        except asyncio.TimeoutError:
+            raise TrackimoTimeout(
+                "Trackimo API timed out.", timeout=self.__read_timeout
+            )
+
+    async def close(self):
+        if self.__session and not self.__session.closed:
+            await self.__session.close()
+        self.__session = None
+
+
+TRANSPORTS = {"requests": RequestsTransport, "aiohttp": AiohttpTransport}
+"""Transports that can be selected by name"""
+
+TRANSPORT_ERRORS = (OSError, asyncio.TimeoutError, TrackimoTimeout) + (
+    (aiohttp.ClientError,) if aiohttp else ()
+)
+"""Errors meaning the API could not be reached, rather than a bug in the caller
+
+requests raises subclasses of OSError.
+"""
@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+"""
+Tracing spans for Trackimo
+
+Spans are forwarded to OpenTelemetry when it is installed, and to any
+exporter added with add_exporter(). With neither, span() does nothing.
+"""
+
+import contextvars
+import functools
+import itertools
+import logging
+import time
+from contextlib import contextmanager
+
+try:
+    from opentelemetry import trace as otel_trace
+except ImportError:  # pragma: no cover - optional dependency
+    otel_trace = None
+
+_logger = logging.getLogger(__name__)
+
+_CURRENT = contextvars.ContextVar("trackimo_span", default=None)
+"""The innermost open span"""
+
+_EXPORTERS = []
+"""Exporters finished spans are handed to"""
+
+_IDS = itertools.count(1)
+"""Source of span and trace ids"""
+
+
+class Span(object):
+    """A timed, named piece of work
+
+    Attributes:
+        name (str): What the work is
+        attributes (dict): Details such as device ids and page numbers
+        trace_id (int): Shared by every span in one trace
+        span_id (int): Unique to this span
+        parent_id (int): The enclosing span, None for the root
+        start (float): Monotonic start time
+        end (float): Monotonic end time, None while open
+        error (Exception): Why the work failed
+    """
+
+    __slots__ = (
+        "name",
+        "attributes",
+        "trace_id",
+        "span_id",
+        "parent_id",
+        "start",
+        "end",
+        "error",
+        "_otel",
+    )
+
+    def __init__(self, name, attributes=None, parent=None):
+        super().__init__()
+        self.name = name
+        self.attributes = dict(attributes) if attributes else {}
+        self.span_id = next(_IDS)
+        self.trace_id = parent.trace_id if parent else next(_IDS)
+        self.parent_id = parent.span_id if parent else None
+        self.start = time.monotonic()
+        self.end = None
+        self.error = None
+        self._otel = None
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+        if self._otel is not None:
+            self._otel.set_attribute(key, value)
+
+    @property
+    def duration(self):
+        if self.end is None:
+            return None
+        return self.end - self.start
+
+    def __repr__(self):
+        return f"<Span {self.name} {self.attributes}>"
+
+
+class _NoopSpan(object):
+    """Stands in for a span when tracing is off"""
+
+    name = None
+    attributes = {}
+
+    def set_attribute(self, key, value):
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+class InMemoryExporter(object):
+    """Keep finished spans in a list, for tests"""
+
+    def __init__(self):
+        super().__init__()
+        self.__spans = []
+
+    def export(self, span):
+        self.__spans.append(span)
+
+    def find(self, name):
+        """Finished spans with a name
+
+        Attributes:
+            name (str): The span name
+        """
+        return [span for span in self.__spans if span.name == name]
+
+    def children(self, span):
+        """Finished spans directly inside a span
+
+        Attributes:
+            span (Span): The parent span
+        """
+        return [child for child in self.__spans if child.parent_id == span.span_id]
+
+    def clear(self):
+        self.__spans = []
+
+    @property
+    def spans(self):
+        return list(self.__spans)
+
+
+def add_exporter(exporter):
+    """Start handing finished spans to an exporter
+
+    Attributes:
+        exporter (object): Has an export(span) method
+    """
+    if exporter not in _EXPORTERS:
+        _EXPORTERS.append(exporter)
+    return exporter
+
+
+def remove_exporter(exporter):
+    """Stop handing finished spans to an exporter
+
+    Attributes:
+        exporter (object): An exporter passed to add_exporter
+    """
+    if exporter in _EXPORTERS:
+        _EXPORTERS.remove(exporter)
+
+
+def current():
+    """The innermost open span, or a span that ignores everything"""
+    return _CURRENT.get() or _NOOP
+
+
+@contextmanager
+def span(name, attributes=None):
+    """Time a piece of work as a child of the current span
+
+    Attributes:
+        name (str): What the work is
+        attributes (dict): Details such as device ids and page numbers
+    """
+    if otel_trace is None and not _EXPORTERS:
+        yield _NOOP
+        return
+
+    opened = Span(name, attributes, _CURRENT.get())
+    token = _CURRENT.set(opened)
+    otel_context = None
+    if otel_trace is not None:
+        otel_context = otel_trace.get_tracer("trackimo").start_as_current_span(
+            name, attributes=opened.attributes
+        )
+        opened._otel = otel_context.__enter__()
+
+    failure = (None, None, None)
+    try:
+        yield opened
+    except BaseException as err:
+        opened.error = err
+        failure = (type(err), err, err.__traceback__)
+        raise
+    finally:
+        opened.end = time.monotonic()
+        if otel_context is not None:
+            otel_context.__exit__(*failure)
+        _CURRENT.reset(token)
+        for exporter in list(_EXPORTERS):
+            try:
+                exporter.export(opened)
+            except Exception as err:
+                _logger.error("Unable to export span %s", name)
+                _logger.exception(err)
+
+
+def traced(name, attributes=None):
+    """Run every call of a coroutine function inside a span
+
+    Attributes:
+        name (str): What the work is
+        attributes (dict): Details added to every span
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            with span(name, attributes):
+                return await func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
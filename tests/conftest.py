@@ -1,10 +1,208 @@
 # -*- coding: utf-8 -*-
 """
-    Dummy conftest.py for trackimo.
+    Shared fixtures for trackimo.
 
-    If you don't know what this is for, just leave it empty.
-    Read more about conftest.py under:
-    https://pytest.org/latest/plugins.html
+    FakeTransport stands in for the HTTP transports, answering just enough of
+    the Trackimo API to log in, build devices and poll their locations.
 """
 
-# import pytest
+import asyncio
+import re
+import time
+from urllib.parse import urlsplit
+
+import pytest
+
+from trackimo.adddress import geocode
+from trackimo.protocol.protocol import Protocol
+from trackimo.protocol.transport import Response
+
+ACCOUNT_ID = 99
+FIRST_DEVICE = 1000
+
+
+class FakeApi(object):
+    """State shared by every FakeTransport a test creates
+
+    Attributes:
+        devices (int): Devices on the account
+        latency (float): Seconds each request takes
+        failures (dict): "METHOD /path/{id}" to a list of status codes or
+            exceptions returned by the next requests to that endpoint
+        counts (dict): Requests seen per "METHOD /path/{id}"
+        requests (list): (key, params, json) of every request, in order
+        expires_in (int): Token lifetime in milliseconds
+        moving (set): Device ids whose position changes on every poll
+        page_cap (int): Most results returned in a page, whatever the limit
+        concurrent (int): Requests being answered right now
+        peak (int): Most requests answered at once
+        transports (list): Every FakeTransport created, in order
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.devices = 3
+        self.latency = 0
+        self.failures = {}
+        self.counts = {}
+        self.requests = []
+        self.expires_in = 3600000
+        self.moving = set()
+        self.page_cap = None
+        self.concurrent = 0
+        self.peak = 0
+        self.tokens = 0
+        self.polls = 0
+        self.transports = []
+
+    def count(self, key):
+        return self.counts.get(key, 0)
+
+    def page(self, params):
+        limit, page = int(params.get("limit", 20)), int(params.get("page", 1))
+        if self.page_cap:
+            limit = min(limit, self.page_cap)
+        return limit, page
+
+    async def answer(self, method, url, params, json):
+        path = urlsplit(url).path
+        key = method + " " + re.sub(r"/\d+(?=/|$)", "/{id}", path)
+        self.counts[key] = self.counts.get(key, 0) + 1
+        self.requests.append((key, params, json))
+        self.concurrent += 1
+        self.peak = max(self.peak, self.concurrent)
+        try:
+            if self.latency:
+                await asyncio.sleep(self.latency)
+        finally:
+            self.concurrent -= 1
+
+        failures = self.failures.get(key)
+        if failures:
+            failure = failures.pop(0)
+            if isinstance(failure, BaseException):
+                raise failure
+            return failure, {"Retry-After": "0"}, {"error": "failure"}
+
+        params = params or {}
+        if path.endswith("/user/login"):
+            return 200, {}, {}
+        if path.endswith("/oauth2/auth"):
+            return 200, {}, {"code": "code"}
+        if path.endswith("/oauth2/token") or path.endswith("/oauth2/token/refresh"):
+            self.tokens += 1
+            return (
+                200,
+                {},
+                {
+                    "access_token": f"token{self.tokens}",
+                    "refresh_token": "refresh",
+                    "expires_in": self.expires_in,
+                },
+            )
+        if path.endswith("/user"):
+            return 200, {}, {"user_id": 1, "account_id": ACCOUNT_ID}
+        if path.endswith(f"/accounts/{ACCOUNT_ID}"):
+            return 200, {}, {"id": ACCOUNT_ID, "name": "account"}
+        if path.endswith(f"/accounts/{ACCOUNT_ID}/devices"):
+            limit, page = self.page(params)
+            ids = range(FIRST_DEVICE, FIRST_DEVICE + self.devices)
+            ids = ids[(page - 1) * limit : page * limit]
+            return 200, {}, [{"deviceId": id} for id in ids]
+        match = re.search(r"/devices/(\d+)$", path)
+        if match:
+            return 200, {}, {"name": f"device{match.group(1)}"}
+        if path.endswith("/devices/features/deviceIds"):
+            ids = str(params["deviceIds"]).split(",")
+            return 200, {}, [{"id": int(id), "fwVer": "1.0"} for id in ids]
+        if path.endswith("/locations/filter"):
+            self.polls += 1
+            limit, page = self.page(params)
+            ids = json["device_ids"][(page - 1) * limit : page * limit]
+            now = int(time.time())
+            return (
+                200,
+                {},
+                [
+                    {
+                        "device_id": id,
+                        "lat": -33.8 + (self.polls / 1e3 if id in self.moving else 0),
+                        "lng": 151.2 + (id - FIRST_DEVICE) / 100,
+                        "time": now,
+                        "speed": 0,
+                        "battery": 90,
+                    }
+                    for id in ids
+                ],
+            )
+        return 404, {}, {"error": path}
+
+
+class FakeTransport(object):
+    """A transport answering from a FakeApi instead of the network"""
+
+    api = None
+
+    def __init__(self, loop=None, executor=None, connect_timeout=5, read_timeout=30):
+        super().__init__()
+        self.closed = False
+        self.api.transports.append(self)
+
+    async def request(
+        self,
+        method="GET",
+        url=None,
+        params=None,
+        json=None,
+        headers=None,
+        allow_redirects=True,
+    ):
+        status_code, response_headers, data = await self.api.answer(
+            method, url, params, json
+        )
+        return Response(
+            status_code=status_code,
+            headers=response_headers,
+            body=str(data),
+            json=data,
+        )
+
+    async def close(self):
+        self.closed = True
+
+
+class NoGeocoder(geocode.Geocoder):
+    """Keeps tests off the network"""
+
+    remote = False
+
+    def reverse(self, latitude, longitude):
+        return None
+
+
+@pytest.fixture
+def fake_api():
+    """The fake Trackimo API used by new_protocol"""
+    return FakeApi()
+
+
+@pytest.fixture
+def new_protocol(fake_api):
+    """Create a Protocol talking to the fake API, inside a running loop"""
+    geocode.configure_geocoder(NoGeocoder())
+
+    def create(**kwargs):
+        transport = type("Transport", (FakeTransport,), {"api": fake_api})
+        options = {
+            "host": "trackimo.test",
+            "username": "user",
+            "password": "password",
+            "loop": asyncio.get_running_loop(),
+            "transport": transport,
+        }
+        options.update(kwargs)
+        return Protocol("client", "secret", **options)
+
+    yield create
+    geocode.configure_geocoder()
+    geocode.close_executor()
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+
+from datetime import timedelta
+
+import pytest
+
+from trackimo.adddress import cache
+from trackimo.adddress.cache import GeoCache
+
+__author__ = "Troy Kelly"
+__copyright__ = "Troy Kelly"
+__license__ = "mit"
+
+
+class FakeClock(object):
+    """Stands in for the time module, moving only when told to"""
+
+    def __init__(self):
+        super().__init__()
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(cache, "time", clock)
+    return clock
+
+
+def test_entries_expire_after_ttl(clock):
+    geo_cache = GeoCache(ttl=timedelta(seconds=60))
+    geo_cache.set("a", "Sydney")
+
+    clock.now += 59
+    assert geo_cache.get("a") == "Sydney"
+
+    clock.now += 1
+    assert geo_cache.get("a") is None
+    assert len(geo_cache) == 0
+    assert geo_cache.stats["expirations"] == 1
+
+
+def test_entries_without_ttl_never_expire(clock):
+    geo_cache = GeoCache(ttl=None)
+    geo_cache.set("a", "Sydney")
+    clock.now += 365 * 86400
+    assert geo_cache.get("a") == "Sydney"
+
+
+def test_purge_removes_only_expired_entries(clock):
+    geo_cache = GeoCache(ttl=60)
+    geo_cache.set("old", 1)
+    clock.now += 30
+    geo_cache.set("new", 2)
+    clock.now += 30
+
+    assert geo_cache.purge() == 1
+    assert "old" not in geo_cache
+    assert "new" in geo_cache
+
+
+def test_least_recently_used_is_evicted(clock):
+    geo_cache = GeoCache(max_entries=2)
+    geo_cache.set("a", 1)
+    geo_cache.set("b", 2)
+    assert geo_cache.get("a") == 1
+
+    geo_cache.set("c", 3)
+    assert "b" not in geo_cache
+    assert "a" in geo_cache and "c" in geo_cache
+
+    geo_cache.resize(1)
+    assert "a" not in geo_cache
+    assert geo_cache.stats["evictions"] == 2
+
+
+def test_counts_hits_and_misses(clock):
+    geo_cache = GeoCache(ttl=60)
+    geo_cache.set("a", 1)
+    geo_cache.get("a")
+    geo_cache.get("a")
+    geo_cache.get("b")
+    assert "a" in geo_cache and "b" not in geo_cache
+
+    clock.now += 60
+    geo_cache.get("a")
+    stats = geo_cache.stats
+    assert (stats["hits"], stats["misses"]) == (2, 2)
+    assert stats["size"] == 0
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+
+import pytest
+
+from trackimo.protocol.device import DeviceHandler
+
+__author__ = "Troy Kelly"
+__copyright__ = "Troy Kelly"
+__license__ = "mit"
+
+DEVICES = "GET /api/v3/accounts/{id}/devices"
+
+
+def pages(fake_api, key):
+    return sorted(
+        params["page"] for seen, params, _ in fake_api.requests if seen == key
+    )
+
+
+@pytest.mark.parametrize(
+    "devices, page_cap", [(3, None), (20, None), (45, None), (25, 10)]
+)
+def test_build_pages_through_every_device(new_protocol, fake_api, devices, page_cap):
+    fake_api.devices = devices
+    fake_api.page_cap = page_cap
+
+    async def main():
+        protocol = new_protocol()
+        await protocol.login()
+        handler = DeviceHandler(protocol, geocode_workers=0)
+        built = await handler.build(limit=20)
+        assert sorted(built) == list(range(1000, 1000 + devices))
+        assert all(device.name for device in built.values())
+        await handler.close()
+        await protocol.close()
+
+    asyncio.run(main())
+    requested = pages(fake_api, DEVICES)
+    assert requested[:2] == [1, 2]
+    assert len(requested) == len(set(requested))
+
+
+def test_features_are_loaded_in_chunks(new_protocol, fake_api):
+    fake_api.devices = 7
+    features = "GET /api/internal/v1/devices/features/deviceIds"
+
+    async def main():
+        protocol = new_protocol()
+        await protocol.login()
+        handler = DeviceHandler(protocol, geocode_workers=0)
+        await handler.build()
+        assert fake_api.count(features) == 1
+
+        fake_api.requests.clear()
+        await handler.load_features(chunk_size=3, concurrency=2)
+        chunks = sorted(
+            params["deviceIds"]
+            for key, params, _ in fake_api.requests
+            if key == features
+        )
+        assert chunks == ["1000,1001,1002", "1003,1004,1005", "1006"]
+        for device in handler.devices.values():
+            assert device.features.firmware == "1.0"
+        await handler.close()
+        await protocol.close()
+
+    asyncio.run(main())
+
+
+def test_locations_are_fetched_in_chunks(new_protocol, fake_api):
+    fake_api.devices = 7
+    locations = "POST /api/v3/accounts/{id}/locations/filter"
+
+    async def main():
+        protocol = new_protocol()
+        await protocol.login()
+        handler = DeviceHandler(
+            protocol,
+            geocode_workers=0,
+            locations_chunk_size=3,
+            locations_concurrency=2,
+        )
+        await handler.build()
+        fake_api.requests.clear()
+        fake_api.moving = {1000, 1006}
+        fake_api.latency = 0.01
+        fake_api.peak = 0
+
+        assert sorted(await handler.refresh_locations()) == [1000, 1006]
+        sent = [
+            (tuple(json["device_ids"]), params["page"])
+            for key, params, json in fake_api.requests
+            if key == locations
+        ]
+        # One page each, as every device in a chunk came back at once
+        assert sorted(sent) == [
+            ((1000, 1001, 1002), 1),
+            ((1003, 1004, 1005), 1),
+            ((1006,), 1),
+        ]
+        assert fake_api.peak == 2
+        await handler.close()
+        await protocol.close()
+
+    asyncio.run(main())
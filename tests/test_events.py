@@ -0,0 +1,277 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from trackimo.protocol.device import DeviceHandler
+from trackimo.protocol.events import (
+    BLOCK,
+    COALESCE,
+    DROP_OLDEST,
+    DeviceEvent,
+    Dispatcher,
+    EventSubscription,
+    Subscription,
+)
+
+__author__ = "Troy Kelly"
+__copyright__ = "Troy Kelly"
+__license__ = "mit"
+
+
+def event(device_id, event_type="location", fields=frozenset()):
+    return DeviceEvent(event_type, SimpleNamespace(id=device_id), fields=fields)
+
+
+async def drain(subscription):
+    received = []
+    while len(subscription):
+        received.append(await subscription.get())
+    return received
+
+
+def test_drop_oldest_keeps_the_newest_events():
+    async def main():
+        subscription = EventSubscription(maxsize=2, overflow=DROP_OLDEST)
+        events = [event(device_id) for device_id in range(4)]
+        for item in events:
+            subscription.publish(item)
+        assert len(subscription) == 2
+        assert await drain(subscription) == events[2:]
+        stats = subscription.stats
+        assert stats["dropped"] == 2
+        assert stats["delivered"] == 2
+        assert stats["pending"] == 0
+
+    asyncio.run(main())
+
+
+def test_coalesce_keeps_the_latest_event_per_device_and_type():
+    async def main():
+        subscription = EventSubscription(maxsize=10, overflow=COALESCE)
+        first = event(1)
+        address = event(1, "address")
+        other = event(2)
+        latest = event(1)
+        for item in (first, address, other, latest):
+            subscription.publish(item)
+        # The replaced event keeps its place in the queue
+        assert await drain(subscription) == [latest, address, other]
+        assert subscription.stats["coalesced"] == 1
+        assert subscription.stats["dropped"] == 0
+
+    asyncio.run(main())
+
+
+def test_coalesce_drops_the_oldest_device_when_full():
+    async def main():
+        subscription = EventSubscription(maxsize=2, overflow=COALESCE)
+        events = [event(device_id) for device_id in range(3)]
+        for item in events:
+            subscription.publish(item)
+        assert await drain(subscription) == events[1:]
+        assert subscription.stats["dropped"] == 1
+
+    asyncio.run(main())
+
+
+def test_block_keeps_every_event_and_holds_the_writer():
+    async def main():
+        subscription = EventSubscription(maxsize=2, overflow=BLOCK)
+        await asyncio.wait_for(subscription.writable(), 0.1)
+
+        events = [event(device_id) for device_id in range(3)]
+        for item in events:
+            subscription.publish(item)
+        # Nothing is lost, the queue runs past maxsize instead
+        assert len(subscription) == 3
+        assert subscription.stats["dropped"] == 0
+
+        writer = asyncio.ensure_future(subscription.writable())
+        await asyncio.sleep(0.01)
+        assert not writer.done()
+
+        assert await subscription.get() is events[0]
+        await asyncio.sleep(0.01)
+        assert not writer.done()
+
+        assert await subscription.get() is events[1]
+        await asyncio.wait_for(writer, 0.1)
+        assert await subscription.get() is events[2]
+
+    asyncio.run(main())
+
+
+def test_close_releases_a_blocked_writer_and_ends_iteration():
+    async def main():
+        closed = []
+        subscription = EventSubscription(
+            maxsize=1, overflow=BLOCK, on_close=closed.append
+        )
+        subscription.publish(event(1))
+        subscription.publish(event(2))
+        writer = asyncio.ensure_future(subscription.writable())
+        await asyncio.sleep(0.01)
+        assert not writer.done()
+
+        subscription.close()
+        await asyncio.wait_for(writer, 0.1)
+        assert closed == [subscription]
+        # Published after closing is ignored, queued events still arrive
+        subscription.publish(event(3))
+        received = [item.device_id async for item in subscription]
+        assert received == [1, 2]
+        assert subscription.stats["closed"]
+
+    asyncio.run(main())
+
+
+def test_blocked_subscription_holds_the_next_poll(new_protocol, fake_api):
+    fake_api.moving = {1000}
+
+    async def main():
+        protocol = new_protocol()
+        await protocol.login()
+        handler = DeviceHandler(protocol, geocode_workers=0)
+        await handler.build()
+        stream = handler.events(maxsize=1, overflow=BLOCK)
+        polls = fake_api.polls
+        handler.track(interval=0.02)
+        await asyncio.sleep(0.15)
+        # The second poll fills the queue past maxsize, the third waits
+        assert fake_api.polls == polls + 2
+        assert len(stream) == 2
+
+        await stream.get()
+        await stream.get()
+        await asyncio.sleep(0.05)
+        assert fake_api.polls > polls + 2
+
+        stream.close()
+        await handler.stop()
+        await handler.close()
+        await protocol.close()
+
+    asyncio.run(main())
+
+
+def test_get_waits_for_an_event():
+    async def main():
+        subscription = EventSubscription()
+        reader = asyncio.ensure_future(subscription.get())
+        await asyncio.sleep(0.01)
+        assert not reader.done()
+        item = event(1)
+        subscription.publish(item)
+        assert await asyncio.wait_for(reader, 0.1) is item
+
+    asyncio.run(main())
+
+
+def test_rejects_bad_settings():
+    with pytest.raises(ValueError):
+        EventSubscription(overflow="latest")
+    with pytest.raises(ValueError):
+        EventSubscription(maxsize=0)
+
+
+def test_dispatch_only_reaches_the_devices_subscribed_to():
+    dispatcher = Dispatcher()
+    one, every = [], []
+    dispatcher.subscribe(Subscription(one.append, device_ids=[1]))
+    dispatcher.subscribe(Subscription(every.append))
+    assert len(dispatcher) == 2
+
+    assert dispatcher.dispatch(event(1)) == 2
+    assert dispatcher.dispatch(event(2)) == 1
+    assert [item.device_id for item in one] == [1]
+    assert [item.device_id for item in every] == [1, 2]
+
+
+def test_wants_follows_the_device_index():
+    dispatcher = Dispatcher()
+    assert not dispatcher.wants(1)
+    subscription = dispatcher.subscribe(Subscription(print, device_ids=[1, 2]))
+    assert dispatcher.wants(1) and dispatcher.wants(2)
+    assert not dispatcher.wants(3)
+
+    every = dispatcher.subscribe(Subscription(print))
+    assert dispatcher.wants(3)
+    every.cancel()
+    subscription.cancel()
+    assert not dispatcher.wants(1)
+    assert len(dispatcher) == 0
+
+
+@pytest.mark.parametrize(
+    "filters, matched",
+    [
+        ({"fields": ["battery"]}, [2]),
+        ({"fields": ["position", "battery"]}, [1, 2]),
+        ({"event_types": ["address"]}, [3]),
+        ({"predicate": lambda item: item.device_id != 1}, [2, 3]),
+        ({"event_types": ["location"], "fields": ["position"]}, [1]),
+    ],
+)
+def test_filters(filters, matched):
+    dispatcher = Dispatcher()
+    received = []
+    dispatcher.subscribe(Subscription(received.append, **filters))
+    dispatcher.dispatch(event(1, fields=frozenset(["position"])))
+    dispatcher.dispatch(event(2, fields=frozenset(["battery"])))
+    dispatcher.dispatch(event(3, "address", fields=frozenset(["address"])))
+    assert [item.device_id for item in received] == matched
+
+
+def test_cancel_during_dispatch():
+    dispatcher = Dispatcher()
+    received = []
+
+    def first(item):
+        received.append("first")
+        # Cancel itself, and another subscription yet to see this event
+        first_subscription.cancel()
+        second_subscription.cancel()
+
+    first_subscription = dispatcher.subscribe(Subscription(first, device_ids=[1]))
+    second_subscription = dispatcher.subscribe(
+        Subscription(lambda item: received.append("second"), device_ids=[1])
+    )
+    dispatcher.subscribe(Subscription(lambda item: received.append("every")))
+
+    assert dispatcher.dispatch(event(1)) == 2
+    assert received == ["first", "every"]
+    assert dispatcher.dispatch(event(1)) == 1
+    assert received == ["first", "every", "every"]
+    assert len(dispatcher) == 1
+
+
+def test_subscribe_during_dispatch_starts_with_the_next_event():
+    dispatcher = Dispatcher()
+    late = []
+
+    def subscriber(item):
+        dispatcher.subscribe(Subscription(late.append, device_ids=[1]))
+
+    dispatcher.subscribe(Subscription(subscriber, device_ids=[1]))
+    dispatcher.dispatch(event(1))
+    assert late == []
+    dispatcher.dispatch(event(1))
+    assert len(late) == 1
+
+
+def test_failing_callback_is_logged_and_others_still_run(caplog):
+    dispatcher = Dispatcher()
+    received = []
+
+    def broken(item):
+        raise RuntimeError("subscriber bug")
+
+    dispatcher.subscribe(Subscription(broken, device_ids=[1]))
+    dispatcher.subscribe(Subscription(received.append))
+    assert dispatcher.dispatch(event(1)) == 1
+    assert len(received) == 1
+    assert "Event subscriber failed" in caplog.text
+    assert "subscriber bug" in caplog.text
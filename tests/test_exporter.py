@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+
+from trackimo.adddress import geocode
+from trackimo.exporter import PrometheusExporter
+from trackimo.protocol.device import DeviceHandler
+
+__author__ = "Troy Kelly"
+__copyright__ = "Troy Kelly"
+__license__ = "mit"
+
+
+async def scrape(port, path):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode())
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, body = response.decode("utf-8").partition("\r\n\r\n")
+    return head.split("\r\n")[0], body
+
+
+def test_scrape(new_protocol):
+    async def main():
+        protocol = new_protocol()
+        await protocol.login()
+        handler = DeviceHandler(protocol, geocode_workers=0)
+        await handler.build()
+        exporter = PrometheusExporter(handler, port=0)
+        await exporter.start()
+        assert exporter.port != 0
+
+        status, body = await scrape(exporter.port, "/metrics")
+        assert status == "HTTP/1.1 200 OK"
+        assert "# TYPE trackimo_api_requests_total counter" in body
+        assert 'path="/api/v3/user",status="200"} 1' in body
+        assert "trackimo_devices 3" in body
+
+        status, body = await scrape(exporter.port, "/other")
+        assert status == "HTTP/1.1 404 Not Found"
+        assert body == ""
+
+        await exporter.close()
+        await handler.close()
+        await protocol.close()
+
+    asyncio.run(main())
+
+
+def test_render_after_close_creates_nothing(new_protocol):
+    async def main():
+        protocol = new_protocol()
+        await protocol.login()
+        handler = DeviceHandler(protocol, geocode_workers=0)
+        await handler.build()
+        await handler.close()
+        await protocol.close()
+
+        executor, governor = geocode._EXECUTOR, geocode._GOVERNOR
+        body = PrometheusExporter(handler, port=0).render()
+        assert 'trackimo_executor_active{pool="geocode"} 0' in body
+        assert geocode._EXECUTOR is executor
+        assert geocode._GOVERNOR is governor
+
+    asyncio.run(main())
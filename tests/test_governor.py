@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import threading
+
+import pytest
+
+from trackimo.adddress.governor import (
+    GeocodeDropped,
+    GeocodeGovernor,
+    PRIORITY_MISSING,
+    PRIORITY_REFRESH,
+)
+from trackimo.executor import ThreadPool
+
+__author__ = "Troy Kelly"
+__copyright__ = "Troy Kelly"
+__license__ = "mit"
+
+
+def test_governor_drops_refreshes_when_full():
+    async def main():
+        release = asyncio.Event()
+
+        async def fetch():
+            await release.wait()
+            return "address"
+
+        governor = GeocodeGovernor(rate=0, max_queue=1)
+        running = asyncio.ensure_future(governor.lookup("a", fetch))
+        await asyncio.sleep(0)
+        waiting = asyncio.ensure_future(governor.lookup("b", fetch, PRIORITY_REFRESH))
+        await asyncio.sleep(0)
+
+        with pytest.raises(GeocodeDropped):
+            await governor.lookup("c", fetch, PRIORITY_REFRESH)
+
+        missing = asyncio.ensure_future(governor.lookup("d", fetch, PRIORITY_MISSING))
+        await asyncio.sleep(0)
+        with pytest.raises(GeocodeDropped):
+            await waiting
+
+        release.set()
+        assert await running == "address"
+        assert await missing == "address"
+        assert governor.stats["dropped"] == 2
+
+    asyncio.run(main())
+
+
+def test_lookups_cancelled_by_their_executor_are_dropped():
+    async def main():
+        loop = asyncio.get_running_loop()
+        busy = threading.Event()
+        pools = [ThreadPool(workers=1, name="test-geocode")]
+        pools[0].submit(busy.wait)
+
+        def fetch(result):
+            return lambda: loop.run_in_executor(pools[0], lambda: result)
+
+        governor = GeocodeGovernor(rate=0)
+        first = asyncio.ensure_future(governor.lookup("a", fetch("a")))
+        shared = asyncio.ensure_future(governor.lookup("a", fetch("a")))
+        queued = asyncio.ensure_future(governor.lookup("b", fetch("b")))
+        await asyncio.sleep(0.01)
+
+        try:
+            # As close_executor() does while the only thread is busy
+            pools[0].shutdown(wait=False, cancel_futures=True)
+            pools[0] = None
+            for waiter in (first, shared):
+                with pytest.raises(GeocodeDropped):
+                    await asyncio.wait_for(waiter, 1)
+            assert await asyncio.wait_for(queued, 1) == "b"
+
+            # The key is free again for a fresh lookup
+            assert await governor.lookup("a", fetch("again")) == "again"
+            assert governor.stats["failed"] == 1
+        finally:
+            busy.set()
+
+    asyncio.run(main())
+
+
+def test_cancelled_dispatcher_drops_every_waiter():
+    async def main():
+        async def fetch():
+            await asyncio.sleep(10)
+
+        governor = GeocodeGovernor(rate=0)
+        waiters = [
+            asyncio.ensure_future(governor.lookup(key, fetch)) for key in "abc"
+        ]
+        await asyncio.sleep(0.01)
+
+        for task in asyncio.all_tasks():
+            if task.get_coro().__qualname__ == "GeocodeGovernor.__dispatch":
+                task.cancel()
+        for waiter in waiters:
+            with pytest.raises(GeocodeDropped):
+                await asyncio.wait_for(waiter, 1)
+        assert governor.queue_depth == 0
+
+    asyncio.run(main())
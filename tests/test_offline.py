@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from trackimo.adddress.offline import OfflineGeocoder
+
+__author__ = "Troy Kelly"
+__copyright__ = "Troy Kelly"
+__license__ = "mit"
+
+
+@pytest.fixture
+def gazetteer(tmp_path):
+    places = tmp_path / "places.txt"
+    rows = [
+        (1, "Sydney", -33.86785, 151.20732),
+        (2, "Parramatta", -33.81667, 151.0),
+        (3, "Honolulu", 21.30694, -157.85833),
+    ]
+    places.write_text(
+        "".join(
+            f"{id}\t{name}\t{name}\t\t{lat}\t{lng}\tP\tPPL\tAU\t\t02"
+            "\t\t\t\t1000\t\t\t\t\n"
+            for id, name, lat, lng in rows
+        ),
+        encoding="utf-8",
+    )
+    return str(places)
+
+
+def test_offline_nearest_place(gazetteer):
+    geocoder = OfflineGeocoder(gazetteer, cell_size=0.1)
+    assert geocoder.reverse(-33.87, 151.21).city == "Sydney"
+    assert geocoder.reverse(-33.82, 151.01).city == "Parramatta"
+
+
+def test_offline_search_stops_at_max_distance(gazetteer):
+    geocoder = OfflineGeocoder(gazetteer, cell_size=0.1, max_distance=50)
+    assert geocoder.nearest(-40.0, -120.0) == (None, None)
+    assert geocoder.reverse(-40.0, -120.0) is None
+
+    index, distance = geocoder.nearest(-40.0, -120.0, max_distance=20000)
+    assert index == 2
+    assert distance > 5000
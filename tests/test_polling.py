@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+
+from types import SimpleNamespace
+
+import pytest
+
+from trackimo.protocol.polling import AdaptivePolicy, PollQueue
+
+__author__ = "Troy Kelly"
+__copyright__ = "Troy Kelly"
+__license__ = "mit"
+
+DEVICE = 1
+
+
+def parked(**kwargs):
+    values = {"id": DEVICE, "speedKMH": 0, "moving": False, "battery": 90, "age": 5}
+    values.update(kwargs)
+    return SimpleNamespace(**values)
+
+
+def poll(queue, now, devices, changed):
+    """Pop the due devices and reschedule them, returning their ids"""
+    due = queue.pop_due(now, devices)
+    queue.reschedule(now, devices, due, changed)
+    return due
+
+
+def test_first_quiet_poll_waits_the_stationary_interval():
+    policy = AdaptivePolicy(stationary=120, backoff=2)
+    queue = PollQueue(policy)
+    devices = {DEVICE: parked()}
+
+    assert poll(queue, 0, devices, []) == [DEVICE]
+    assert queue.intervals[DEVICE] == 120
+    assert queue.next_due(0) == 120
+
+
+def test_quiet_polls_back_off_until_the_maximum():
+    policy = AdaptivePolicy(stationary=120, backoff=2, max_interval=900)
+    queue = PollQueue(policy)
+    devices = {DEVICE: parked()}
+
+    now = 0
+    seen = []
+    for _ in range(5):
+        assert poll(queue, now, devices, []) == [DEVICE]
+        seen.append(queue.intervals[DEVICE])
+        now += seen[-1]
+    assert seen == [120, 240, 480, 900, 900]
+
+
+def test_a_change_resets_the_backoff():
+    policy = AdaptivePolicy(moving=30, stationary=120, backoff=2)
+    queue = PollQueue(policy)
+    devices = {DEVICE: parked()}
+
+    poll(queue, 0, devices, [])
+    poll(queue, 120, devices, [])
+    assert queue.intervals[DEVICE] == 240
+    poll(queue, 360, devices, [DEVICE])
+    assert queue.intervals[DEVICE] == 30
+    poll(queue, 390, devices, [])
+    assert queue.intervals[DEVICE] == 120
+
+
+@pytest.mark.parametrize(
+    "device, expected",
+    [
+        (parked(speedKMH=100), 10),
+        (parked(speedKMH=10), 30),
+        (parked(moving=True), 30),
+        (parked(), 120),
+    ],
+)
+def test_speed_and_movement_pick_the_interval(device, expected):
+    assert AdaptivePolicy().interval(device) == expected
+
+
+def test_low_battery_slows_polling():
+    policy = AdaptivePolicy(stationary=120, low_battery=20, low_battery_factor=3)
+    assert policy.interval(parked(battery=21)) == 120
+    assert policy.interval(parked(battery=20)) == 360
+    assert policy.interval(parked(battery=None)) == 120
+
+
+def test_stale_fix_stretches_the_interval():
+    policy = AdaptivePolicy(moving=30, stationary=120, max_interval=900)
+    # Silent for longer than the interval, wait half the silence
+    assert policy.interval(parked(age=600)) == 300
+    assert policy.interval(parked(moving=True, age=100)) == 50
+    # Never beyond the maximum, and a fresh fix changes nothing
+    assert policy.interval(parked(age=5000)) == 900
+    assert policy.interval(parked(age=60)) == 120
+    assert policy.interval(parked(age=None)) == 120
+
+
+def test_failed_poll_keeps_the_previous_pace():
+    policy = AdaptivePolicy(moving=30, stationary=120, backoff=2)
+    queue = PollQueue(policy)
+    devices = {DEVICE: parked()}
+
+    poll(queue, 0, devices, [])
+    poll(queue, 120, devices, [])
+    assert queue.intervals[DEVICE] == 240
+    poll(queue, 360, devices, None)
+    assert queue.intervals[DEVICE] == 240
+    assert queue.next_due(360) == 240
+    # The failure does not count as an unchanged poll either
+    poll(queue, 600, devices, [])
+    assert queue.intervals[DEVICE] == 480
+
+
+def test_failed_first_poll_uses_the_moving_interval():
+    queue = PollQueue(AdaptivePolicy(moving=30))
+    assert poll(queue, 0, {DEVICE: parked()}, None) == [DEVICE]
+    assert queue.intervals[DEVICE] == 30
+
+
+def test_untracked_devices_are_forgotten():
+    queue = PollQueue(AdaptivePolicy(stationary=120))
+    devices = {DEVICE: parked(), 2: parked(id=2)}
+    assert sorted(poll(queue, 0, devices, [])) == [DEVICE, 2]
+    assert poll(queue, 120, {DEVICE: devices[DEVICE]}, []) == [DEVICE]
+    assert queue.stats["devices"] == 1
+    assert list(queue.intervals) == [DEVICE]
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+
+import math
+import struct
+
+import pytest
+
+from trackimo.adddress import geocode
+from trackimo.adddress.geocode import Point, Polygon
+
+__author__ = "Troy Kelly"
+__copyright__ = "Troy Kelly"
+__license__ = "mit"
+
+RECTANGLE = [(0, 0), (4, 0), (4, 3), (0, 3)]
+L_SHAPE = [(0, 0), (2, 0), (2, 1), (1, 1), (1, 2), (0, 2)]
+CIRCLE = [
+    (10 + 2 * math.cos(math.radians(a)), -5 + 2 * math.sin(math.radians(a)))
+    for a in range(0, 360, 3)
+]
+
+
+@pytest.fixture(params=["python", "numpy"])
+def geometry(request, monkeypatch):
+    """Run a test with the pure Python code, then with NumPy for any size"""
+    if request.param == "python":
+        monkeypatch.setattr(geocode, "numpy", None)
+    elif geocode.numpy is None:
+        pytest.skip("NumPy is not installed")
+    else:
+        monkeypatch.setattr(geocode, "_NUMPY_MIN_VERTICES", 0)
+    return request.param
+
+
+def from_wkt(wkt):
+    assert wkt.startswith("POLYGON ((") and wkt.endswith("))")
+    pairs = wkt[len("POLYGON ((") : -2].split(", ")
+    return [tuple(float(value) for value in pair.split(" ")) for pair in pairs]
+
+
+def from_wkb(wkb):
+    order, kind, rings, count = struct.unpack_from("<BIII", wkb)
+    assert (order, kind, rings) == (1, 3, 1)
+    values = struct.unpack_from(f"<{count * 2}d", wkb, 13)
+    assert len(wkb) == 13 + count * 16
+    return list(zip(values[0::2], values[1::2]))
+
+
+@pytest.mark.parametrize("shape", [RECTANGLE, L_SHAPE, CIRCLE])
+def test_wkt_and_wkb_round_trip(shape):
+    polygon = Polygon(shape)
+    expected = [(float(x), float(y)) for x, y in shape]
+    assert polygon.coords == expected
+    assert from_wkt(polygon.wkt) == expected
+    assert from_wkb(polygon.wkb) == expected
+    assert Polygon(from_wkb(polygon.wkb)).wkb == polygon.wkb
+
+
+def test_point_wkt_and_wkb():
+    point = Point(151.2, -33.8)
+    assert point.wkt == "POINT (151.2 -33.8)"
+    assert struct.unpack("<BIdd", point.wkb) == (1, 1, 151.2, -33.8)
+
+
+def test_area(geometry):
+    assert Polygon(RECTANGLE).area == 12
+    assert Polygon(L_SHAPE).area == 3
+    assert Polygon(list(reversed(L_SHAPE))).area == 3
+    assert Polygon(CIRCLE).area == pytest.approx(math.pi * 4, rel=1e-3)
+    assert Polygon(RECTANGLE[:2]).area == 0
+
+
+def test_bounds():
+    assert Polygon(L_SHAPE).bounds == (0, 0, 2, 2)
+    assert Polygon([]).bounds is None
+
+
+def test_contains(geometry):
+    rectangle = Polygon(RECTANGLE)
+    assert rectangle.contains(Point(1, 1))
+    assert not rectangle.contains(Point(5, 1))
+    assert not rectangle.contains(Point(2, -0.5))
+
+    l_shape = Polygon(L_SHAPE)
+    assert l_shape.contains_xy(0.5, 1.5)
+    assert l_shape.contains_xy(1.5, 0.5)
+    # Inside the bounding box, but in the notch of the L
+    assert not l_shape.contains_xy(1.5, 1.5)
+
+    circle = Polygon(CIRCLE)
+    assert circle.contains_xy(10, -5)
+    assert circle.contains_xy(11.9, -5)
+    assert not circle.contains_xy(11.5, -3.5)
+
+
+def test_contains_many(geometry):
+    l_shape = Polygon(L_SHAPE)
+    xs = [0.5, 1.5, 1.5, 3.0]
+    ys = [1.5, 0.5, 1.5, 0.5]
+    assert [bool(inside) for inside in l_shape.contains_many(xs, ys)] == [
+        True,
+        True,
+        False,
+        False,
+    ]
+    assert list(Polygon([]).contains_many([0], [0])) == [False]
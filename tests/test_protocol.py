@@ -0,0 +1,261 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+
+import pytest
+
+from trackimo.exceptions import (
+    TrackimoAPIError,
+    TrackimoCircuitOpen,
+    TrackimoTimeout,
+)
+from trackimo.protocol.retry import CircuitBreaker, RetryPolicy, CLOSED, OPEN
+
+__author__ = "Troy Kelly"
+__copyright__ = "Troy Kelly"
+__license__ = "mit"
+
+USER = "GET /api/v3/user"
+REFRESH = "POST /api/v3/oauth2/token/refresh"
+BEEP = "POST /api/v3/accounts/{id}/devices/ops/beep"
+LOCATIONS = "POST /api/v3/accounts/{id}/locations/filter"
+
+
+def fast_retries(attempts=4):
+    return RetryPolicy(attempts=attempts, base=0.001, cap=0.01)
+
+
+def test_rejected_token_is_refreshed_once(new_protocol, fake_api):
+    async def main():
+        protocol = new_protocol(rate_limits={"default": (1000, 1000)})
+        await protocol.login()
+        fake_api.latency = 0.02
+        fake_api.failures[USER] = [401] * 10
+        await asyncio.gather(*[protocol.api_get("user") for _ in range(10)])
+        assert fake_api.count(REFRESH) == 1
+        assert protocol.metrics["token_refreshes"] == 1
+        await protocol.close()
+
+    asyncio.run(main())
+
+
+def test_refresh_keeps_the_live_session(new_protocol, fake_api):
+    async def main():
+        protocol = new_protocol()
+        await protocol.login()
+        (session,) = fake_api.transports
+
+        fake_api.failures[USER] = [401]
+        assert await protocol.api_get("user")
+        assert fake_api.count(REFRESH) == 1
+        assert fake_api.transports == [session]
+
+        # A refused refresh logs in again on a new session
+        fake_api.failures[USER] = [401]
+        fake_api.failures[REFRESH] = [400]
+        assert await protocol.api_get("user")
+        assert len(fake_api.transports) == 2
+        assert not session.closed
+
+        await protocol.close()
+        assert all(transport.closed for transport in fake_api.transports)
+
+    asyncio.run(main())
+
+
+def test_limits_requests_in_flight(new_protocol, fake_api):
+    async def main():
+        protocol = new_protocol(
+            max_in_flight=3, rate_limits={"default": (1000, 1000)}
+        )
+        await protocol.login()
+        fake_api.latency = 0.02
+        fake_api.peak = 0
+        await asyncio.gather(*[protocol.api_get("user") for _ in range(12)])
+        assert fake_api.peak == 3
+        assert protocol.limits["in_flight"] == 0
+        await protocol.close()
+
+    asyncio.run(main())
+
+
+def test_retries_server_errors(new_protocol, fake_api):
+    async def main():
+        protocol = new_protocol(retry_policy=fast_retries())
+        await protocol.login()
+        fake_api.failures[USER] = [503, 502]
+        assert await protocol.api_get("user")
+        assert fake_api.count(USER) == 4
+        assert protocol.metrics["endpoints"]["GET /api/v3/user"]["retries"] == 2
+        await protocol.close()
+
+    asyncio.run(main())
+
+
+def test_does_not_retry_unsafe_posts(new_protocol, fake_api):
+    async def main():
+        protocol = new_protocol(retry_policy=fast_retries())
+        await protocol.login()
+        fake_api.failures[BEEP] = [503]
+        with pytest.raises(TrackimoAPIError):
+            await protocol.api_post("accounts/99/devices/ops/beep", data={})
+        assert fake_api.count(BEEP) == 1
+        await protocol.close()
+
+    asyncio.run(main())
+
+
+def test_connection_errors_are_retried_then_chained(new_protocol, fake_api):
+    async def main():
+        breaker = CircuitBreaker(failure_threshold=10)
+        protocol = new_protocol(retry_policy=fast_retries(), circuit_breaker=breaker)
+        await protocol.login()
+        sent = fake_api.count(USER)
+        refused = ConnectionRefusedError("refused")
+        fake_api.failures[USER] = [refused] * 4
+        with pytest.raises(TrackimoAPIError) as raised:
+            await protocol.api_get("user")
+        assert raised.value.message == "Trackimo API failed to respond."
+        assert raised.value.__cause__ is refused
+        assert fake_api.count(USER) == sent + 4
+        assert breaker.stats["failures"] == 4
+        await protocol.close()
+
+    asyncio.run(main())
+
+
+def test_bugs_are_not_retried_or_counted(new_protocol, fake_api):
+    async def main():
+        breaker = CircuitBreaker(failure_threshold=1)
+        protocol = new_protocol(retry_policy=fast_retries(), circuit_breaker=breaker)
+        await protocol.login()
+        sent = fake_api.count(USER)
+        fake_api.failures[USER] = [TypeError("not JSON serializable")]
+        with pytest.raises(TypeError):
+            await protocol.api_get("user")
+        assert fake_api.count(USER) == sent + 1
+        assert breaker.state == CLOSED
+        await protocol.close()
+
+    asyncio.run(main())
+
+
+def test_circuit_opens_then_recovers(new_protocol, fake_api):
+    async def main():
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+        protocol = new_protocol(
+            retry_policy=fast_retries(attempts=1), circuit_breaker=breaker
+        )
+        await protocol.login()
+        fake_api.failures[USER] = [500, 500]
+        for _ in range(2):
+            with pytest.raises(TrackimoAPIError):
+                await protocol.api_get("user")
+        assert breaker.state == OPEN
+
+        sent = fake_api.count(USER)
+        with pytest.raises(TrackimoCircuitOpen):
+            await protocol.api_get("user")
+        assert fake_api.count(USER) == sent
+
+        await asyncio.sleep(0.06)
+        assert await protocol.api_get("user")
+        assert breaker.state == CLOSED
+        await protocol.close()
+
+    asyncio.run(main())
+
+
+def test_cancelled_trial_does_not_wedge_circuit(new_protocol, fake_api):
+    async def main():
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+        protocol = new_protocol(
+            retry_policy=fast_retries(attempts=1), circuit_breaker=breaker
+        )
+        await protocol.login()
+        fake_api.failures[USER] = [500]
+        with pytest.raises(TrackimoAPIError):
+            await protocol.api_get("user")
+        await asyncio.sleep(0.06)
+
+        fake_api.latency = 0.2
+        with pytest.raises(TrackimoTimeout):
+            await protocol.api_get("user", timeout=0.05)
+
+        fake_api.latency = 0
+        assert await protocol.api_get("user")
+        assert breaker.state == CLOSED
+        await protocol.close()
+
+    asyncio.run(main())
+
+
+def test_deadline_cuts_retries_short(new_protocol, fake_api):
+    async def main():
+        protocol = new_protocol(
+            retry_policy=RetryPolicy(attempts=10, base=0.05, cap=0.05)
+        )
+        await protocol.login()
+        fake_api.failures[LOCATIONS] = [503] * 10
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        with pytest.raises(TrackimoTimeout):
+            await protocol.api_post(
+                "accounts/99/locations/filter",
+                data={"device_ids": [1000]},
+                timeout=0.1,
+            )
+        assert loop.time() - started < 0.2
+        await protocol.close()
+
+    asyncio.run(main())
+
+
+def test_deadline_covers_a_slow_response(new_protocol, fake_api):
+    async def main():
+        protocol = new_protocol()
+        await protocol.login()
+        fake_api.latency = 1
+        with pytest.raises(TrackimoTimeout):
+            await protocol.api_get("user", timeout=0.05)
+        assert protocol.limits["in_flight"] == 0
+        await protocol.close()
+
+    asyncio.run(main())
+
+
+def test_api_threads_default_to_max_in_flight(new_protocol):
+    async def main():
+        assert new_protocol(max_in_flight=8).threads["workers"] == 8
+        assert new_protocol(executor_workers=2).threads["workers"] == 2
+
+    asyncio.run(main())
+
+
+def test_latency_uses_the_transports_timing(new_protocol, fake_api, monkeypatch):
+    answer = fake_api.answer
+
+    async def slow_start(*args):
+        # As if the request waited for a thread before being sent
+        await asyncio.sleep(0.1)
+        return await answer(*args)
+
+    async def main():
+        protocol = new_protocol()
+        await protocol.login()
+        transport = type(fake_api.transports[0])
+        request = transport.request
+
+        async def timed(self, *args, **kwargs):
+            response = await request(self, *args, **kwargs)
+            response.elapsed = 0.001
+            return response
+
+        monkeypatch.setattr(fake_api, "answer", slow_start)
+        monkeypatch.setattr(transport, "request", timed)
+        await protocol.api_get("accounts/99")
+        latency = protocol.metrics["endpoints"]["GET /api/v3/accounts/{id}"]["latency"]
+        assert latency["sum"] == pytest.approx(0.001)
+        await protocol.close()
+
+    asyncio.run(main())
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+
+import pytest
+
+from trackimo.protocol.scheduler import COALESCE, SKIP, FixedRateScheduler
+
+__author__ = "Troy Kelly"
+__copyright__ = "Troy Kelly"
+__license__ = "mit"
+
+INTERVAL = 0.05
+
+
+def run_cycles(overlap, durations, cycles):
+    """Run cycles taking the given seconds, returning start times and stats"""
+    starts = []
+    running = []
+
+    async def main():
+        loop = asyncio.get_running_loop()
+        scheduler = FixedRateScheduler(INTERVAL, loop=loop, overlap=overlap)
+        done = asyncio.Event()
+        origin = loop.time()
+
+        async def cycle():
+            assert not running, "cycles overlapped"
+            running.append(True)
+            starts.append(loop.time() - origin)
+            try:
+                await asyncio.sleep(durations[min(len(starts), len(durations)) - 1])
+            finally:
+                running.pop()
+            if len(starts) == cycles:
+                done.set()
+
+        scheduler.start(cycle)
+        await asyncio.wait_for(done.wait(), 2)
+        await scheduler.stop()
+        return scheduler.stats
+
+    return starts, asyncio.run(main())
+
+
+def test_runs_on_a_fixed_cadence():
+    starts, stats = run_cycles(SKIP, [0.01], 4)
+    for idx, start in enumerate(starts):
+        assert start == pytest.approx(idx * INTERVAL, abs=0.02)
+    assert stats["runs"] == 4
+    assert stats["skipped"] == 0 and stats["coalesced"] == 0
+    assert stats["lag"]["count"] == 4
+
+
+def test_skip_waits_for_the_next_tick_after_an_overrun():
+    # The first cycle runs past the ticks at 0.05 and 0.10
+    starts, stats = run_cycles(SKIP, [0.12, 0.01], 3)
+    assert starts[1] == pytest.approx(0.15, abs=0.02)
+    assert starts[2] == pytest.approx(0.20, abs=0.02)
+    assert stats["skipped"] == 2
+    assert stats["coalesced"] == 0
+
+
+def test_coalesce_catches_up_once_after_an_overrun():
+    starts, stats = run_cycles(COALESCE, [0.12, 0.01], 3)
+    # One catch up cycle straight away, then back on the cadence
+    assert starts[1] == pytest.approx(0.12, abs=0.02)
+    assert starts[2] == pytest.approx(0.15, abs=0.02)
+    assert stats["coalesced"] == 1
+    assert stats["skipped"] == 0
+    assert stats["last_lag"] < 0.02
+
+
+def test_stop_cancels_a_cycle_that_does_not_drain():
+    async def main():
+        scheduler = FixedRateScheduler(INTERVAL)
+        cancelled = asyncio.Event()
+
+        async def cycle():
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        scheduler.start(cycle)
+        await asyncio.sleep(0.01)
+        assert scheduler.stats["running"]
+        await scheduler.stop(timeout=0.01)
+        assert cancelled.is_set()
+        assert scheduler.task.done()
+        assert not scheduler.stats["running"]
+
+    asyncio.run(main())
+
+
+def test_rejects_bad_settings():
+    with pytest.raises(ValueError):
+        FixedRateScheduler(0)
+    with pytest.raises(ValueError):
+        FixedRateScheduler(1, overlap="queue")
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+
+import sqlite3
+import threading
+from datetime import timedelta
+
+import pytest
+
+from trackimo.adddress import store
+from trackimo.adddress.store import GeoStore
+
+__author__ = "Troy Kelly"
+__copyright__ = "Troy Kelly"
+__license__ = "mit"
+
+
+class FakeClock(object):
+    """Stands in for the time module, moving only when told to"""
+
+    def __init__(self):
+        super().__init__()
+        self.now = 1600000000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(store, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "geocode.sqlite")
+
+
+def test_set_then_get(clock, path):
+    geo_store = GeoStore(path)
+    fields = {"label": "Sydney", "polygon": [[151.2, -33.8], [151.3, -33.9]]}
+    geo_store.set("r3gx2f", fields)
+    assert geo_store.get("r3gx2f") == fields
+    assert geo_store.get("missing") is None
+    assert len(geo_store) == 1
+    geo_store.close()
+
+    # Another process sees the same entries
+    other = GeoStore(path)
+    assert other.get("r3gx2f") == fields
+    other.close()
+
+
+def test_entries_expire(clock, path):
+    geo_store = GeoStore(path, ttl=timedelta(hours=1))
+    geo_store.set("old", {"label": "old"})
+    clock.now += 1800
+    geo_store.set("new", {"label": "new"})
+
+    clock.now += 1800
+    assert geo_store.get("old") is None
+    assert geo_store.get("new") == {"label": "new"}
+
+    assert geo_store.compact() == 1
+    assert len(geo_store) == 1
+    geo_store.close()
+
+
+def test_threads_share_one_connection(clock, path, monkeypatch):
+    connections = []
+    connect = sqlite3.connect
+
+    def counting_connect(*args, **kwargs):
+        connections.append(connect(*args, **kwargs))
+        return connections[-1]
+
+    monkeypatch.setattr(store.sqlite3, "connect", counting_connect)
+    geo_store = GeoStore(path)
+
+    def work(idx):
+        for n in range(20):
+            geo_store.set(f"{idx}-{n}", {"n": n})
+            assert geo_store.get(f"{idx}-{n}") == {"n": n}
+
+    threads = [threading.Thread(target=work, args=(idx,)) for idx in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(geo_store) == 80
+    assert len(connections) == 1
+
+    geo_store.close()
+    assert geo_store.get("0-0") == {"n": 0}
+    assert len(connections) == 2
+    geo_store.close()
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+
+import pytest
+
+from trackimo import tracing
+from trackimo.protocol.device import DeviceHandler
+
+__author__ = "Troy Kelly"
+__copyright__ = "Troy Kelly"
+__license__ = "mit"
+
+
+@pytest.fixture
+def exporter():
+    exporter = tracing.add_exporter(tracing.InMemoryExporter())
+    yield exporter
+    tracing.remove_exporter(exporter)
+
+
+def names(exporter, span):
+    return sorted(child.name for child in exporter.children(span))
+
+
+def test_login_span_tree(new_protocol, exporter):
+    async def main():
+        protocol = new_protocol()
+        await protocol.login()
+        await protocol.close()
+
+    asyncio.run(main())
+    (login,) = exporter.find("trackimo.protocol.login")
+    assert login.parent_id is None
+    assert login.error is None
+    assert names(exporter, login) == [
+        "trackimo.api",
+        "trackimo.api",
+        "trackimo.api",
+        "trackimo.protocol.post_login",
+    ]
+    (post_login,) = exporter.find("trackimo.protocol.post_login")
+    (user,) = exporter.children(post_login)
+    assert user.attributes["http.route"] == "/api/v3/user"
+    assert user.attributes["http.status_code"] == 200
+    assert user.trace_id == login.trace_id
+
+
+def test_build_span_tree(new_protocol, fake_api, exporter):
+    fake_api.devices = 3
+
+    async def main():
+        protocol = new_protocol()
+        await protocol.login()
+        handler = DeviceHandler(protocol, geocode_workers=0)
+        await handler.build(limit=2)
+        await handler.close()
+        await protocol.close()
+
+    asyncio.run(main())
+    (build,) = exporter.find("trackimo.devices.build")
+    children = names(exporter, build)
+    assert children.count("trackimo.devices.page") == 2
+    assert children.count("trackimo.device.build") == 3
+    assert "trackimo.locations.page" in children
+    device_ids = sorted(
+        span.attributes["trackimo.device_id"]
+        for span in exporter.find("trackimo.device.build")
+    )
+    assert device_ids == [1000, 1001, 1002]
+    for span in exporter.find("trackimo.device.build"):
+        assert names(exporter, span) == ["trackimo.api"]
+
+
+def test_track_cycle_span_tree(new_protocol, fake_api, exporter):
+    fake_api.moving = {1000}
+    changes = []
+
+    async def main():
+        protocol = new_protocol()
+        await protocol.login()
+        handler = DeviceHandler(protocol, geocode_workers=0)
+        await handler.build()
+        exporter.clear()
+        handler.track(
+            interval=0.05, event_receiver=lambda **event: changes.append(event)
+        )
+        await asyncio.sleep(0.12)
+        await handler.stop()
+        await handler.close()
+        await protocol.close()
+
+    asyncio.run(main())
+    cycles = exporter.find("trackimo.track.cycle")
+    assert len(cycles) >= 2
+    for cycle in cycles:
+        assert cycle.parent_id is None
+        (page,) = exporter.children(cycle)
+        assert page.name == "trackimo.locations.page"
+        assert page.attributes["trackimo.device_ids"] == [1000, 1001, 1002]
+        (request,) = exporter.children(page)
+        assert request.attributes["http.method"] == "POST"
+        assert cycle.attributes["trackimo.changed"] == 1
+    assert {change["device_id"] for change in changes} == {1000}
+
+
+@pytest.mark.skipif(tracing.otel_trace is not None, reason="OpenTelemetry installed")
+def test_no_spans_without_exporters():
+    with tracing.span("trackimo.test") as span:
+        span.set_attribute("ignored", True)
+        assert span is tracing.current()
+        assert span.name is None
+    assert span.attributes == {}
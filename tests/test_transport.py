@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import threading
+
+import pytest
+
+from trackimo.exceptions import TrackimoTimeout
+from trackimo.executor import ThreadPool
+from trackimo.protocol import transport
+
+aiohttp = pytest.importorskip("aiohttp")
+from aiohttp import web  # noqa: E402
+
+__author__ = "Troy Kelly"
+__copyright__ = "Troy Kelly"
+__license__ = "mit"
+
+
+async def echo(request):
+    return web.json_response(
+        {
+            "method": request.method,
+            "query": dict(request.query),
+            "json": await request.json() if request.can_read_body else None,
+        },
+        headers={"X-Echo": "1"},
+    )
+
+
+async def slow(request):
+    await asyncio.sleep(1)
+    return web.Response(text="late")
+
+
+async def plain(request):
+    return web.Response(text="not json")
+
+
+async def serve():
+    app = web.Application()
+    app.router.add_route("*", "/echo", echo)
+    app.router.add_get("/slow", slow)
+    app.router.add_get("/plain", plain)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = runner.addresses[0][1]
+    return runner, f"http://127.0.0.1:{port}"
+
+
+def test_json_round_trip():
+    async def main():
+        runner, base = await serve()
+        http = transport.AiohttpTransport(read_timeout=5)
+        try:
+            response = await http.request(
+                "POST", base + "/echo", params={"page": "2"}, json={"device_ids": [1]}
+            )
+            assert response.status_code == 200
+            assert response.headers["X-Echo"] == "1"
+            assert response.json == {
+                "method": "POST",
+                "query": {"page": "2"},
+                "json": {"device_ids": [1]},
+            }
+
+            response = await http.request("GET", base + "/plain")
+            assert response.body == "not json"
+            assert response.json is None
+        finally:
+            await http.close()
+            await runner.cleanup()
+
+    asyncio.run(main())
+
+
+def test_read_timeout_raises_trackimo_timeout():
+    async def main():
+        runner, base = await serve()
+        http = transport.AiohttpTransport(read_timeout=0.05)
+        try:
+            with pytest.raises(TrackimoTimeout):
+                await http.request("GET", base + "/slow")
+        finally:
+            await http.close()
+            await runner.cleanup()
+
+    asyncio.run(main())
+
+
+def test_close_closes_the_session(monkeypatch):
+    sessions = []
+    client_session = aiohttp.ClientSession
+
+    def session(*args, **kwargs):
+        sessions.append(client_session(*args, **kwargs))
+        return sessions[-1]
+
+    monkeypatch.setattr(transport.aiohttp, "ClientSession", session)
+
+    async def main():
+        runner, base = await serve()
+        http = transport.AiohttpTransport()
+        try:
+            await http.request("GET", base + "/echo")
+            await http.request("GET", base + "/echo")
+            assert len(sessions) == 1
+
+            await http.close()
+            assert sessions[0].closed
+
+            # A closed transport opens a new session if it is used again
+            assert (await http.request("GET", base + "/echo")).status_code == 200
+            assert len(sessions) == 2
+        finally:
+            await http.close()
+            await runner.cleanup()
+        assert sessions[1].closed
+
+    asyncio.run(main())
+
+
+def test_requests_transport_times_only_the_request():
+    async def main():
+        runner, base = await serve()
+        loop = asyncio.get_running_loop()
+        pool = ThreadPool(workers=1)
+        busy = threading.Event()
+        pool.submit(busy.wait)
+        http = transport.RequestsTransport(loop=loop, executor=pool)
+        try:
+            request = asyncio.ensure_future(http.request("GET", base + "/echo"))
+            await asyncio.sleep(0.2)
+            busy.set()
+            response = await request
+            assert response.json["method"] == "GET"
+            assert response.elapsed < 0.2
+        finally:
+            busy.set()
+            await http.close()
+            pool.shutdown()
+            await runner.cleanup()
+
+    asyncio.run(main())
@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import threading
+
+import pytest
+
+from trackimo.adddress import geocode, worker
+from trackimo.adddress.geocode import Address
+from trackimo.adddress.governor import GeocodeDropped
+from trackimo.protocol.device import DeviceHandler
+
+__author__ = "Troy Kelly"
+__copyright__ = "Troy Kelly"
+__license__ = "mit"
+
+
+class FakeLookups(object):
+    """Stands in for reverse_geocode in the geocode worker"""
+
+    def __init__(self):
+        super().__init__()
+        self.positions = []
+        self.release = asyncio.Event()
+        self.drop = False
+
+    async def __call__(self, device, priority=None, detail=None):
+        latitude, longitude = device.latitude, device.longitude
+        self.positions.append((latitude, longitude))
+        await self.release.wait()
+        if self.drop:
+            raise GeocodeDropped("Geocode queue is full")
+        return Address.from_dict({"label": f"{latitude:.3f}"})
+
+
+def test_dropped_lookup_keeps_the_address(new_protocol, fake_api, monkeypatch):
+    fake_api.devices = 1
+    events = []
+
+    async def main():
+        lookups = FakeLookups()
+        lookups.release.set()
+        monkeypatch.setattr(worker, "reverse_geocode", lookups)
+        protocol = new_protocol()
+        await protocol.login()
+        handler = DeviceHandler(protocol, geocode_workers=1)
+        await handler.build()
+        await asyncio.sleep(0.01)
+        device = handler.devices[1000]
+        label = device.address
+
+        handler.subscribe(events.append, event_types=["address"])
+        lookups.drop = True
+        fake_api.moving = {1000}
+        await handler.refresh_locations()
+        await asyncio.sleep(0.01)
+
+        assert len(lookups.positions) == 2
+        assert label and device.address == label
+        await handler.close()
+        await protocol.close()
+
+    asyncio.run(main())
+    assert events == []
+
+
+def test_worker_geocodes_the_position_it_looked_up(
+    new_protocol, fake_api, monkeypatch
+):
+    fake_api.devices = 1
+
+    async def main():
+        lookups = FakeLookups()
+        monkeypatch.setattr(worker, "reverse_geocode", lookups)
+        protocol = new_protocol()
+        await protocol.login()
+        handler = DeviceHandler(protocol, geocode_workers=1)
+        await handler.build()
+        await asyncio.sleep(0.01)
+        assert len(lookups.positions) == 1
+
+        # Moves about 110 metres while the first lookup is still running
+        fake_api.moving = {1000}
+        await handler.refresh_locations()
+        lookups.release.set()
+        await asyncio.sleep(0.01)
+
+        device = handler.devices[1000]
+        assert len(lookups.positions) == 2
+        assert lookups.positions[1] == (device.latitude, device.longitude)
+        assert device.address == f"{device.latitude:.3f}"
+        await handler.close()
+        await protocol.close()
+
+    asyncio.run(main())
+
+
+class BlockingGeocoder(geocode.Geocoder):
+    """A remote geocoder whose lookups block until released"""
+
+    def __init__(self):
+        super().__init__()
+        self.release = threading.Event()
+        self.positions = []
+
+    def reverse(self, latitude, longitude):
+        self.positions.append((latitude, longitude))
+        self.release.wait(5)
+        return Address.from_dict({"label": f"{latitude} {longitude}"})
+
+
+@pytest.fixture
+def blocking_geocoder(new_protocol, monkeypatch):
+    monkeypatch.setattr(geocode, "_RATE", 0)
+    geocoder = BlockingGeocoder()
+    geocode.configure_geocoder(geocoder)
+    geocode.get_cache().clear()
+    yield geocoder
+    geocoder.release.set()
+
+
+async def geocoding_handler(new_protocol):
+    protocol = new_protocol()
+    await protocol.login()
+    handler = DeviceHandler(protocol, geocode_workers=5)
+    await handler.build()
+    await asyncio.sleep(0.05)
+    return handler
+
+
+def test_close_drops_only_its_own_lookups(new_protocol, fake_api, blocking_geocoder):
+    fake_api.devices = 5
+
+    async def main():
+        handler = await geocoding_handler(new_protocol)
+        governor = geocode.get_governor(asyncio.get_running_loop())
+        executor = geocode.get_executor()
+        assert len(blocking_geocoder.positions) == 1
+        assert governor.queue_depth == 4
+
+        await handler.close()
+        assert governor.queue_depth == 0
+        assert governor.stats["cancelled"] == 4
+
+        blocking_geocoder.release.set()
+        await asyncio.sleep(0.05)
+        assert len(blocking_geocoder.positions) == 1
+        assert geocode.get_executor() is executor
+        assert not executor.closed
+        await handler.protocol.close()
+
+    asyncio.run(main())
+
+
+def test_close_keeps_lookups_another_handler_needs(
+    new_protocol, fake_api, blocking_geocoder
+):
+    fake_api.devices = 5
+
+    async def main():
+        first = await geocoding_handler(new_protocol)
+        second = await geocoding_handler(new_protocol)
+        governor = geocode.get_governor(asyncio.get_running_loop())
+        assert governor.queue_depth == 4
+
+        await first.close()
+        assert governor.queue_depth == 4
+
+        blocking_geocoder.release.set()
+        for _ in range(50):
+            await asyncio.sleep(0.01)
+            if all(device.address for device in second.devices.values()):
+                break
+        assert len(blocking_geocoder.positions) == 5
+        assert all(device.address for device in second.devices.values())
+        await second.close()
+        await first.protocol.close()
+        await second.protocol.close()
+
+    asyncio.run(main())